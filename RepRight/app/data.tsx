@@ -4,56 +4,75 @@ import { Button, Text, Card, Title, useTheme } from "react-native-paper";
 import axios from "axios";
 import { BarChart } from "react-native-chart-kit";
 
-type Workout = { workout_id: number; workout_time: string };
 type Exercise = [string, number];
+type Workout = {
+  workout_id: number;
+  workout_time: string;
+  exercises: Exercise[];
+};
+
+// Number of workouts fetched per history request
+const PAGE_SIZE = 20;
 
 export default function WorkoutScreen() {
-  const [workout, setWorkout] = useState<Workout | null>(null);
-  const [exercises, setExercises] = useState<Exercise[]>([]);
-  const [currentId, setCurrentId] = useState<number | null>(null); // Tracks the current workout's ID
+  const [history, setHistory] = useState<Workout[]>([]); // Loaded workouts, newest first
+  const [index, setIndex] = useState<number>(0); // Index of the shown workout in history
+  const [nextBeforeId, setNextBeforeId] = useState<number | null>(null); // Cursor of the next older page
+  const [hasMore, setHasMore] = useState<boolean>(false); // Whether older workouts exist
   const [loading, setLoading] = useState<boolean>(true); // Add a loading state
   const { colors } = useTheme(); // Get the theme colors
 
-  // Fetch the most recent workout on mount
+  // Fetch the most recent page of workouts on mount
   useEffect(() => {
-    fetchWorkout("recent");
+    fetchHistory();
   }, []);
 
-  // Function to fetch workouts by workout_id
-  const fetchWorkout = async (
-    direction: "next" | "prev" | "recent",
-    workout_id: number | null = null
-  ) => {
+  // Function to fetch a page of workouts older than before_id
+  const fetchHistory = async (before_id: number | null = null) => {
     try {
       setLoading(true); // Set loading to true when fetching data
-      const response = await axios.get("http://10.246.179.1:5000/workouts", {
-        params: {
-          workout_id: workout_id,
-          direction: direction,
-        },
-      });
-
-      if (response.data) {
-        const fetchedWorkout = {
-          workout_id: response.data.workout[0],
-          workout_time: response.data.workout[1],
-        };
-        setWorkout(fetchedWorkout);
-        setCurrentId(fetchedWorkout.workout_id); // Update the current workout ID with the returned value
-        console.log(response.data);
-        // Ensure rep_count is converted to a number
-        const fetchedExercises = response.data.exercises;
-
-        // Set the exercises data
-        setExercises(fetchedExercises);
-      }
+      const response = await axios.get(
+        "http://10.246.179.1:5000/workouts/history",
+        {
+          params: {
+            before_id: before_id,
+            limit: PAGE_SIZE,
+          },
+        }
+      );
+
+      const page: Workout[] = response.data.workouts;
+      setHistory((prev) => (before_id === null ? page : [...prev, ...page]));
+      setNextBeforeId(response.data.next_before_id);
+      setHasMore(response.data.has_more);
+      return page.length;
     } catch (error) {
-      console.error("Error fetching workout:", error);
+      console.error("Error fetching workouts:", error);
+      return 0;
     } finally {
       setLoading(false); // Set loading to false once data is fetched
     }
   };
 
+  // Show the previous (older) workout, fetch the next page when needed
+  const showPrevious = async () => {
+    if (index + 1 < history.length) {
+      setIndex(index + 1);
+    } else if (hasMore && (await fetchHistory(nextBeforeId)) > 0) {
+      setIndex(index + 1);
+    }
+  };
+
+  // Show the next (newer) workout
+  const showNext = () => {
+    if (index > 0) {
+      setIndex(index - 1);
+    }
+  };
+
+  const workout = history[index] ?? null;
+  const exercises = workout ? workout.exercises : [];
+
   // Prepare data for the BarChart and ensure valid data
   const exerciseLabels = exercises.map((exercise) => exercise[0]);
   const repCounts = exercises.map((exercise) => exercise[1]);
@@ -152,8 +171,8 @@ export default function WorkoutScreen() {
         {/* Previous button */}
         <Button
           mode="contained"
-          onPress={() => fetchWorkout("prev", currentId)} // Fetch previous workout by ID
-          disabled={!currentId} // Disable if no workout is available
+          onPress={showPrevious} // Show previous workout
+          disabled={!workout || (index + 1 >= history.length && !hasMore)} // Disable if no older workout
           style={styles.button}
         >
           Previous
@@ -162,8 +181,8 @@ export default function WorkoutScreen() {
         {/* Next button */}
         <Button
           mode="contained"
-          onPress={() => fetchWorkout("next", currentId)} // Fetch next workout by ID
-          disabled={!currentId} // Disable if no workout is available
+          onPress={showNext} // Show next workout
+          disabled={index === 0} // Disable if showing the newest workout
           style={styles.button}
         >
           Next
@@ -21,6 +21,8 @@ export default function HomeScreen() {
   const [workouts, setWorkouts] = useState([]);
   const [showProgress, setShowProgress] = useState(false);
   const [workoutId, setWorkoutId] = useState<number | null>(null);
+  // True while a /start_exercise request waits for its session to end
+  const [exerciseRunning, setExerciseRunning] = useState(false);
   const [exerciseResults, setExerciseResults] = useState<
     [number, string, number][]
   >([]); // State to track array of arrays
@@ -38,7 +40,9 @@ export default function HomeScreen() {
           {
             workout_id: workoutId,
             exercises: exerciseResults,
-          }
+          },
+          // Retrying the same workout upload is stored only once
+          { headers: { "Idempotency-Key": `workout-${workoutId}` } }
         );
 
         if (response.status === 200) {
@@ -82,8 +86,10 @@ export default function HomeScreen() {
 
   // Function to start an exercise and store its result
   const startExercise = async () => {
+    setExerciseRunning(true);
     try {
-      // Send a POST request to start the exercise
+      // Send a POST request to start the exercise, it returns
+      // once the session is ended by stopExercise
       const response = await axios.post(
         "http://10.246.179.1:5000/start_exercise"
       );
@@ -106,6 +112,18 @@ export default function HomeScreen() {
       console.log("Rep Count:", repCount);
     } catch (error) {
       console.error("Error starting exercise:", error);
+    } finally {
+      setExerciseRunning(false);
+    }
+  };
+
+  // Function to end the running exercise, its pending
+  // startExercise request then receives the counts
+  const stopExercise = async () => {
+    try {
+      await axios.post("http://10.246.179.1:5000/stop_exercise");
+    } catch (error) {
+      console.error("Error stopping exercise:", error);
     }
   };
 
@@ -134,6 +152,7 @@ export default function HomeScreen() {
             onPress={toggleWorkout} // Toggle workout start/stop
             style={styles.button}
             buttonColor={colors.primary}
+            disabled={exerciseRunning} // Stop the exercise first so its reps are stored
           >
             {workoutStarted ? "Stop Workout" : "Start Workout"}
           </Button>
@@ -142,11 +161,11 @@ export default function HomeScreen() {
           {workoutStarted && (
             <Button
               mode="contained"
-              onPress={startExercise} // Start exercise and execute Python script
+              onPress={exerciseRunning ? stopExercise : startExercise} // Start or stop exercise on the backend
               style={styles.button}
               buttonColor={colors.primary}
             >
-              Start Exercise
+              {exerciseRunning ? "Stop Exercise" : "Start Exercise"}
             </Button>
           )}
 
@@ -1,25 +1,55 @@
-from flask import Flask, jsonify, request
-import psycopg2
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS, cross_origin
 from dotenv import load_dotenv
 import os
-from datetime import datetime
-import subprocess
+import json
+import socket
+import threading
+from datetime import datetime, timedelta
+from inference_service import InferenceService
+from session_manager import SessionManager, SessionNotFound
+from db_pool import ConnectionPool
+from rep_counting.stage_metrics import stage_metrics
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app, support_credentials=True)
 
-# Connect to PostgreSQL
+# Load exercise classifier and repetition counter once at server start,
+# an exercise session not stopped by its client ends after MAX_EXERCISE_SECONDS
+inference_service = InferenceService(max_exercise_seconds=float(os.getenv("MAX_EXERCISE_SECONDS", 15 * 60)))
+inference_service.start()
+
+# Repetition counter state per streaming session, inference is
+# skipped on frames with little motion when MOTION_THRESHOLD is set
+# and runs on a crop around the person when ROI_CROP is 1
+session_manager = SessionManager(
+    scheduler_options={
+        "motion_threshold": float(os.getenv("MOTION_THRESHOLD")),
+        "max_skip": int(os.getenv("MOTION_MAX_SKIP", 4)),
+    } if os.getenv("MOTION_THRESHOLD") else None,
+    crop=os.getenv("ROI_CROP", "0") == "1"
+)
+# release abandoned sessions even when no request comes in
+session_manager.start_reaper()
+
+# PostgreSQL connection pool
+db_pool = ConnectionPool(
+    minconn=int(os.getenv("PG_POOL_MIN", 1)),
+    maxconn=int(os.getenv("PG_POOL_MAX", 10)),
+    statement_timeout_ms=int(os.getenv("PG_STATEMENT_TIMEOUT_MS", 5000)),
+    checkout_timeout=float(os.getenv("PG_POOL_TIMEOUT", 10)),
+    health_check_interval=float(os.getenv("PG_POOL_HEALTH_CHECK_INTERVAL", 30)),
+    host=os.getenv("PG_HOST", "localhost"),
+    database=os.getenv("PG_DATABASE", "repright"),
+    user=os.getenv("PG_USER"),
+    password=os.getenv('PG_PASSWORD'),
+)
+
+# Check out a pooled PostgreSQL connection, use in a with block
 def get_db_connection():
-    conn = psycopg2.connect(
-        host="localhost",
-        database="repright",
-        user=os.getenv("PG_USER"),
-        password=os.getenv('PG_PASSWORD'),
-    )
-    return conn
+    return db_pool.connection()
 
 
 @app.route("/")
@@ -79,9 +109,6 @@ def helloWorld():
 @app.route('/workouts', methods=['GET'])
 @cross_origin(supports_credentials=True)
 def get_workout():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
     # Get the workout_id from query params (if provided) and the direction (next/prev)
     workout_id = request.args.get('workout_id')
     direction = request.args.get('direction', 'recent')
@@ -91,85 +118,208 @@ def get_workout():
             workout_id = int(workout_id)
         except ValueError:
             return jsonify({'error': 'Invalid workout ID'}), 400
-        
-        if direction == 'next':
-            cursor.execute('SELECT * FROM workouts WHERE workout_id > %s ORDER BY workout_id ASC LIMIT 1', (workout_id,))
-        elif direction == 'prev':
-            cursor.execute('SELECT * FROM workouts WHERE workout_id < %s ORDER BY workout_id DESC LIMIT 1', (workout_id,))
+
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        if workout_id:
+            if direction == 'next':
+                cursor.execute('SELECT * FROM workouts WHERE workout_id > %s ORDER BY workout_id ASC LIMIT 1', (workout_id,))
+            elif direction == 'prev':
+                cursor.execute('SELECT * FROM workouts WHERE workout_id < %s ORDER BY workout_id DESC LIMIT 1', (workout_id,))
+            else:
+                cursor.execute('SELECT * FROM workouts WHERE workout_id = %s LIMIT 1', (workout_id,))
         else:
-            cursor.execute('SELECT * FROM workouts WHERE workout_id = %s LIMIT 1', (workout_id,))
-        
+            cursor.execute('SELECT * FROM workouts ORDER BY workout_id DESC LIMIT 1')
+
         workout = cursor.fetchone()
         updated_workout_id = workout[0]
         # Fetch exercises for the selected workout_id
         cursor.execute('SELECT exercise_name, rep_count FROM exercise_reps INNER JOIN exercise_types ON exercise_reps.exercise_type_id = exercise_types.exercise_type_id WHERE workout_id = %s', (updated_workout_id,))
         exercises = cursor.fetchall()
-    else:
-        cursor.execute('SELECT * FROM workouts ORDER BY workout_id DESC LIMIT 1')
-        workout = cursor.fetchone()
-        workout_id = workout[0]
-        cursor.execute('SELECT exercise_name, rep_count FROM exercise_reps INNER JOIN exercise_types ON exercise_reps.exercise_type_id = exercise_types.exercise_type_id WHERE workout_id = %s', (workout_id,))
-        exercises = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
 
     return jsonify({"workout": workout, "exercises": exercises})
 
+# Default and maximum number of workouts per history page
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+@app.route('/workouts/history', methods=['GET'])
+@cross_origin(supports_credentials=True)
+def get_workout_history():
+    # Keyset pagination on workout_id, newest first. before_id returns older
+    # workouts than the given id, after_id returns newer ones. Invalid values
+    # are a 400, get with type=int would silently turn them into None
+    try:
+        before_id = request.args.get('before_id')
+        before_id = int(before_id) if before_id is not None else None
+        after_id = request.args.get('after_id')
+        after_id = int(after_id) if after_id is not None else None
+        limit = int(request.args.get('limit', HISTORY_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'Invalid pagination parameters'}), 400
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+
+    if after_id is not None:
+        window = 'SELECT workout_id, workout_time FROM workouts WHERE workout_id > %s ORDER BY workout_id ASC LIMIT %s'
+        params = (after_id, limit + 1)
+    elif before_id is not None:
+        window = 'SELECT workout_id, workout_time FROM workouts WHERE workout_id < %s ORDER BY workout_id DESC LIMIT %s'
+        params = (before_id, limit + 1)
+    else:
+        window = 'SELECT workout_id, workout_time FROM workouts ORDER BY workout_id DESC LIMIT %s'
+        params = (limit + 1,)
+
+    # One query for the window of workouts with their exercises aggregated
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            'SELECT w.workout_id, w.workout_time, '
+            "COALESCE(json_agg(json_build_array(t.exercise_name, r.rep_count) ORDER BY r.exercise_rep_id) "
+            "FILTER (WHERE r.exercise_rep_id IS NOT NULL), '[]') AS exercises "
+            f'FROM ({window}) AS w '
+            'LEFT JOIN exercise_reps r ON r.workout_id = w.workout_id '
+            'LEFT JOIN exercise_types t ON t.exercise_type_id = r.exercise_type_id '
+            'GROUP BY w.workout_id, w.workout_time '
+            'ORDER BY w.workout_id DESC',
+            params
+        )
+        rows = cursor.fetchall()
+
+    # The extra row only tells if there is another page
+    has_more = len(rows) > limit
+    if has_more:
+        rows = rows[-limit:] if after_id is not None else rows[:limit]
+
+    workouts = [{"workout_id": workout_id, "workout_time": workout_time, "exercises": exercises}
+                for workout_id, workout_time, exercises in rows]
+
+    return jsonify({
+        "workouts": workouts,
+        "has_more": has_more,
+        "next_before_id": workouts[-1]["workout_id"] if workouts else None,
+        "next_after_id": workouts[0]["workout_id"] if workouts else None
+    })
+
 @app.route('/start_workout', methods=['POST'])
 def start_workout():
     try:
-        conn = get_db_connection()
-        # Get the current time
-        workout_time = datetime.now()
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # Get the current time
+            workout_time = datetime.now()
 
-        # Insert into workouts table and get workout_id
-        cur = conn.cursor()
-        cur.execute("INSERT INTO workouts (workout_time) VALUES (%s) RETURNING workout_id;", (workout_time,))
-        workout_id = cur.fetchone()[0]
-        conn.commit()
+            # Insert into workouts table and get workout_id
+            cur.execute("INSERT INTO workouts (workout_time) VALUES (%s) RETURNING workout_id;", (workout_time,))
+            workout_id = cur.fetchone()[0]
+            conn.commit()
 
         return jsonify({"workout_id": workout_id, "workout_time": workout_time}), 200
 
     except Exception as e:
-        conn.rollback()
         return jsonify({"error": str(e)}), 500
 
-    finally:
-        cur.close()
-
+# Count reps from camera until /stop_exercise is called or the
+# session reaches MAX_EXERCISE_SECONDS, then return the counts
 @app.route('/start_exercise', methods=['POST'])
 def start_exercise():
     try:
-        # Run your Python script using subprocess
-        result = subprocess.run(['python3', 'classify_count.py'], capture_output=True, text=True)
-
-        # If the script was successful, parse the output
-        if result.returncode == 0:
-            # Split the stdout by lines
-            output_lines = result.stdout.strip().split('\n')
-
-            # Ensure there are at least two lines in the output
-            if len(output_lines) >= 2:
-                # The second-to-last line is the exercise name, and the last line is the rep count
-                exercise_name = output_lines[-2].strip()
-                rep_count = output_lines[-1].strip()
-
-                # Return the extracted exercise name and rep count
-                return jsonify({
-                    "message": "Exercise started successfully!",
-                    "exercise_name": exercise_name,
-                    "rep_count": rep_count,
-                    "output": result.stdout
-                }), 200
-            else:
-                return jsonify({"message": "Output format error", "output": result.stdout}), 500
-        else:
-            # If there was an error, return the error message
-            return jsonify({"message": "Error starting exercise", "error": result.stderr}), 500
+        # Classify the exercise and count reps on the inference worker
+        result = inference_service.start_exercise()
+
+        # Return the exercise name and rep count, exercises holds
+        # the count of every exercise of a mixed workout
+        return jsonify({
+            "message": "Exercise started successfully!",
+            "exercise_name": result["exercise_name"],
+            "rep_count": result["rep_count"],
+            "exercises": result["exercises"]
+        }), 200
 
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"message": "Error starting exercise", "error": str(e)}), 500
+
+# End the running /start_exercise session, that request
+# then returns the counts of the session
+@app.route('/stop_exercise', methods=['POST'])
+def stop_exercise():
+    if not inference_service.stop_exercise():
+        return jsonify({"error": "no exercise session is running"}), 404
+    return jsonify({"message": "Exercise stopped"}), 200
+
+# Stage latency histograms and frame and session counters in Prometheus
+# format, STAGE_METRICS=0 switches instrumentation and this route off
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    if not stage_metrics.enabled:
+        return jsonify({"error": "metrics are disabled"}), 404
+    return Response(stage_metrics.render(gauges={"sessions_open": session_manager.get_session_count()}),
+                    mimetype="text/plain; version=0.0.4")
+
+@app.route('/sessions', methods=['POST'])
+def open_session():
+    data = request.get_json(silent=True) or {}
+    exercise_name = data.get('exercise_name')
+    if not exercise_name:
+        return jsonify({"error": "exercise_name is required"}), 400
+
+    try:
+        # Optional average inference time per frame allowed for this session
+        latency_budget_ms = data.get('latency_budget_ms')
+        if latency_budget_ms is not None:
+            latency_budget_ms = float(latency_budget_ms)
+        session_id = session_manager.open_session(exercise_name, latency_budget_ms=latency_budget_ms)
+        return jsonify({"session_id": session_id, "exercise_name": exercise_name}), 201
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+# One frame per request, for clients that can't stream a
+# request body, /sessions/<session_id>/stream avoids a request per frame
+@app.route('/sessions/<session_id>/frames', methods=['POST'])
+def push_session_frame(session_id):
+    # Frame is sent as JPEG either in request body or as 'frame' file
+    frame_file = request.files.get('frame')
+    encoded_frame = frame_file.read() if frame_file else request.get_data()
+
+    try:
+        return jsonify(session_manager.push_frame(session_id, encoded_frame)), 200
+
+    except SessionNotFound as e:
+        return jsonify({"error": str(e)}), 404
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+# All frames of a session in one chunked upload, each frame is its length
+# as 4 big endian bytes followed by the JPEG. One JSON line per frame is
+# streamed back as soon as the frame is processed
+@app.route('/sessions/<session_id>/stream', methods=['POST'])
+def stream_session_frames(session_id):
+    try:
+        session_manager.get_session(session_id)
+    except SessionNotFound as e:
+        return jsonify({"error": str(e)}), 404
+
+    # each result is a few small writes, send them at once instead of
+    # waiting for the client to acknowledge the previous result
+    stream_socket = request.environ.get("werkzeug.socket")
+    if stream_socket is not None:
+        stream_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def results():
+        try:
+            for result in session_manager.push_stream(session_id, request.stream):
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            # status is already sent, error ends the stream
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return Response(stream_with_context(results()), mimetype="application/x-ndjson")
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def close_session(session_id):
+    try:
+        return jsonify(session_manager.close_session(session_id)), 200
+
+    except SessionNotFound as e:
+        return jsonify({"error": str(e)}), 404
 
 # # Add a workout
 # @app.route('/workouts', methods=['POST'])
@@ -189,43 +339,131 @@ def start_exercise():
 
 #     return jsonify(workout), 201
 
+# Cached exercise_name -> exercise_type_id map, exercise types rarely change
+exercise_type_ids = {}
+exercise_type_ids_lock = threading.Lock()
+
+def get_exercise_type_ids(cursor, exercise_names):
+    # Reload the map from exercise_types only when a name is missing
+    with exercise_type_ids_lock:
+        missing = set(exercise_names) - exercise_type_ids.keys()
+        if missing:
+            cursor.execute('SELECT exercise_name, exercise_type_id FROM exercise_types')
+            exercise_type_ids.clear()
+            exercise_type_ids.update(cursor.fetchall())
+            missing = set(exercise_names) - exercise_type_ids.keys()
+        if missing:
+            raise ValueError(f"Unknown exercise names: {sorted(missing)}")
+        return {name: exercise_type_ids[name] for name in exercise_names}
+
 @app.route('/store_exercise_reps', methods=['POST'])
 def store_exercise_reps():
     data = request.json
-    workout_id = data.get('workout_id')
     exercises = data.get('exercises', [])
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Insert each exercise into the exercise_reps table
-    try:
-        for exercise in exercises:
-            workout_id = exercise[0]
-            exercise_name = exercise[1]
-            rep_count = exercise[2]
+    # A retried request with the same key is not inserted again
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
 
-            # You may need to map exercise_name to exercise_type_id
-            # Assuming you have a table 'exercise_types' for this:
-            cursor.execute('SELECT exercise_type_id FROM exercise_types WHERE exercise_name = %s', (exercise_name,))
-            exercise_type_id = cursor.fetchone()[0]
+    if not exercises:
+        return jsonify({"message": "Exercises stored successfully", "stored": 0}), 200
 
-            # Insert into exercise_reps
+    try:
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            # Each exercise is [workout_id, exercise_name, rep_count]
+            type_ids = get_exercise_type_ids(cursor, [exercise[1] for exercise in exercises])
+            rows = [(exercise[0], type_ids[exercise[1]], exercise[2]) for exercise in exercises]
+            values = ', '.join(['(%s, %s, %s)'] * len(rows))
+            params = [value for row in rows for value in row]
+
+            # With a key the rows are only inserted if the key is new
+            request_cte = ''
+            condition = ''
+            key_params = []
+            if idempotency_key:
+                request_cte = ('request AS ('
+                               '  INSERT INTO idempotency_keys (idempotency_key) VALUES (%s)'
+                               '  ON CONFLICT DO NOTHING RETURNING idempotency_key'
+                               '), ')
+                condition = 'WHERE EXISTS (SELECT 1 FROM request) '
+                key_params = [idempotency_key]
+
+            # Insert all exercises into the exercise_reps table and add them to
+            # the per-day progress in one statement. The NOT EXISTS check sees
+            # exercise_reps before this statement, so a workout is counted as a
+            # new session only for its first set of an exercise type
             cursor.execute(
-                'INSERT INTO exercise_reps (workout_id, exercise_type_id, rep_count) VALUES (%s, %s, %s)',
-                (workout_id, exercise_type_id, rep_count)
+                f'WITH {request_cte}'
+                'inserted AS ('
+                '  INSERT INTO exercise_reps (workout_id, exercise_type_id, rep_count) '
+                f'  SELECT v.workout_id, v.exercise_type_id, v.rep_count FROM (VALUES {values}) '
+                '  AS v (workout_id, exercise_type_id, rep_count) '
+                f'  {condition}'
+                '  RETURNING workout_id, exercise_type_id, rep_count'
+                '), progress AS ('
+                '  INSERT INTO daily_exercise_progress (progress_date, exercise_type_id, total_reps, sets, sessions) '
+                '  SELECT w.workout_time::date, i.exercise_type_id, SUM(i.rep_count), COUNT(*), '
+                '  COUNT(DISTINCT i.workout_id) FILTER (WHERE NOT EXISTS ('
+                '    SELECT 1 FROM exercise_reps e'
+                '    WHERE e.workout_id = i.workout_id AND e.exercise_type_id = i.exercise_type_id)) '
+                '  FROM inserted i JOIN workouts w ON w.workout_id = i.workout_id '
+                '  GROUP BY w.workout_time::date, i.exercise_type_id '
+                '  ON CONFLICT (progress_date, exercise_type_id) DO UPDATE SET '
+                '  total_reps = daily_exercise_progress.total_reps + EXCLUDED.total_reps, '
+                '  sets = daily_exercise_progress.sets + EXCLUDED.sets, '
+                '  sessions = daily_exercise_progress.sessions + EXCLUDED.sessions'
+                ') '
+                'SELECT COUNT(*) FROM inserted',
+                key_params + params
             )
+            stored = cursor.fetchone()[0]
+
+            conn.commit()
+        return jsonify({"message": "Exercises stored successfully",
+                        "stored": stored,
+                        "duplicate": stored == 0}), 200
 
-        conn.commit()
-        return jsonify({"message": "Exercises stored successfully"}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     except Exception as e:
-        conn.rollback()
         return jsonify({"error": str(e)}), 500
 
-    finally:
-        cursor.close()
-        conn.close()
+# Number of days of progress returned when no start date is given
+PROGRESS_DEFAULT_DAYS = 30
+
+@app.route('/progress', methods=['GET'])
+@cross_origin(supports_credentials=True)
+def get_progress():
+    # Date range is inclusive and given as YYYY-MM-DD
+    try:
+        end = request.args.get('end')
+        end = datetime.strptime(end, '%Y-%m-%d').date() if end else datetime.now().date()
+        start = request.args.get('start')
+        start = datetime.strptime(start, '%Y-%m-%d').date() if start else end - timedelta(days=PROGRESS_DEFAULT_DAYS - 1)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format, expected YYYY-MM-DD'}), 400
+    exercise_name = request.args.get('exercise_name')
+
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            'SELECT p.progress_date, t.exercise_name, p.total_reps, p.sets, p.sessions '
+            'FROM daily_exercise_progress p '
+            'INNER JOIN exercise_types t ON p.exercise_type_id = t.exercise_type_id '
+            'WHERE p.progress_date BETWEEN %s AND %s AND (%s IS NULL OR t.exercise_name = %s) '
+            'ORDER BY p.progress_date ASC, t.exercise_name ASC',
+            (start, end, exercise_name, exercise_name)
+        )
+        rows = cursor.fetchall()
+
+    progress = [{"date": progress_date.isoformat(), "exercise_name": name,
+                 "total_reps": total_reps, "sets": sets, "sessions": sessions}
+                for progress_date, name, total_reps, sets, sessions in rows]
+
+    return jsonify({"start": start.isoformat(), "end": end.isoformat(), "progress": progress})
+
+@app.route('/db_pool_stats', methods=['GET'])
+def db_pool_stats():
+    return jsonify(db_pool.get_stats()), 200
 
 
 if __name__ == '__main__':
@@ -0,0 +1,56 @@
+import os
+import argparse
+import psycopg2
+from dotenv import load_dotenv
+
+# Rebuild per-day progress from all stored exercise reps
+BACKFILL_SQL = (
+    'INSERT INTO daily_exercise_progress (progress_date, exercise_type_id, total_reps, sets, sessions) '
+    'SELECT w.workout_time::date, r.exercise_type_id, SUM(r.rep_count), COUNT(*), COUNT(DISTINCT r.workout_id) '
+    'FROM exercise_reps r INNER JOIN workouts w ON w.workout_id = r.workout_id '
+    'GROUP BY w.workout_time::date, r.exercise_type_id'
+)
+
+def backfill(conn) -> int:
+    """
+    Rebuild daily_exercise_progress in one transaction. exercise_reps is
+    locked against writes so no set is missed or counted twice.
+
+    Args:
+        conn (connection): psycopg2 connection
+
+    Returns:
+        int: number of progress rows written
+    """
+    with conn.cursor() as cursor:
+        cursor.execute('LOCK TABLE exercise_reps IN SHARE MODE')
+        cursor.execute('LOCK TABLE daily_exercise_progress IN EXCLUSIVE MODE')
+        cursor.execute('DELETE FROM daily_exercise_progress')
+        cursor.execute(BACKFILL_SQL)
+        rows = cursor.rowcount
+    conn.commit()
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="Backfill daily exercise progress",
+                                     description="""This program rebuilds daily_exercise_progress
+                                     from exercise_reps, run it once after creating the table.
+                                     """)
+    parser.add_argument("--host", help="PostgreSQL host", default=None)
+    parser.add_argument("--database", help="PostgreSQL database", default=None)
+    args = parser.parse_args()
+
+    load_dotenv()
+    conn = psycopg2.connect(
+        host=args.host or os.getenv("PG_HOST", "localhost"),
+        database=args.database or os.getenv("PG_DATABASE", "repright"),
+        user=os.getenv("PG_USER"),
+        password=os.getenv('PG_PASSWORD'),
+    )
+    try:
+        print(f"{backfill(conn)} progress rows written")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
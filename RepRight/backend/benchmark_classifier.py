@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from classifier_runtime import DenseClassifier, load_classifier, MOVENET_FEATURE_SIZE, DEFAULT_MOVENET_NPZ_PATH
+from classify_count import ExerciseClassifier, labels, MEDIAPIPE_MODEL_PATH, DEFAULT_CONFIG_DIR
+from rep_counting.rep_counter import RepetitionCounter
+from rep_counting.benchmark_models import get_examples, DEFAULT_EXAMPLES_DIR
+from rep_counting.video_reader import VideoReader
+from rep_counting.movenet.movenet_infer import MODEL_PATH
+
+def get_movenet_classifier(model_path=DEFAULT_MOVENET_NPZ_PATH) -> ExerciseClassifier:
+    """
+    Classifier on movenet keypoints, untrained weights of the same
+    layers are used if it is not trained yet, cost doesn't depend on weights
+    """
+    if os.path.exists(model_path):
+        return ExerciseClassifier(model=load_classifier(model_path))
+    rng = np.random.default_rng(0)
+    sizes = [MOVENET_FEATURE_SIZE, 128, 64, len(labels)]
+    kernels = [rng.standard_normal((n_in, n_out)) for n_in, n_out in zip(sizes[:-1], sizes[1:])]
+    biases = [np.zeros(n_out) for n_out in sizes[1:]]
+    return ExerciseClassifier(model=DenseClassifier(kernels, biases, ["relu", "relu", "softmax"]))
+
+def benchmark_backend(classifier:ExerciseClassifier, rep_counter:RepetitionCounter, video_path, exercise_name) -> dict:
+    """
+    Classify and count every frame of video as classify_and_count does,
+    time pose estimation and classification of each frame
+
+    Returns:
+        dict: pose backend, frames and average ms per frame of each step
+    """
+    rep_counter.reset_metrics()
+    rep_counter.set_metric(exercise_name)
+    timings = {"classify": 0., "count": 0.}
+    frames = 0
+    for frame in VideoReader(video_path):
+        start = time.perf_counter()
+        kps_norm = rep_counter.update_metric(frame)
+        counted = time.perf_counter()
+        classifier.predict(frame, kps_norm)
+        timings["count"] += counted - start
+        timings["classify"] += time.perf_counter() - counted
+        frames += 1
+    frames = max(frames, 1)
+    return {"pose_backend": classifier.pose_backend,
+            "video": os.path.basename(video_path),
+            "frames": frames,
+            "count_ms": timings["count"] / frames * 1000.,
+            "classify_ms": timings["classify"] / frames * 1000.,
+            "total_ms": (timings["count"] + timings["classify"]) / frames * 1000.}
+
+def main(examples_dir=DEFAULT_EXAMPLES_DIR, config_path=DEFAULT_CONFIG_DIR, model_path=MODEL_PATH,
+         mediapipe_model_path=MEDIAPIPE_MODEL_PATH, movenet_model_path=DEFAULT_MOVENET_NPZ_PATH):
+    examples = get_examples(examples_dir)
+    if len(examples) == 0:
+        raise Exception(f"no example video found in {examples_dir}")
+
+    classifiers = {"movenet": get_movenet_classifier(movenet_model_path)}
+    try:
+        classifiers["mediapipe"] = ExerciseClassifier(mediapipe_model_path)
+    except ImportError:
+        print(json.dumps({"pose_backend": "mediapipe", "skipped": "mediapipe is not installed"}))
+
+    rep_counter = RepetitionCounter(config_path=config_path, model_path=model_path)
+    try:
+        summaries = {}
+        for name, classifier in classifiers.items():
+            results = [benchmark_backend(classifier, rep_counter, video_path, exercise_name)
+                       for video_path, exercise_name in examples]
+            for result in results:
+                print(json.dumps(result))
+            frames = sum(r["frames"] for r in results)
+            summaries[name] = {key: sum(r[key] * r["frames"] for r in results) / frames
+                               for key in ["count_ms", "classify_ms", "total_ms"]}
+    finally:
+        rep_counter.close()
+
+    # both backends run movenet for counting, mediapipe runs a second pose estimation
+    for name, summary in summaries.items():
+        print(f"{name}: {summary['total_ms']:.2f} ms per frame "
+              f"(count {summary['count_ms']:.2f} ms, classify {summary['classify_ms']:.2f} ms)")
+    if len(summaries) == 2:
+        print(f"movenet backend saves {summaries['mediapipe']['total_ms'] - summaries['movenet']['total_ms']:.2f} ms per frame")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="Benchmark classifier pose backends",
+                                     description="""This program measures per frame cost of classifying
+                                     and counting example videos with the classifier on MediaPipe keypoints,
+                                     which runs a second pose estimation, and on movenet keypoints of the
+                                     repetition counter.
+                                     """)
+    parser.add_argument("--examples", help="Path to examples directory", default=DEFAULT_EXAMPLES_DIR)
+    parser.add_argument("--config", help="Path to exercise config json file", default=DEFAULT_CONFIG_DIR)
+    parser.add_argument("--model", help="Path to movenet model onnx file", default=MODEL_PATH)
+    parser.add_argument("--mediapipe_model", help="Path to classifier on MediaPipe keypoints", default=MEDIAPIPE_MODEL_PATH)
+    parser.add_argument("--movenet_model", help="Path to classifier on movenet keypoints, untrained weights are "
+                        "timed if missing", default=DEFAULT_MOVENET_NPZ_PATH)
+    args = parser.parse_args()
+
+    main(args.examples, args.config, args.model, args.mediapipe_model, args.movenet_model)
@@ -0,0 +1,233 @@
+import os
+import io
+import json
+import zipfile
+import argparse
+import numpy as np
+from rep_counting.pkg.kps_constant import KPS_INDEX_DICT
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# weights of RepModel.keras exported by this script, loaded with NumPy only
+DEFAULT_NPZ_PATH = os.path.join(BACKEND_DIR, 'RepModel.npz')
+DEFAULT_KERAS_PATH = os.path.join(BACKEND_DIR, 'RepModel.keras')
+DEFAULT_TFLITE_PATH = os.path.join(BACKEND_DIR, 'RepModelLite.tflite')
+# classifier trained on movenet keypoints by train_classifier.py
+DEFAULT_MOVENET_NPZ_PATH = os.path.join(BACKEND_DIR, 'RepModelMovenet.npz')
+
+# input size of classifier on mediapipe (33 xyz) and movenet (17 xy and score) keypoints
+MEDIAPIPE_FEATURE_SIZE = 33 * 3
+MOVENET_FEATURE_SIZE = 17 * 3
+
+HIP_KPS = [KPS_INDEX_DICT.left_hip.value, KPS_INDEX_DICT.right_hip.value]
+
+ACTIVATIONS = ["linear", "relu", "softmax"]
+
+def movenet_features(kps) -> np.ndarray:
+    """
+    Classifier features from movenet keypoints, xy centered on hips and
+    scaled by distance of the farthest keypoint so position and size of
+    the person in frame don't matter
+
+    Args:
+        kps (NDArray): (17, 3) or (frames, 17, 3) keypoints in xy coordinate
+        and confidence score, normalized to frame
+
+    Returns:
+        NDArray: (frames, 17*3) features
+    """
+    kps = np.asarray(kps, dtype=np.float32).reshape(-1, 17, 3)
+    features = kps.copy()
+    xy = features[:, :, :2]
+    xy -= xy[:, HIP_KPS].mean(axis=1, keepdims=True)
+    scale = np.abs(xy).max(axis=(1, 2), keepdims=True)
+    xy /= np.maximum(scale, 1e-6)
+    return features.reshape(len(features), MOVENET_FEATURE_SIZE)
+
+class DenseClassifier:
+    def __init__(self, kernels, biases, activations):
+        """
+        NumPy forward pass of a keras Sequential model made of Dense layers
+
+        Args:
+            kernels (list): (input, units) kernel of each layer
+            biases (list): (units,) bias of each layer
+            activations (list): activation name of each layer, one of ACTIVATIONS
+
+        Raises:
+            Exception: if an activation is not supported or shapes don't match
+        """
+        if not (len(kernels) == len(biases) == len(activations)):
+            raise Exception("kernels, biases and activations must have the same length")
+        for i, activation in enumerate(activations):
+            if activation not in ACTIVATIONS:
+                raise Exception(f"activation {activation} of layer {i} is not one of {ACTIVATIONS}")
+            if i > 0 and kernels[i].shape[0] != kernels[i-1].shape[1]:
+                raise Exception(f"kernel of layer {i} has shape {kernels[i].shape}, expected input {kernels[i-1].shape[1]}")
+        self.kernels = [np.ascontiguousarray(k, dtype=np.float32) for k in kernels]
+        self.biases = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+        self.input_size = self.kernels[0].shape[0]
+
+    @classmethod
+    def from_npz(cls, npz_path=DEFAULT_NPZ_PATH):
+        """
+        Load weights saved by save_npz
+        """
+        with np.load(npz_path) as data:
+            activations = [str(a) for a in data["activations"]]
+            kernels = [data[f"kernel_{i}"] for i in range(len(activations))]
+            biases = [data[f"bias_{i}"] for i in range(len(activations))]
+        return cls(kernels, biases, activations)
+
+    @classmethod
+    def from_keras(cls, keras_path=DEFAULT_KERAS_PATH):
+        """
+        Load weights from keras 3 model file, needs h5py but not tensorflow
+        """
+        try:
+            import h5py
+        except ImportError as e:
+            raise ImportError(f"loading {keras_path} needs h5py, install it with pip install h5py "
+                              "or load the .npz export of the model instead") from e
+
+        with zipfile.ZipFile(keras_path) as archive:
+            config = json.loads(archive.read("config.json"))
+            weights = archive.read("model.weights.h5")
+
+        layers = [layer["config"] for layer in config["config"]["layers"] if layer["class_name"] == "Dense"]
+        activations = [layer["activation"] for layer in layers]
+
+        with h5py.File(io.BytesIO(weights), "r") as f:
+            # weights are saved as layers/dense, layers/dense_1, ... in layer order
+            names = sorted(f["layers"].keys(), key=lambda name: int(name.rsplit("_", 1)[1]) if "_" in name else 0)
+            names = [name for name in names if name.startswith("dense")]
+            if len(names) != len(layers):
+                raise Exception(f"found {len(names)} dense weights for {len(layers)} dense layers in {keras_path}")
+            kernels = [f["layers"][name]["vars"]["0"][()] for name in names]
+            biases = [f["layers"][name]["vars"]["1"][()] for name in names]
+        return cls(kernels, biases, activations)
+
+    def save_npz(self, npz_path=DEFAULT_NPZ_PATH):
+        """
+        Save weights so they can be loaded with NumPy only
+        """
+        arrays = {"activations": np.array(self.activations)}
+        for i, (kernel, bias) in enumerate(zip(self.kernels, self.biases)):
+            arrays[f"kernel_{i}"] = kernel
+            arrays[f"bias_{i}"] = bias
+        np.savez(npz_path, **arrays)
+
+    def predict(self, x) -> np.ndarray:
+        """
+        Class probabilities of a batch
+
+        Args:
+            x (NDArray): (batch, input) or (input,) features
+
+        Returns:
+            NDArray: (batch, classes) probabilities
+        """
+        x = np.asarray(x, dtype=np.float32).reshape(-1, self.input_size)
+        for kernel, bias, activation in zip(self.kernels, self.biases, self.activations):
+            x = x @ kernel
+            x += bias
+            if activation == "relu":
+                np.maximum(x, 0., out=x)
+            elif activation == "softmax":
+                x -= x.max(axis=1, keepdims=True)
+                np.exp(x, out=x)
+                x /= x.sum(axis=1, keepdims=True)
+        return x
+
+class TFLiteClassifier:
+    def __init__(self, tflite_path=DEFAULT_TFLITE_PATH):
+        """
+        Run exported tflite model with tflite runtime,
+        ai_edge_litert or tflite_runtime must be installed
+
+        Args:
+            tflite_path (str, optional): path to tflite model
+        """
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError as e:
+                raise ImportError(f"running {tflite_path} needs ai_edge_litert or tflite_runtime, install one with "
+                                  "pip install ai-edge-litert or load the .npz export of the model instead") from e
+
+        self.interpreter = Interpreter(model_path=tflite_path)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.input_size = int(self.interpreter.get_input_details()[0]["shape"][-1])
+        self.batch_size = 1
+
+    def predict(self, x) -> np.ndarray:
+        """
+        Class probabilities of a batch
+
+        Args:
+            x (NDArray): (batch, input) or (input,) features
+
+        Returns:
+            NDArray: (batch, classes) probabilities
+        """
+        x = np.asarray(x, dtype=np.float32).reshape(-1, self.input_size)
+        # input is resized only when batch size changes
+        if len(x) != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input_index, list(x.shape))
+            self.interpreter.allocate_tensors()
+            self.batch_size = len(x)
+        self.interpreter.set_tensor(self.input_index, x)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index).copy()
+
+def load_classifier(model_path=DEFAULT_NPZ_PATH):
+    """
+    Load exercise classifier without tensorflow
+
+    Args:
+        model_path (str, optional): .npz weights, .keras model or .tflite model
+
+    Raises:
+        Exception: if model file type is not supported
+
+    Returns:
+        DenseClassifier or TFLiteClassifier: classifier with predict(x) -> probabilities
+    """
+    extension = os.path.splitext(model_path)[1].lower()
+    if extension == ".npz":
+        return DenseClassifier.from_npz(model_path)
+    if extension == ".keras":
+        return DenseClassifier.from_keras(model_path)
+    if extension == ".tflite":
+        return TFLiteClassifier(model_path)
+    raise Exception(f"unsupported classifier model {model_path}, expected .npz, .keras or .tflite")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="Export exercise classifier",
+                                     description="""This program exports RepModel.keras weights to
+                                     npz for the NumPy classifier and checks that its argmax matches
+                                     the tflite model on random features.
+                                     """)
+    parser.add_argument("--model", help="Path to keras model", default=DEFAULT_KERAS_PATH)
+    parser.add_argument("--output", help="Path to npz weights", default=DEFAULT_NPZ_PATH)
+    parser.add_argument("--tflite", help="Path to tflite model to compare with, skipped if empty", default=DEFAULT_TFLITE_PATH)
+    parser.add_argument("--samples", help="Number of random feature rows to compare", type=int, default=10000)
+    args = parser.parse_args()
+
+    classifier = DenseClassifier.from_keras(args.model)
+    classifier.save_npz(args.output)
+    print(f"weights of {args.model} saved to {args.output}")
+
+    if args.tflite:
+        # keypoints are normalized coordinates, mostly in 0 ~ 1
+        x = np.random.default_rng(0).uniform(-0.5, 1.5, (args.samples, classifier.input_size)).astype(np.float32)
+        expected = TFLiteClassifier(args.tflite).predict(x)
+        result = DenseClassifier.from_npz(args.output).predict(x)
+        agreement = float(np.mean(expected.argmax(axis=1) == result.argmax(axis=1)))
+        print(f"argmax agreement with {args.tflite} {agreement:.4f}, "
+              f"max probability difference {float(np.abs(expected - result).max()):.2e}")
@@ -1,107 +1,259 @@
 import os
+import argparse
+import threading
+import warnings
+from rep_counting.startup_profile import startup_profile
 import cv2
-import mediapipe as mp
 import numpy as np
-import pandas as pd
-import tensorflow as tf
-from sklearn.preprocessing import LabelEncoder
+from classifier_runtime import load_classifier, movenet_features, MOVENET_FEATURE_SIZE, DEFAULT_MOVENET_NPZ_PATH
 from rep_counting.pkg.kps_metrics import KpsMetrics
 from rep_counting.rep_counter import RepetitionCounter
+from rep_counting.live_pipeline import LivePipeline
+from streaming_classifier import StreamingClassifier
 
-# MediaPipe Pose initialization
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose()
+# Define exercise labels and pre-trained model path, labels are sorted
+# as the label encoder used for training sorts them
+labels = sorted(['barbell biceps curl', 'push up', 'squat'])
+MEDIAPIPE_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'RepModel.npz')
+# classifier on movenet keypoints shares pose estimation with repetition
+# counter, used once trained with train_classifier.py. No trained weights
+# are shipped yet, until then MediaPipe classifier is the default and
+# every frame runs both MediaPipe and movenet
+DEFAULT_MODEL_PATH = DEFAULT_MOVENET_NPZ_PATH if os.path.exists(DEFAULT_MOVENET_NPZ_PATH) else MEDIAPIPE_MODEL_PATH
 
-# Define exercise labels and load pre-trained model
-labels = ['barbell biceps curl', 'push up', 'squat']
-label_encoder = LabelEncoder()
-labels_encoded = label_encoder.fit_transform(labels)
-new_model = tf.keras.models.load_model('RepModel.keras')
-
-# Load repetition counter configuration
-DEFAULT_CONFIG_DIR = "./rep_counting/smart_trainer_config/config.json"
+# Repetition counter configuration
+DEFAULT_CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rep_counting", "smart_trainer_config", "config.json")
 exercise_dict = {'barbell biceps curl': 'bicep_curls', 'push up': 'push_ups', 'squat': 'squats'}
 
-# Video capture from webcam
-vid = cv2.VideoCapture(0)
-if not vid.isOpened():
-    print("Error opening video file")
-    exit()
-
-# Helper function to extract keypoints using MediaPipe
-def extract_keypoints(image):
-    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    results = pose.process(rgb_image)
-    if not results.pose_landmarks:
-        return np.zeros(33*3)
-    keypoints = []
-    for landmark in results.pose_landmarks.landmark:
-        keypoints.append([landmark.x, landmark.y, landmark.z])
-    return np.array(keypoints).flatten()
-
-# Initialize variables
-dict1 = {}
-maxv = None  # Initialize maxv to track the most frequent prediction
-rep_counter = None  # Initialize rep_counter later after warmup
-warmup_complete = False  # Flag to track warmup completion
-
-while vid.isOpened():
-    ret, frame = vid.read()
-    if not ret:
-        break
-    
-    # Warm-up phase: collect 30 frames to predict the exercise
-    if sum(dict1.values()) < 30:
-        keypoints = extract_keypoints(frame)
-        keypoints = np.expand_dims(keypoints, axis=0)
-        prediction = new_model.predict(keypoints)
-        predicted_class = label_encoder.inverse_transform([np.argmax(prediction)])[0]
-        
-        # Update prediction frequency
-        if predicted_class not in dict1:
-            dict1[predicted_class] = 1
-        else:
-            dict1[predicted_class] += 1
-        
-        # Display warm-up status
-        cv2.putText(frame, f'Warmup reps!', (10, 30), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
-        print(predicted_class)
-    
-    # Once 30 frames have been processed, determine the exercise and initialize the counter
-    if sum(dict1.values()) == 30 and not warmup_complete:
-        maxv = max(dict1, key=dict1.get)  # Determine the most frequent prediction
-        rep_counter = RepetitionCounter(config_path=DEFAULT_CONFIG_DIR)  # Initialize rep counter
-        rep_counter.set_metric(exercise_dict[maxv])  # Set the metric based on the identified exercise
-        warmup_complete = True  # Mark warm-up as complete
-    
-    # Rep counting phase: if warm-up is complete, start counting reps
-    if warmup_complete:
-        cv2.putText(frame, f'Exercise: {maxv}', (10, 30), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
-        
-        # Extract and normalize keypoints for rep counting
-        keypoints = extract_keypoints(frame)
-        kps_norm = rep_counter.update_metric(frame)
-        
-        # Draw the skeleton on the frame
-        frame = rep_counter.draw_kps_skeleton(frame, kps_norm, 5)
-        
-        # Get the current repetition count and display it
+class ExerciseClassifier:
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, model=None):
+        """
+        Exercise classifier, keypoints are classified by pre-trained model
+        without tensorflow, see classifier_runtime. Pose backend follows model
+        input, a model trained on movenet keypoints uses keypoints of the
+        repetition counter so each frame runs one pose estimation, a model
+        trained on MediaPipe Pose keypoints runs MediaPipe on the frame.
+
+        Args:
+            model_path (str, optional): path to .npz weights exported from keras
+            model or trained by train_classifier.py, .keras model or .tflite model
+            model (DenseClassifier, optional): already loaded classifier,
+            model_path is not loaded if given
+        """
+        self.model = model if model is not None else load_classifier(model_path)
+        self.pose_backend = "movenet" if self.model.input_size == MOVENET_FEATURE_SIZE else "mediapipe"
+        self.pose = None
+        if self.pose_backend == "mediapipe":
+            warnings.warn("exercise classifier was trained on MediaPipe keypoints, every frame runs MediaPipe and movenet. "
+                          f"Train {DEFAULT_MOVENET_NPZ_PATH} with train_classifier.py to run only movenet")
+            # MediaPipe Pose initialization
+            import mediapipe as mp
+            self.pose = mp.solutions.pose.Pose()
+
+    def extract_keypoints(self, image):
+        """
+        Extract keypoints using MediaPipe
+
+        Args:
+            image (NDArray): frame from opencv in BGR
+
+        Returns:
+            NDArray: (33*3,) flatten xyz keypoints, zeros if no pose found
+        """
+        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        results = self.pose.process(rgb_image)
+        if not results.pose_landmarks:
+            return np.zeros(33*3)
+        keypoints = []
+        for landmark in results.pose_landmarks.landmark:
+            keypoints.append([landmark.x, landmark.y, landmark.z])
+        return np.array(keypoints).flatten()
+
+    def features(self, image, kps=None):
+        """
+        Classifier features of a frame from the pose backend
+
+        Args:
+            image (NDArray): frame from opencv in BGR
+            kps (NDArray, optional): (17, 3) movenet keypoints of the frame from
+            RepetitionCounter, required by movenet pose backend. Defaults to None.
+
+        Raises:
+            Exception: if movenet pose backend is used without keypoints
+
+        Returns:
+            NDArray: (1, features) features
+        """
+        if self.pose_backend == "movenet":
+            if kps is None:
+                raise Exception("classifier trained on movenet keypoints needs kps of the frame")
+            return movenet_features(kps)
+        return np.expand_dims(self.extract_keypoints(image), axis=0)
+
+    def predict(self, image, kps=None) -> str:
+        """
+        Predict exercise label of a frame
+
+        Args:
+            image (NDArray): frame from opencv in BGR
+            kps (NDArray, optional): (17, 3) movenet keypoints of the frame, see features
+
+        Returns:
+            str: one of labels
+        """
+        return self.predict_batch(self.features(image, kps))[0]
+
+    def predict_batch(self, keypoints) -> list:
+        """
+        Predict exercise label of a window of frames in one model call
+
+        Args:
+            keypoints (NDArray): (frames, features) features, keypoints from
+            extract_keypoints or movenet_features depending on pose backend
+
+        Returns:
+            list: one of labels per frame
+        """
+        prediction = self.model.predict(keypoints)
+        return [labels[i] for i in np.argmax(prediction, axis=1)]
+
+def classify_and_count(vid, classifier:ExerciseClassifier, rep_counter:RepetitionCounter, show=True, drop_stale=True,
+                       streaming:StreamingClassifier=None, stop_event:threading.Event=None):
+    """
+    Classify the exercise continuously and count repetition of each exercise
+    until video ends, 'q' is pressed or stop_event is set, so one session covers a whole mixed
+    workout. When the exercise changes the repetition counter switches metric
+    in place. Capture, inference and display run on separate threads, see LivePipeline.
+
+    Args:
+        vid (cv2.VideoCapture): opened video capture
+        classifier (ExerciseClassifier): exercise classifier
+        rep_counter (RepetitionCounter): repetition counter, its metrics are reset
+        show (bool, optional): display the video feed with annotations. Defaults to True.
+        drop_stale (bool, optional): skip frames inference can't keep up with so it
+        always works on the newest frame, use False for video files. Defaults to True.
+        streaming (StreamingClassifier, optional): sliding window voting of classifier,
+        it is reset. Defaults to None, default window, stride and hysteresis.
+        stop_event (threading.Event, optional): end session when set, the only way
+        to end a camera session without display. Defaults to None.
+
+    Raises:
+        Exception: if video ends before exercise is predicted
+
+    Returns:
+        tuple: (last exercise name, its repetition count, dict of exercise name 
+        and repetition count of every exercise in order of first appearance)
+    """
+    if streaming is None:
+        streaming = StreamingClassifier(classifier)
+    streaming.reset()
+    rep_counter.reset_metrics()
+    # exercise labels in order of first appearance
+    state = {"label": None, "labels": []}
+
+    # Runs on inference thread
+    def process(frame):
+        # movenet runs once per frame, keypoints are shared with classifier
+        kps_norm = None
+        if state["label"] is not None:
+            kps_norm = rep_counter.update_metric(frame)
+        elif classifier.pose_backend == "movenet":
+            kps_norm = rep_counter.estimate_kps(frame)[0]
+
+        label = streaming.update(classifier.features(frame, kps_norm))
+        if label != state["label"]:
+            # Switch metric in place, other exercises keep their count,
+            # changes are kept in streaming.changes
+            rep_counter.set_metric(exercise_dict[label])
+            state["label"] = label
+            if label not in state["labels"]:
+                state["labels"].append(label)
+
+        if kps_norm is None or state["label"] is None:
+            return None
         metric = rep_counter.get_metric(rep_counter.current_metric_name)
-        cv2.putText(frame, f'Reps: {str(metric.reptition_count)}', (10, frame.shape[0] - 10), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
-
-    # Display the video feed with annotations
-    cv2.imshow("Video classification", frame)
-        
-    # Break the loop on 'q' key press
-    if cv2.waitKey(1) & 0xFF == ord("q"):
-        break
-
-# Release video capture and close windows
-vid.release()
-cv2.destroyAllWindows()
-
-print(exercise_dict[maxv])
-print(metric.reptition_count)
\ No newline at end of file
+        return kps_norm.copy(), label, metric.reptition_count
+
+    # Runs on calling thread
+    def render(frame, result):
+        if stop_event is not None and stop_event.is_set():
+            return False
+        if not show:
+            return True
+
+        if result is None:
+            # Display warm-up status
+            cv2.putText(frame, f'Warmup reps!', (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
+        else:
+            kps_norm, label, reptition_count = result
+            cv2.putText(frame, f'Exercise: {label}', (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
+
+            # Draw the skeleton on the frame
+            frame = rep_counter.draw_kps_skeleton(frame, kps_norm, 5)
+
+            # Get the current repetition count and display it
+            cv2.putText(frame, f'Reps: {str(reptition_count)}', (10, frame.shape[0] - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
+
+        # Display the video feed with annotations
+        cv2.imshow("Video classification", frame)
+
+        # Break the loop on 'q' key press
+        return not (cv2.waitKey(1) & 0xFF == ord("q"))
+
+    pipeline = LivePipeline(vid, process, render, drop_stale=drop_stale)
+    try:
+        pipeline.run()
+    finally:
+        if show:
+            cv2.destroyAllWindows()
+
+    if state["label"] is None:
+        raise Exception(f"video ended before {streaming.window_size} frames were classified")
+
+    exercise_counts = {exercise_dict[label]: rep_counter.get_metric(exercise_dict[label]).reptition_count
+                       for label in state["labels"]}
+    exercise_name = exercise_dict[state["label"]]
+    return exercise_name, exercise_counts[exercise_name], exercise_counts
+
+def main(model_path=DEFAULT_MODEL_PATH, camera_index=0, profile_startup=False):
+    startup_profile.mark("imports")
+    # heavy dependencies like mediapipe are imported by the step that needs them
+    with startup_profile.step("load classifier"):
+        classifier = ExerciseClassifier(model_path)
+    with startup_profile.step("load repetition counter"):
+        rep_counter = RepetitionCounter(config_path=DEFAULT_CONFIG_DIR)
+
+    # Video capture from webcam
+    with startup_profile.step("open camera"):
+        vid = cv2.VideoCapture(camera_index)
+    if not vid.isOpened():
+        print("Error opening video file")
+        exit()
+    if profile_startup:
+        startup_profile.print_report()
+
+    try:
+        exercise_name, rep_count, exercise_counts = classify_and_count(vid, classifier, rep_counter)
+    finally:
+        # Release video capture
+        vid.release()
+
+    for exercise_name, rep_count in exercise_counts.items():
+        print(exercise_name)
+        print(rep_count)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="Classify and count exercise",
+                                     description="""This program classifies exercises from webcam
+                                     and counts repetition of each exercise until 'q' is pressed.
+                                     """)
+    parser.add_argument("--model", help="Path to exercise classifier, .npz, .keras or .tflite", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--camera", help="OpenCV camera index", type=int, default=0)
+    parser.add_argument("--startup-profile", dest="startup_profile", action="store_true",
+                        help="Print time of imports, model loading and camera opening before the session starts")
+    args = parser.parse_args()
+
+    main(args.model, args.camera, args.startup_profile)
@@ -0,0 +1,177 @@
+import time
+import threading
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import pool
+
+class PoolTimeout(Exception):
+    pass
+
+class ConnectionPool:
+    def __init__(self, minconn=1, maxconn=10, statement_timeout_ms=5000, checkout_timeout=10.,
+                 health_check_interval=30., **connect_kwargs):
+        """
+        Thread safe PostgreSQL connection pool. Callers wait for a free
+        connection when all maxconn connections are checked out.
+
+        Args:
+            minconn (int, optional): connections opened when pool is created. Defaults to 1.
+            maxconn (int, optional): maximum number of connections. Defaults to 10.
+            statement_timeout_ms (int, optional): statement timeout of every connection
+            in milliseconds, 0 to disable. Defaults to 5000.
+            checkout_timeout (float, optional): seconds to wait for a free connection. Defaults to 10.
+            health_check_interval (float, optional): connection idle for more than this
+            many seconds is checked with SELECT 1 before checkout. Defaults to 30.
+            connect_kwargs: arguments of psycopg2.connect
+        """
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise Exception(f"pool size must be 0 <= minconn <= maxconn and maxconn >= 1, given {minconn} {maxconn}")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_kwargs = dict(connect_kwargs)
+        if statement_timeout_ms:
+            options = self.connect_kwargs.get("options", "")
+            self.connect_kwargs["options"] = f"{options} -c statement_timeout={int(statement_timeout_ms)}".strip()
+
+        # pool is created on first checkout so server can start without database
+        self.pool = None
+        self.slots = threading.BoundedSemaphore(maxconn)
+        self.lock = threading.Lock()
+
+        # last time each connection was returned to pool
+        self.last_used = {}
+
+        # metrics
+        self.waits = 0
+        self.checkouts = 0
+        self.in_use = 0
+        self.checkout_timeouts = 0
+        self.health_check_failures = 0
+        self.wait_time_total = 0.
+        self.wait_time_max = 0.
+
+    def _get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = pool.ThreadedConnectionPool(self.minconn, self.maxconn, **self.connect_kwargs)
+            return self.pool
+
+    def _is_healthy(self, conn) -> bool:
+        """
+        Check connection is open, connections idle for longer than
+        health_check_interval are checked with a round trip
+        """
+        if conn.closed:
+            return False
+        last_used = self.last_used.get(id(conn), None)
+        if last_used is None or time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self, db_pool):
+        """
+        Get a healthy connection, broken connections are replaced
+        """
+        while True:
+            conn = db_pool.getconn()
+            if self._is_healthy(conn):
+                return conn
+            with self.lock:
+                self.health_check_failures += 1
+            self.last_used.pop(id(conn), None)
+            db_pool.putconn(conn, close=True)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Check out a connection for the duration of the with block. Not
+        committed changes are rolled back when connection is returned.
+
+        Args:
+            timeout (float, optional): seconds to wait for a free connection.
+            Defaults to checkout_timeout.
+
+        Raises:
+            PoolTimeout: if no connection is free in time
+
+        Yields:
+            connection: psycopg2 connection
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        acquired = self.slots.acquire(timeout=timeout)
+        wait_time = time.monotonic() - start
+        with self.lock:
+            self.waits += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+            if not acquired:
+                self.checkout_timeouts += 1
+        if not acquired:
+            raise PoolTimeout(f"no database connection free after {timeout} seconds")
+
+        try:
+            db_pool = self._get_pool()
+            conn = self._checkout(db_pool)
+            with self.lock:
+                self.checkouts += 1
+                self.in_use += 1
+            try:
+                yield conn
+            finally:
+                broken = bool(conn.closed)
+                if not broken:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        broken = True
+                with self.lock:
+                    self.in_use -= 1
+                if broken:
+                    self.last_used.pop(id(conn), None)
+                else:
+                    self.last_used[id(conn)] = time.monotonic()
+                db_pool.putconn(conn, close=broken)
+        finally:
+            self.slots.release()
+
+    def get_stats(self) -> dict:
+        """
+        Get pool metrics
+
+        Returns:
+            dict: pool size, checkouts, connections in use, timeouts,
+            health check failures and wait time in seconds
+        """
+        with self.lock:
+            return {
+                "minconn": self.minconn,
+                "maxconn": self.maxconn,
+                "waits": self.waits,
+                "checkouts": self.checkouts,
+                "in_use": self.in_use,
+                "checkout_timeouts": self.checkout_timeouts,
+                "health_check_failures": self.health_check_failures,
+                "wait_time_total": self.wait_time_total,
+                "wait_time_max": self.wait_time_max,
+                "wait_time_avg": self.wait_time_total / self.waits if self.waits else 0.
+            }
+
+    def close(self):
+        """
+        Close all connections
+        """
+        with self.lock:
+            if self.pool is not None:
+                self.pool.closeall()
+                self.pool = None
+            self.last_used.clear()
@@ -0,0 +1,142 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+# longest exercise session in seconds, a session a client never
+# stops is ended so it can't hold the worker thread forever
+MAX_EXERCISE_SECONDS = 15 * 60.
+
+class InferenceService:
+    def __init__(self, config_path=None, model_path=None, max_exercise_seconds=MAX_EXERCISE_SECONDS):
+        """
+        Long-lived inference worker. Exercise classifier and repetition
+        counter are loaded once on the worker thread and every exercise
+        request runs on that same thread one after another. Sessions run
+        without display by default, OpenCV windows can't be used from a
+        worker thread of a server and fail with headless OpenCV.
+
+        Args:
+            config_path (str, optional): path to exercise config json file.
+            Defaults to classify_count.DEFAULT_CONFIG_DIR.
+            model_path (str, optional): path to exercise classifier, .npz, .keras or .tflite.
+            Defaults to classify_count.DEFAULT_MODEL_PATH.
+            max_exercise_seconds (float, optional): exercise session is ended after this 
+            many seconds if it was not stopped. Defaults to MAX_EXERCISE_SECONDS.
+        """
+        self.config_path = config_path
+        self.model_path = model_path
+        self.max_exercise_seconds = max_exercise_seconds
+        self.classifier = None
+        self.rep_counter = None
+        self.executor = None
+        self.loaded = None
+        self.lock = threading.Lock()
+        # set to end running exercise session
+        self.exercise_stop = None
+
+    def start(self):
+        """
+        Start worker thread and load models in background,
+        calling it again does nothing
+        """
+        with self.lock:
+            if self.executor is not None:
+                return
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+            self.loaded = self.executor.submit(self._load)
+
+    def _load(self):
+        """
+        Load exercise classifier and repetition counter, run on worker thread
+        """
+        # heavy imports are done on worker thread so
+        # server start is not blocked
+        from classify_count import ExerciseClassifier, DEFAULT_CONFIG_DIR, DEFAULT_MODEL_PATH
+        from rep_counting.rep_counter import RepetitionCounter
+
+        self.classifier = ExerciseClassifier(model_path=self.model_path or DEFAULT_MODEL_PATH)
+        self.rep_counter = RepetitionCounter(config_path=self.config_path or DEFAULT_CONFIG_DIR)
+
+    def _run_exercise(self, camera_index, show):
+        """
+        Classify and count one exercise from camera, run on worker thread
+        """
+        from classify_count import classify_and_count
+        from rep_counting.stage_metrics import stage_metrics
+
+        stage_metrics.inc("sessions", event="exercise")
+        vid = cv2.VideoCapture(camera_index)
+        if not vid.isOpened():
+            raise Exception(f"Unable to open camera {camera_index}")
+        stop_event = threading.Event()
+        with self.lock:
+            self.exercise_stop = stop_event
+        # end session of a client that never calls stop_exercise
+        limit_timer = threading.Timer(self.max_exercise_seconds, stop_event.set)
+        limit_timer.daemon = True
+        limit_timer.start()
+        try:
+            exercise_name, rep_count, exercise_counts = classify_and_count(vid, self.classifier, self.rep_counter, show=show,
+                                                                           stop_event=stop_event)
+        finally:
+            limit_timer.cancel()
+            with self.lock:
+                self.exercise_stop = None
+            vid.release()
+        return {"exercise_name": exercise_name, "rep_count": int(rep_count),
+                "exercises": [{"exercise_name": name, "rep_count": int(count)} for name, count in exercise_counts.items()]}
+
+    def start_exercise(self, camera_index=0, show=False) -> dict:
+        """
+        Classify exercise and count repetition from camera until the
+        session is ended by stop_exercise or runs for max_exercise_seconds,
+        exercise may change during the session. Requests wait for each other.
+
+        Args:
+            camera_index (int, optional): OpenCV camera index. Defaults to 0.
+            show (bool, optional): display video feed, only works where OpenCV can 
+            open windows off the main thread. Defaults to False.
+
+        Raises:
+            Exception: if models failed to load or exercise failed
+
+        Returns:
+            dict: exercise_name and rep_count of last exercise, exercises
+            list of exercise_name and rep_count of every exercise in session
+        """
+        self.start()
+        # raise loading error if there is any
+        self.loaded.result()
+        return self.executor.submit(self._run_exercise, camera_index, show).result()
+
+    def stop_exercise(self) -> bool:
+        """
+        End running exercise session, start_exercise then returns its counts
+
+        Returns:
+            bool: True if a session was running
+        """
+        with self.lock:
+            if self.exercise_stop is None:
+                return False
+            self.exercise_stop.set()
+            return True
+
+    def is_ready(self) -> bool:
+        """
+        Check if models are loaded
+
+        Returns:
+            bool: True if models are loaded successfully
+        """
+        return self.loaded is not None and self.loaded.done() and self.loaded.exception() is None
+
+    def stop(self):
+        """
+        Stop worker thread after running requests are finished
+        """
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+                self.executor = None
+                self.loaded = None
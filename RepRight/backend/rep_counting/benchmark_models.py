@@ -0,0 +1,151 @@
+import os
+import glob
+import json
+import time
+import argparse
+from .rep_counter import RepetitionCounter
+from .motion_scheduler import MotionScheduler
+from .movenet.movenet_infer import MODEL_VARIANTS
+from .movenet.movenet_crop import CropTracker
+from .movenet.session_registry import session_registry
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "smart_trainer_config", "config.json")
+DEFAULT_EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "examples")
+
+# example subdirectory name and exercise name of repetition counter
+EXAMPLE_EXERCISES = {
+    "bicepcurl": "bicep_curls",
+    "pushup": "push_ups",
+    "squat": "squats"
+}
+
+def get_examples(examples_dir=DEFAULT_EXAMPLES_DIR) -> list[tuple]:
+    """
+    Find example videos, each subdirectory of examples_dir
+    is named after the exercise in its videos
+
+    Returns:
+        list: (video path, exercise name) pairs
+    """
+    examples = []
+    for sub_dir, exercise_name in EXAMPLE_EXERCISES.items():
+        for video_path in sorted(glob.glob(os.path.join(examples_dir, sub_dir, "*.mp4"))):
+            examples.append((video_path, exercise_name))
+    return examples
+
+def benchmark_variant(variant, examples, config_path=DEFAULT_CONFIG_PATH, batch_size=8, scheduler_options=None,
+                      crop=False) -> list[dict]:
+    """
+    Count repetitions of all examples with one model variant
+
+    Args:
+        - variant (str): one of MODEL_VARIANTS
+        - examples (list): (video path, exercise name) pairs
+        - config_path (str, optional): path to exercise config json file
+        - batch_size (int, optional): number of frames per movenet run
+        - scheduler_options (dict, optional): MotionScheduler options to skip
+        movenet on frames with little motion. Defaults to None, no frame is skipped.
+        - crop (bool, optional): run movenet on crop around person. Defaults to False.
+
+    Returns:
+        list: one result per example with repetition count and fps
+    """
+    rep_counter = RepetitionCounter(config_path=config_path, model_path=MODEL_VARIANTS[variant]["model_path"])
+    label = variant + ("+adaptive" if scheduler_options is not None else "") + ("+crop" if crop else "")
+    results = []
+    try:
+        for video_path, exercise_name in examples:
+            scheduler = MotionScheduler(**scheduler_options) if scheduler_options is not None else None
+            crop_tracker = CropTracker() if crop else None
+            start = time.perf_counter()
+            result = rep_counter.process_video(video_path, exercise_name, batch_size=batch_size,
+                                               scheduler=scheduler, crop_tracker=crop_tracker)
+            elapsed = time.perf_counter() - start
+            num_frames = len(result["keypoints"])
+            results.append({"variant": label,
+                            "video": os.path.relpath(video_path, os.path.dirname(os.path.dirname(video_path))),
+                            "exercise_name": exercise_name,
+                            "reptition_count": result["reptition_count"],
+                            "frames": num_frames,
+                            "inferred_frames": result["inferred_count"],
+                            "fps": num_frames / elapsed if elapsed > 0 else 0.})
+    finally:
+        rep_counter.close()
+        session_registry.unload()
+    return results
+
+def main(variants, reference_variant="thunder", examples_dir=DEFAULT_EXAMPLES_DIR, config_path=DEFAULT_CONFIG_PATH,
+         batch_size=8, expected_path=None, scheduler_options=None, crop=False):
+    examples = get_examples(examples_dir)
+    if len(examples) == 0:
+        raise Exception(f"no mp4 examples found in {examples_dir}")
+
+    variants = [v for v in variants if os.path.isfile(MODEL_VARIANTS[v]["model_path"])]
+    if reference_variant not in variants and expected_path is None:
+        raise Exception(f"{MODEL_VARIANTS[reference_variant]['model_path']} was not found, "
+                        f"give expected counts instead")
+
+    results = {variant: benchmark_variant(variant, examples, config_path, batch_size) for variant in variants}
+    # same variants with motion scheduling, counts must not change
+    if scheduler_options is not None:
+        for variant in variants:
+            results[f"{variant}+adaptive"] = benchmark_variant(variant, examples, config_path, batch_size, scheduler_options)
+    # same variants on crop around person
+    if crop:
+        for variant in variants:
+            results[f"{variant}+crop"] = benchmark_variant(variant, examples, config_path, batch_size, crop=True)
+
+    # expected counts are labeled counts or counts of reference variant
+    if expected_path is not None:
+        with open(expected_path, 'r') as f:
+            expected = json.load(f)
+    else:
+        expected = {r["video"]: r["reptition_count"] for r in results[reference_variant]}
+
+    summaries = []
+    for variant, variant_results in results.items():
+        for r in variant_results:
+            r["expected_count"] = expected.get(r["video"], None)
+            r["agree"] = r["reptition_count"] == r["expected_count"]
+            print(json.dumps(r))
+        summaries.append({"variant": variant,
+                          "fps": sum(r["frames"] for r in variant_results) /
+                                 sum(r["frames"] / r["fps"] for r in variant_results if r["fps"] > 0),
+                          "agreement": sum(r["agree"] for r in variant_results) / len(variant_results),
+                          "inferred_ratio": sum(r["inferred_frames"] for r in variant_results) /
+                                            sum(r["frames"] for r in variant_results)})
+
+    for summary in summaries:
+        print(json.dumps(summary))
+
+    # fastest model that counts every example correctly
+    agreeing = [s for s in summaries if s["agreement"] == 1.]
+    if agreeing:
+        print(f"cheapest agreeing variant {max(agreeing, key=lambda s: s['fps'])['variant']}")
+    else:
+        print("no variant agrees on every example")
+    return summaries
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="Benchmark movenet model variants",
+                                     description="""This program counts repetitions of example videos
+                                     with each movenet model variant and reports fps and agreement of
+                                     repetition counts, one json line per video and per variant. Variants
+                                     without model file are skipped. Run from backend directory with
+                                     python -m rep_counting.benchmark_models
+                                     """)
+    parser.add_argument("--variants", help="Model variants to benchmark", nargs="+",
+                        choices=list(MODEL_VARIANTS.keys()), default=list(MODEL_VARIANTS.keys()))
+    parser.add_argument("--reference_variant", help="Variant whose counts are expected when no expected counts are given",
+                        choices=list(MODEL_VARIANTS.keys()), default="thunder")
+    parser.add_argument("--examples", help="Directory with one subdirectory of mp4 examples per exercise", default=DEFAULT_EXAMPLES_DIR)
+    parser.add_argument("--config", help="Path to json config file", default=DEFAULT_CONFIG_PATH)
+    parser.add_argument("--batch_size", help="Number of frames per movenet run, needs a model with dynamic batch dimension", type=int, default=8)
+    parser.add_argument("--expected", help="Json file of expected count per video e.g {\"pushup/push-up_1.mp4\": 10}", default=None)
+    parser.add_argument("--adaptive", help="Also benchmark each variant with motion scheduling", action="store_true")
+    parser.add_argument("--latency_budget_ms", help="Average movenet time per frame allowed with motion scheduling", type=float, default=None)
+    parser.add_argument("--crop", help="Also benchmark each variant on crop around person", action="store_true")
+    args = parser.parse_args()
+
+    scheduler_options = {"latency_budget_ms": args.latency_budget_ms} if args.adaptive else None
+    main(args.variants, args.reference_variant, args.examples, args.config, args.batch_size, args.expected, scheduler_options, args.crop)
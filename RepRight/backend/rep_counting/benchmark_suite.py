@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import cv2
+import numpy as np
+import onnxruntime as ort
+from .rep_counter import RepetitionCounter
+from .video_reader import VideoReader
+from .benchmark_models import get_examples, DEFAULT_CONFIG_PATH, DEFAULT_EXAMPLES_DIR
+from .movenet.movenet_infer import load_model, predict, preprocess_input_image_cv, preprocess_kps, get_input_size, \
+    get_model_path, MODEL_VARIANTS, DEFAULT_MODEL_VARIANT
+from .pkg.kps_metrics_bicep_curl import KpsMetricsBicepCurl
+from .pkg.kps_metrics_push_up import KpsMetricsPushup
+from .pkg.kps_metrics_squat import KpsMetricsSquat
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(__file__), "benchmarks", "baseline.json")
+
+# a result regresses when its best time grows by more than this ratio,
+# best of rounds is less sensitive to other load on the machine than median
+DEFAULT_THRESHOLD = 0.2
+
+# number of frames fed to a metric before timing it late in a long session
+LONG_SESSION_FRAMES = 20000
+
+# webcam frame size
+FRAME_SIZE = (1280, 720)
+
+METRIC_CLASSES = [KpsMetricsBicepCurl, KpsMetricsPushup, KpsMetricsSquat]
+
+def measure(func, number=100, repeat=7) -> dict:
+    """
+    Time func, number calls per round
+
+    Args:
+        - func (callable): function without argument
+        - number (int, optional): calls per round. Defaults to 100.
+        - repeat (int, optional): rounds, median and min are taken over them. Defaults to 7.
+
+    Returns:
+        dict: median_us and min_us per call, number and repeat
+    """
+    # warm up caches and lazy initialization
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return {"median_us": statistics.median(times) * 1e6, "min_us": min(times) * 1e6,
+            "number": number, "repeat": repeat}
+
+def synthetic_kps(frames, seed=0) -> np.ndarray:
+    """
+    Keypoints of a person moving periodically, so metrics
+    cross their mean and repetitions are counted
+
+    Returns:
+        NDArray: (frames, 17, 3) keypoints in xy coordinate and score
+    """
+    rng = np.random.default_rng(seed)
+    pose = rng.uniform(0.3, 0.7, (17, 2))
+    motion = rng.uniform(-0.1, 0.1, (17, 2))
+    phase = np.sin(np.arange(frames) * 2 * np.pi / 30.)[:, None, None]
+    kps = np.empty((frames, 17, 3), dtype=np.float32)
+    kps[:, :, :2] = pose + motion * phase + rng.normal(0., 0.005, (frames, 17, 2))
+    kps[:, :, 2] = 0.9
+    return kps
+
+def benchmark_movenet(model_path, number=50, repeat=7) -> dict:
+    """
+    Time movenet predict and its pre and post processing on a webcam frame
+    """
+    model = load_model(model_path)
+    input_size = get_input_size(model)
+    frame = np.random.default_rng(0).integers(0, 256, (FRAME_SIZE[1], FRAME_SIZE[0], 3), dtype=np.uint8)
+    input_img = preprocess_input_image_cv(frame, input_size)
+    kps = predict(input_img, model)
+    return {
+        "preprocess_input_image_cv": measure(lambda: preprocess_input_image_cv(frame, input_size), number * 4, repeat),
+        "predict": measure(lambda: predict(input_img, model), number, repeat),
+        "preprocess_kps": measure(lambda: preprocess_kps(kps.copy()), number * 20, repeat),
+    }
+
+def benchmark_metrics(config_path=DEFAULT_CONFIG_PATH, number=1000, repeat=7,
+                      long_session_frames=LONG_SESSION_FRAMES) -> dict:
+    """
+    Time update_metrics of every exercise at start of a session and
+    after long_session_frames frames, so growth over a session shows up
+    """
+    kps = synthetic_kps(long_session_frames + number)
+    results = {}
+    for metric_class in METRIC_CLASSES:
+        for stage, offset in [("start", 0), ("late", long_session_frames)]:
+            metric = metric_class(config_path=config_path)
+            for i in range(offset):
+                metric.update_metrics(kps[i])
+            # frames keep moving so counting runs as in a session
+            frame_index = [offset]
+            def update(metric=metric, frame_index=frame_index, offset=offset):
+                metric.update_metrics(kps[frame_index[0]])
+                frame_index[0] = offset + (frame_index[0] - offset + 1) % number
+            results[f"update_metrics[{metric.get_exercise_name()}:{stage}]"] = measure(update, number, repeat)
+    return results
+
+def benchmark_draw(rep_counter:RepetitionCounter, number=200, repeat=7) -> dict:
+    """
+    Time draw_kps_skeleton on a webcam frame
+    """
+    frame = np.zeros((FRAME_SIZE[1], FRAME_SIZE[0], 3), dtype=np.uint8)
+    kps = synthetic_kps(1)[0]
+    return {"draw_kps_skeleton": measure(lambda: rep_counter.draw_kps_skeleton(frame, kps, 5), number, repeat)}
+
+def benchmark_update_metric(rep_counter:RepetitionCounter, examples, repeat=3) -> dict:
+    """
+    Time RepetitionCounter.update_metric per frame over each example video,
+    frames are decoded before timing
+    """
+    results = {}
+    for video_path, exercise_name in examples:
+        frames = list(VideoReader(video_path))
+        times = []
+        for _ in range(repeat):
+            rep_counter.reset_metrics()
+            rep_counter.set_metric(exercise_name)
+            start = time.perf_counter()
+            for frame in frames:
+                rep_counter.update_metric(frame)
+            times.append((time.perf_counter() - start) / max(len(frames), 1))
+        name = os.path.relpath(video_path, os.path.dirname(os.path.dirname(video_path)))
+        results[f"update_metric[{name}]"] = {"median_us": statistics.median(times) * 1e6, "min_us": min(times) * 1e6,
+                                             "number": len(frames), "repeat": repeat}
+    return results
+
+def get_environment(model_path) -> dict:
+    return {"python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "onnxruntime": ort.__version__,
+            "model": os.path.basename(model_path)}
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD) -> list[dict]:
+    """
+    Compare best times with baseline
+
+    Args:
+        - results (dict): benchmark name and result pairs
+        - baseline (dict): benchmark name and result pairs of baseline
+        - threshold (float, optional): allowed growth ratio of best time
+
+    Returns:
+        list: benchmarks slower than baseline by more than threshold
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline or baseline[name]["min_us"] <= 0:
+            continue
+        ratio = result["min_us"] / baseline[name]["min_us"]
+        if ratio - 1. > threshold:
+            regressions.append({"benchmark": name, "baseline_us": baseline[name]["min_us"],
+                                "min_us": result["min_us"], "ratio": ratio})
+    return regressions
+
+def main(model_path, examples_dir=DEFAULT_EXAMPLES_DIR, config_path=DEFAULT_CONFIG_PATH, output_path=None,
+         baseline_path=DEFAULT_BASELINE_PATH, threshold=DEFAULT_THRESHOLD, save_baseline=False, quick=False,
+         allow_missing_baseline=False) -> bool:
+    scale = 0.2 if quick else 1.
+    results = {}
+    results.update(benchmark_movenet(model_path, number=max(int(50 * scale), 1)))
+    results.update(benchmark_metrics(config_path, number=max(int(1000 * scale), 1),
+                                     long_session_frames=int(LONG_SESSION_FRAMES * scale)))
+    rep_counter = RepetitionCounter(config_path=config_path, model_path=model_path)
+    try:
+        results.update(benchmark_draw(rep_counter, number=max(int(200 * scale), 1)))
+        results.update(benchmark_update_metric(rep_counter, get_examples(examples_dir), repeat=1 if quick else 3))
+    finally:
+        rep_counter.close()
+
+    for name, result in results.items():
+        print(json.dumps({"benchmark": name, **result}))
+
+    report = {"environment": get_environment(model_path), "results": results}
+    if output_path is not None:
+        with open(output_path, "w") as f:
+            json.dump(report, f, indent=2)
+    if save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+        with open(baseline_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {baseline_path}")
+        return True
+
+    if not os.path.isfile(baseline_path):
+        # baselines depend on the machine, a check without one must not pass silently
+        print(f"no baseline at {baseline_path}, run with --save_baseline on this machine to create one")
+        return allow_missing_baseline
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    if baseline.get("environment", {}) != report["environment"]:
+        print("baseline was measured in a different environment, compare with care")
+    regressions = compare(results, baseline["results"], threshold)
+    for regression in regressions:
+        print(json.dumps({"regression": regression}))
+    print(f"{len(regressions)} of {len(results)} benchmarks regressed by more than {threshold:.0%}")
+    return len(regressions) == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="Benchmark repetition counting hot paths",
+                                     description="""This program times movenet pre and post processing and
+                                     inference, exercise metrics at start and late in a long session, skeleton
+                                     drawing and the update_metric loop over example videos. Results are
+                                     compared with a stored baseline and the program exits with status 1 when
+                                     a best time regressed by more than the threshold or there is no
+                                     baseline. Run from backend
+                                     directory with python -m rep_counting.benchmark_suite
+                                     """)
+    parser.add_argument("--model_variant", help="Movenet model variant", choices=list(MODEL_VARIANTS.keys()),
+                        default=DEFAULT_MODEL_VARIANT)
+    parser.add_argument("--examples", help="Path to examples directory", default=DEFAULT_EXAMPLES_DIR)
+    parser.add_argument("--config", help="Path to exercise config json file", default=DEFAULT_CONFIG_PATH)
+    parser.add_argument("--output", help="Path to save results json", default=None)
+    parser.add_argument("--baseline", help="Path to baseline results json", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--threshold", help="Allowed growth ratio of best time", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--save_baseline", help="Save results as baseline instead of comparing", action="store_true")
+    parser.add_argument("--quick", help="Fewer iterations, for a smoke test", action="store_true")
+    parser.add_argument("--allow_missing_baseline", help="Pass when there is no baseline to compare with", action="store_true")
+    args = parser.parse_args()
+
+    passed = main(get_model_path(args.model_variant), args.examples, args.config, args.output, args.baseline,
+                  args.threshold, args.save_baseline, args.quick, args.allow_missing_baseline)
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,79 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from .rep_counter import RepetitionCounter
+from .movenet.movenet_crop import CropTracker
+from .motion_scheduler import MotionScheduler, DEFAULT_MOTION_THRESHOLD, DEFAULT_MAX_SKIP
+from .kps_cache import KpsCache, DEFAULT_CACHE_DIR
+from .movenet.movenet_infer import get_model_path, MODEL_PATH, MODEL_VARIANTS, DEFAULT_MODEL_VARIANT
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "smart_trainer_config", "config.json")
+
+def main(video_paths, exercise_name, config_path=DEFAULT_CONFIG_PATH, batch_size=8, output_directory=None, model_path=MODEL_PATH,
+         scheduler_options=None, crop=False, kps_cache_dir=None):
+    rep_counter = RepetitionCounter(config_path=config_path, model_path=model_path)
+    kps_cache = KpsCache(kps_cache_dir) if kps_cache_dir else None
+
+    if output_directory and not os.path.isdir(output_directory):
+        os.makedirs(output_directory)
+
+    for video_path in video_paths:
+        # skip movenet on frames with little motion
+        scheduler = MotionScheduler(**scheduler_options) if scheduler_options is not None else None
+        # run movenet on crop around person
+        crop_tracker = CropTracker() if crop else None
+        start = time.perf_counter()
+        result = rep_counter.process_video(video_path, exercise_name, batch_size=batch_size,
+                                           scheduler=scheduler, crop_tracker=crop_tracker, kps_cache=kps_cache)
+        elapsed = time.perf_counter() - start
+        num_frames = len(result["keypoints"])
+
+        # save keypoints and metric traces
+        if output_directory:
+            name = os.path.splitext(os.path.basename(video_path))[0]
+            np.savez(os.path.join(output_directory, f"{name}.npz"),
+                     keypoints=result["keypoints"],
+                     confidence_rates=result["confidence_rates"],
+                     reptition_counts=result["reptition_counts"],
+                     **{f"metric_{k}": v for k, v in result["metrics"].items()})
+
+        print(json.dumps({"video": str(video_path),
+                          "exercise_name": result["exercise_name"],
+                          "reptition_count": result["reptition_count"],
+                          "frames": num_frames,
+                          "inferred_frames": result["inferred_count"],
+                          "seconds": elapsed,
+                          "fps": num_frames / elapsed if elapsed > 0 else 0.}))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="Count exercise repetition in videos",
+                                     description="""This program counts exercise repetition in
+                                     video files without display and prints one json line per video.
+                                     Run from backend directory with python -m rep_counting.count_video
+                                     """)
+    parser.add_argument("--video", help="Path to video file", nargs="+", required=True)
+    parser.add_argument("--exercise_name", help="Exercise name e.g bicep_curls, push_ups, squats", required=True)
+    parser.add_argument("--config", help="Path to json config file", default=DEFAULT_CONFIG_PATH)
+    parser.add_argument("--batch_size", help="Number of frames per movenet run, needs a model with dynamic batch dimension",
+                        type=int, default=8)
+    parser.add_argument("--output_directory", help="Directory to save keypoints and metrics as npz", default=None)
+    parser.add_argument("--model_variant", help="Movenet model variant", choices=list(MODEL_VARIANTS.keys()), default=DEFAULT_MODEL_VARIANT)
+    parser.add_argument("--adaptive", help="Skip movenet on frames with little motion", action="store_true")
+    parser.add_argument("--motion_threshold", help="Mean gray level difference to run movenet", type=float, default=DEFAULT_MOTION_THRESHOLD)
+    parser.add_argument("--max_skip", help="Maximum number of frames skipped in a row", type=int, default=DEFAULT_MAX_SKIP)
+    parser.add_argument("--latency_budget_ms", help="Average movenet time per frame allowed", type=float, default=None)
+    parser.add_argument("--crop", help="Run movenet on crop around person found in last frame", action="store_true")
+    parser.add_argument("--kps_cache", help=f"Read keypoints from cache directory instead of running movenet, defaults to {DEFAULT_CACHE_DIR} "
+                        "when given without directory, not used with --adaptive or --crop", nargs="?", const=DEFAULT_CACHE_DIR, default=None)
+    args = parser.parse_args()
+
+    scheduler_options = None
+    if args.adaptive:
+        scheduler_options = {"motion_threshold": args.motion_threshold,
+                             "max_skip": args.max_skip,
+                             "latency_budget_ms": args.latency_budget_ms}
+
+    main(args.video, args.exercise_name.lower(), args.config, args.batch_size, args.output_directory,
+         get_model_path(args.model_variant), scheduler_options, args.crop, args.kps_cache)
@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import cv2
+from .rep_counter import RepetitionCounter
+from .video_reader import VideoReader
+from .motion_scheduler import MotionScheduler, DEFAULT_MOTION_THRESHOLD, DEFAULT_MAX_SKIP
+from .movenet.movenet_crop import CropTracker
+from .movenet.movenet_infer import get_model_path, MODEL_VARIANTS, DEFAULT_MODEL_VARIANT
+from .benchmark_models import EXAMPLE_EXERCISES, DEFAULT_CONFIG_PATH, DEFAULT_EXAMPLES_DIR
+
+MANIFEST_NAME = "manifest.json"
+
+# repetition counter of worker process, created once by _init_worker
+_worker_counter = None
+
+def load_manifest(manifest_path) -> list[dict]:
+    """
+    Load true repetition counts of videos. Manifest is a json object of video
+    path relative to manifest and either repetition count or an object with
+    reptition_count and exercise_name. Exercise name defaults to the exercise
+    of the video subdirectory, see EXAMPLE_EXERCISES. Counts must be labelled
+    by hand from the video, never taken from the counter under test, label
+    says how. A video derived from another one is named freely and gives
+    source video path, start_frame and end_frame to cut it, loops to play it again
+    and mirror to flip it horizontally, so its count follows from the hand
+    labelled count of source.
+
+    Args:
+        manifest_path (str): path to manifest json file
+
+    Raises:
+        Exception: if a video doesn't exist or its exercise name is unknown
+
+    Returns:
+        list: video, video_path, exercise_name, expected_count, start_frame,
+        end_frame, loops and mirror of every video
+    """
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+
+    root_dir = os.path.dirname(os.path.abspath(manifest_path))
+    videos = []
+    for video, entry in manifest.items():
+        if not isinstance(entry, dict):
+            entry = {"reptition_count": entry}
+        video_path = os.path.join(root_dir, entry.get("source", video))
+        if not os.path.isfile(video_path):
+            raise Exception(f"{video_path} of {manifest_path} doesn't exists")
+        sub_dir = os.path.basename(os.path.dirname(video_path))
+        exercise_name = entry.get("exercise_name", EXAMPLE_EXERCISES.get(sub_dir))
+        if exercise_name is None:
+            raise Exception(f"exercise_name of {video} is not given and {sub_dir} is not one of {list(EXAMPLE_EXERCISES.keys())}")
+        videos.append({"video": video, "video_path": video_path, "exercise_name": exercise_name,
+                       "expected_count": int(entry["reptition_count"]),
+                       "start_frame": int(entry.get("start_frame", 0)),
+                       "end_frame": entry.get("end_frame"),
+                       "loops": int(entry.get("loops", 1)),
+                       "mirror": bool(entry.get("mirror", False))})
+    return videos
+
+def _init_worker(config_path, model_path, session_options, scheduler_options, crop):
+    """
+    Load movenet once per worker process
+    """
+    global _worker_counter
+    scheduler = MotionScheduler(**scheduler_options) if scheduler_options is not None else None
+    crop_tracker = CropTracker() if crop else None
+    _worker_counter = RepetitionCounter(config_path=config_path, model_path=model_path, session_options=session_options,
+                                        scheduler=scheduler, crop_tracker=crop_tracker)
+
+def read_frames(video):
+    """
+    Read frames of a manifest video, cut, looped and mirrored as
+    the manifest says
+
+    Args:
+        video (dict): entry of load_manifest
+
+    Yields:
+        NDArray: frame from opencv
+    """
+    for _ in range(video["loops"]):
+        with VideoReader(video["video_path"]) as reader:
+            for index, frame in enumerate(reader):
+                if video["end_frame"] is not None and index >= video["end_frame"]:
+                    break
+                if index < video["start_frame"]:
+                    continue
+                yield cv2.flip(frame, 1) if video["mirror"] else frame
+
+def count_video(video) -> dict:
+    """
+    Count repetition of a video frame by frame with update_metric
+    as the live loop does, run on worker process
+
+    Args:
+        video (dict): entry of load_manifest
+
+    Returns:
+        dict: count, count error, fps and per frame latency of video
+    """
+    rep_counter = _worker_counter
+    rep_counter.reset_metrics()
+    rep_counter.set_metric(video["exercise_name"])
+
+    latencies = []
+    start = time.perf_counter()
+    for frame in read_frames(video):
+        frame_start = time.perf_counter()
+        rep_counter.update_metric(frame)
+        latencies.append(time.perf_counter() - frame_start)
+    elapsed = time.perf_counter() - start
+
+    count = rep_counter.get_metric(video["exercise_name"]).get_reptition_count()
+    latencies_ms = np.array(latencies) * 1000.
+    frames = len(latencies)
+    return {"video": video["video"],
+            "exercise_name": video["exercise_name"],
+            "expected_count": video["expected_count"],
+            "reptition_count": count,
+            "count_error": count - video["expected_count"],
+            "frames": frames,
+            "inferred_frames": rep_counter.scheduler.get_stats()["inferred_count"]
+                               if rep_counter.scheduler is not None else frames,
+            "fps": frames / elapsed if elapsed > 0 else 0.,
+            "p50_ms": float(np.percentile(latencies_ms, 50)) if frames > 0 else 0.,
+            "p95_ms": float(np.percentile(latencies_ms, 95)) if frames > 0 else 0.,
+            "latencies_ms": latencies_ms.tolist()}
+
+def main(manifest_path, config_path=DEFAULT_CONFIG_PATH, model_path=None, workers=None, scheduler_options=None,
+         crop=False, max_count_error=0, min_fps=None) -> bool:
+    videos = load_manifest(manifest_path)
+    if len(videos) == 0:
+        raise Exception(f"no video in {manifest_path}")
+    model_path = model_path or get_model_path(DEFAULT_MODEL_VARIANT)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(videos)))
+    # workers share cores instead of each using all of them
+    session_options = {"intra_op_num_threads": max(1, (os.cpu_count() or 1) // workers)}
+
+    # spawn so workers don't inherit threads of this process
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker,
+                             initargs=(config_path, model_path, session_options, scheduler_options, crop)) as executor:
+        results = list(executor.map(count_video, videos))
+
+    latencies_ms = np.concatenate([r.pop("latencies_ms") for r in results])
+    for r in results:
+        print(json.dumps(r))
+
+    frames = sum(r["frames"] for r in results)
+    summary = {"videos": len(results),
+               "exact": sum(r["count_error"] == 0 for r in results) / len(results),
+               "mean_abs_count_error": sum(abs(r["count_error"]) for r in results) / len(results),
+               "frames": frames,
+               "fps": frames / sum(r["frames"] / r["fps"] for r in results if r["fps"] > 0),
+               "p50_ms": float(np.percentile(latencies_ms, 50)) if frames > 0 else 0.,
+               "p95_ms": float(np.percentile(latencies_ms, 95)) if frames > 0 else 0.,
+               "workers": workers}
+    print(json.dumps(summary))
+
+    failures = [f"{r['video']} counted {r['reptition_count']} expected {r['expected_count']}"
+                for r in results if abs(r["count_error"]) > max_count_error]
+    if min_fps is not None and summary["fps"] < min_fps:
+        failures.append(f"fps {summary['fps']:.1f} is below {min_fps}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return len(failures) == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="Golden repetition counting harness",
+                                     description="""This program counts repetition of every video of a manifest
+                                     of true counts in parallel worker processes, frame by frame as the live loop
+                                     does without display. It prints count error, fps and p50/p95 per frame
+                                     latency as one json line per video and a summary, and exits with status 1
+                                     when a count is off by more than the allowed error or fps is too low.
+                                     Run from backend directory with python -m rep_counting.golden_harness
+                                     """)
+    parser.add_argument("--dir", help="Directory of videos with manifest.json", default=DEFAULT_EXAMPLES_DIR)
+    parser.add_argument("--manifest", help="Path to manifest json file, defaults to manifest.json in dir", default=None)
+    parser.add_argument("--config", help="Path to exercise config json file", default=DEFAULT_CONFIG_PATH)
+    parser.add_argument("--model_variant", help="Movenet model variant", choices=list(MODEL_VARIANTS.keys()), default=DEFAULT_MODEL_VARIANT)
+    parser.add_argument("--workers", help="Number of worker processes, defaults to number of cores", type=int, default=None)
+    parser.add_argument("--adaptive", help="Skip movenet on frames with little motion", action="store_true")
+    parser.add_argument("--motion_threshold", help="Mean gray level difference to run movenet", type=float, default=DEFAULT_MOTION_THRESHOLD)
+    parser.add_argument("--max_skip", help="Maximum number of frames skipped in a row", type=int, default=DEFAULT_MAX_SKIP)
+    parser.add_argument("--crop", help="Run movenet on crop around person found in last frame", action="store_true")
+    parser.add_argument("--max_count_error", help="Allowed absolute count error per video", type=int, default=0)
+    parser.add_argument("--min_fps", help="Minimum overall fps", type=float, default=None)
+    args = parser.parse_args()
+
+    scheduler_options = None
+    if args.adaptive:
+        scheduler_options = {"motion_threshold": args.motion_threshold, "max_skip": args.max_skip}
+
+    passed = main(args.manifest or os.path.join(args.dir, MANIFEST_NAME), args.config, get_model_path(args.model_variant),
+                  args.workers, scheduler_options, args.crop, args.max_count_error, args.min_fps)
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,131 @@
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+# cache directory when none is given, can be changed
+# per host with KPS_CACHE_DIR environment variable
+DEFAULT_CACHE_DIR = os.getenv("KPS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "repright", "kps"))
+
+# color order of model input, frames from OpenCV are BGR
+DEFAULT_COLOR = "bgr"
+
+# bytes read at a time when hashing files
+HASH_CHUNK_SIZE = 1 << 20
+
+# file content hash by (path, size, modification time), so a
+# file is hashed once per process unless it changes
+_file_hashes = {}
+
+def file_hash(path) -> str:
+    """
+    Hash file content, result is kept until file size or modification time changes
+
+    Args:
+        path (str): path to file
+
+    Returns:
+        str: sha256 hex digest of file content
+    """
+    path = os.path.abspath(str(path))
+    stat = os.stat(path)
+    memo_key = (path, stat.st_size, stat.st_mtime_ns)
+    digest = _file_hashes.get(memo_key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        _file_hashes[memo_key] = digest
+    return digest
+
+class KpsCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR) -> None:
+        """
+        On disk cache of movenet keypoint tracks of whole videos. A track is a
+        (T, 17, 3) float32 array of keypoints in xy coordinate normalized to
+        the frame and confidence score per frame, as given by preprocess_kps.
+        Tracks are keyed by video content, model content, model input size and
+        color order of model input, so renamed videos still hit and a changed
+        video or model never does. RepetitionCounter feeds OpenCV frames as
+        BGR while process.py converts them to RGB, so their tracks differ.
+        Tracks are .npy files loaded memory mapped, so a track is read from
+        disk only as far as it is used.
+
+        Args:
+            cache_dir (str, optional): directory of track files. Defaults to DEFAULT_CACHE_DIR.
+        """
+        self.cache_dir = str(cache_dir)
+
+    def get_key(self, video_path, model_path, input_size, color=DEFAULT_COLOR) -> str:
+        """
+        Get cache key of a video
+
+        Args:
+            video_path (str): path to video file
+            model_path (str): path to movenet model onnx file
+            input_size (tuple): (width, height) of model input
+            color (str, optional): color order of model input. Defaults to DEFAULT_COLOR.
+
+        Returns:
+            str: cache key, also file name of track without extension
+        """
+        model_name = os.path.splitext(os.path.basename(str(model_path)))[0]
+        return f"{file_hash(video_path)[:32]}-{model_name}-{file_hash(model_path)[:12]}-{input_size[0]}x{input_size[1]}-{color}"
+
+    def get_path(self, video_path, model_path, input_size, color=DEFAULT_COLOR) -> str:
+        return os.path.join(self.cache_dir, self.get_key(video_path, model_path, input_size, color) + ".npy")
+
+    def load(self, video_path, model_path, input_size, color=DEFAULT_COLOR):
+        """
+        Load keypoint track of a video
+
+        Args:
+            video_path (str): path to video file
+            model_path (str): path to movenet model onnx file
+            input_size (tuple): (width, height) of model input
+            color (str, optional): color order of model input. Defaults to DEFAULT_COLOR.
+
+        Returns:
+            NDArray: read only memory mapped (T, 17, 3) keypoints, None if not cached
+        """
+        path = self.get_path(video_path, model_path, input_size, color)
+        if not os.path.isfile(path):
+            return None
+        try:
+            kps = np.load(path, mmap_mode="r")
+        except ValueError:
+            # not a npy file, left by something else
+            return None
+        if kps.ndim != 3 or kps.shape[1:] != (17, 3):
+            return None
+        return kps
+
+    def save(self, video_path, model_path, input_size, kps, color=DEFAULT_COLOR) -> str:
+        """
+        Save keypoint track of a video. Track is written to a temporary file
+        renamed over cache file, so concurrent runs never read a partly
+        written track.
+
+        Args:
+            video_path (str): path to video file
+            model_path (str): path to movenet model onnx file
+            input_size (tuple): (width, height) of model input
+            kps (NDArray): (T, 17, 3) keypoints of every frame
+            color (str, optional): color order of model input. Defaults to DEFAULT_COLOR.
+
+        Returns:
+            str: path to cache file
+        """
+        path = self.get_path(video_path, model_path, input_size, color)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.asarray(kps, dtype=np.float32).reshape(-1, 17, 3))
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return path
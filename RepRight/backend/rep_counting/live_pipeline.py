@@ -0,0 +1,199 @@
+import queue
+import threading
+import time
+
+# sentinel put on stage queue when capture is done
+_END_OF_STREAM = None
+
+class StageStats:
+    def __init__(self, name) -> None:
+        """
+        Timing of one pipeline stage
+
+        Args:
+            name (str): stage name
+        """
+        self.name = name
+        self.count = 0
+        self.dropped = 0
+        self.total_time = 0.
+        self.max_time = 0.
+        # depth of output queue after each put
+        self.depth_total = 0
+        self.depth_max = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.total_time += seconds
+            self.max_time = max(self.max_time, seconds)
+
+    def record_depth(self, depth):
+        with self.lock:
+            self.depth_total += depth
+            self.depth_max = max(self.depth_max, depth)
+
+    def record_drop(self):
+        with self.lock:
+            self.dropped += 1
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "count": self.count,
+                "dropped": self.dropped,
+                "avg_ms": self.total_time / self.count * 1000. if self.count > 0 else 0.,
+                "max_ms": self.max_time * 1000.,
+                "avg_queue_depth": self.depth_total / self.count if self.count > 0 else 0.,
+                "max_queue_depth": self.depth_max
+            }
+
+class LivePipeline:
+    def __init__(self, vid, process, render, queue_size=1, drop_stale=True) -> None:
+        """
+        Run capture, inference and render of a live video in three stages
+        connected by bounded queues. Capture and inference run on their own
+        threads, render runs on the thread calling run because OpenCV windows
+        must be used from one thread. Movenet and OpenCV release the GIL so
+        stages overlap on multi-core machines.
+
+        With drop_stale a full queue drops its oldest frame, so inference always
+        works on the newest frame and a slow stage never delays the others.
+
+        Args:
+            vid (cv2.VideoCapture): opened video capture
+            process (callable): process(frame) -> result, run on inference thread.
+            result must not share memory with buffers reused by later calls.
+            render (callable): render(frame, result) -> bool, return False to stop.
+            queue_size (int, optional): maximum number of items waiting per queue. Defaults to 1.
+            drop_stale (bool, optional): drop oldest item when a queue is full, otherwise
+            wait for the next stage, use False for video files. Defaults to True.
+        """
+        self.vid = vid
+        self.process = process
+        self.render = render
+        self.drop_stale = drop_stale
+        self.frames = queue.Queue(maxsize=max(queue_size, 1))
+        self.results = queue.Queue(maxsize=max(queue_size, 1))
+        self.stop_event = threading.Event()
+        self.error = None
+        self.stages = {name: StageStats(name) for name in ["capture", "inference", "render"]}
+        self.threads = []
+
+    def _put(self, q, item, stage):
+        """
+        Put item on queue, drop oldest item if queue is full and drop_stale
+        is set otherwise wait. Give up when pipeline is stopped.
+        """
+        drop = self.drop_stale and item is not _END_OF_STREAM
+        while not self.stop_event.is_set():
+            try:
+                if drop:
+                    q.put_nowait(item)
+                else:
+                    q.put(item, timeout=0.1)
+                if item is not _END_OF_STREAM:
+                    self.stages[stage].record_depth(q.qsize())
+                return
+            except queue.Full:
+                if drop:
+                    try:
+                        q.get_nowait()
+                        self.stages[stage].record_drop()
+                    except queue.Empty:
+                        pass
+
+    def _get(self, q):
+        """
+        Get item from queue, None when pipeline is stopped
+        """
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _END_OF_STREAM
+
+    def _capture(self):
+        """
+        Read frames from video capture, run on capture thread
+        """
+        try:
+            while not self.stop_event.is_set() and self.vid.isOpened():
+                start = time.perf_counter()
+                ret, frame = self.vid.read()
+                if not ret:
+                    break
+                self.stages["capture"].record(time.perf_counter() - start)
+                self._put(self.frames, frame, "capture")
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(self.frames, _END_OF_STREAM, "capture")
+
+    def _inference(self):
+        """
+        Process newest frame, run on inference thread
+        """
+        try:
+            while True:
+                frame = self._get(self.frames)
+                if frame is _END_OF_STREAM:
+                    break
+                start = time.perf_counter()
+                result = self.process(frame)
+                self.stages["inference"].record(time.perf_counter() - start)
+                self._put(self.results, (frame, result), "inference")
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(self.results, _END_OF_STREAM, "inference")
+
+    def run(self):
+        """
+        Start capture and inference threads and render on this
+        thread until video ends or render returns False
+
+        Raises:
+            Exception: error raised by capture or process
+        """
+        self.threads = [threading.Thread(target=self._capture, name="capture", daemon=True),
+                        threading.Thread(target=self._inference, name="inference", daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        try:
+            while True:
+                item = self._get(self.results)
+                if item is _END_OF_STREAM:
+                    break
+                start = time.perf_counter()
+                keep_running = self.render(*item)
+                self.stages["render"].record(time.perf_counter() - start)
+                if keep_running is False:
+                    break
+        finally:
+            self.stop()
+        if self.error is not None:
+            raise self.error
+
+    def stop(self):
+        """
+        Stop capture and inference threads
+        """
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+
+    def get_stats(self) -> dict:
+        """
+        Get timing of each stage and queue depths
+
+        Returns:
+            dict: stage name and count, dropped, avg_ms, max_ms and depth of its
+            output queue pairs, current frame_queue and result_queue depths
+        """
+        stats = {name: stage.get_stats() for name, stage in self.stages.items()}
+        stats["frame_queue"] = self.frames.qsize()
+        stats["result_queue"] = self.results.qsize()
+        return stats
@@ -1,38 +1,46 @@
 import os
 import sys
+import json
 import cv2
 
 # Repetition counter
 from pkg.kps_metrics import KpsMetrics
 from rep_counter import RepetitionCounter
+from live_pipeline import LivePipeline
 
 DEFAULT_CONFIG_DIR = "./smart_trainer_config/config.json"
 
 def main():
     rep_counter = RepetitionCounter(config_path=DEFAULT_CONFIG_DIR)
     rep_counter.set_metric("bicep_curls")
+    metric = rep_counter.get_metric(rep_counter.current_metric_name)
     
-    vid = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-    while vid.isOpened():
-        ret, frame = vid.read()
-        
-        if not ret:
-            break
-        
-        kps_norm = rep_counter.update_metric(frame)
+    def process(frame):
+        # keypoints buffer is reused by next frame
+        kps_norm = rep_counter.update_metric(frame).copy()
+        return kps_norm, metric.reptition_count
+    
+    def render(frame, result):
+        kps_norm, reptition_count = result
         frame = rep_counter.draw_kps_skeleton(frame, kps_norm, 5)
-        metric = rep_counter.get_metric(rep_counter.current_metric_name)
         
-        cv2.putText(frame, f'Reps: {str(metric.reptition_count)}', (10, 30), 
+        cv2.putText(frame, f'Reps: {str(reptition_count)}', (10, 30), 
         cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
         
         cv2.imshow("frame", frame)
-        print(f"Reps: {str(metric.reptition_count)}")
+        print(f"Reps: {str(reptition_count)}")
         
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
-    vid.release()
-    cv2.destroyAllWindows()
+        return not (cv2.waitKey(1) & 0xFF == ord("q"))
+    
+    # capture, inference and render run at the same time
+    vid = cv2.VideoCapture(0, cv2.CAP_DSHOW)
+    pipeline = LivePipeline(vid, process, render)
+    try:
+        pipeline.run()
+    finally:
+        vid.release()
+        cv2.destroyAllWindows()
+    print(json.dumps(pipeline.get_stats()))
 
 if __name__ == "__main__":
     main()
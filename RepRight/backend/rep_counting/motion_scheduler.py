@@ -0,0 +1,180 @@
+import math
+import cv2
+import numpy as np
+
+# size of frame used for motion detection (width, height)
+DEFAULT_MOTION_SIZE = (64, 48)
+
+# mean absolute gray level difference to the last inferred
+# frame above which the person is considered moving
+DEFAULT_MOTION_THRESHOLD = 2.0
+
+# maximum number of frames skipped in a row
+DEFAULT_MAX_SKIP = 4
+
+class MotionScheduler:
+    def __init__(self, motion_threshold=DEFAULT_MOTION_THRESHOLD, max_skip=DEFAULT_MAX_SKIP,
+                 latency_budget_ms=None, motion_size=DEFAULT_MOTION_SIZE, ema_alpha=0.2) -> None:
+        """
+        Decide per frame whether movenet has to run. A downscaled gray
+        frame is compared to the frame of the last inference, movenet is
+        skipped while there is little motion. Skipped frames get keypoints
+        interpolated between inferred frames, see interpolate_kps.
+
+        Args:
+            - motion_threshold (float, optional): mean absolute gray level difference
+            (0-255) to last inferred frame to run movenet. 0 runs movenet on every frame
+            unless latency budget is exceeded. Defaults to DEFAULT_MOTION_THRESHOLD.
+            - max_skip (int, optional): maximum number of frames skipped in a row,
+            keypoints are refreshed at least every max_skip + 1 frames. Defaults to DEFAULT_MAX_SKIP.
+            - latency_budget_ms (float, optional): average movenet time per frame allowed,
+            frames are thinned out even during motion when inference is slower than budget.
+            Defaults to None, no budget.
+            - motion_size (tuple, optional): (width, height) of motion detection frame.
+            - ema_alpha (float, optional): smoothing of measured inference time. Range (0.0, 1.0].
+        """
+        if max_skip < 0:
+            raise Exception(f"max_skip must be 0 or greater but given {max_skip}")
+        if latency_budget_ms is not None and latency_budget_ms <= 0:
+            raise Exception(f"latency_budget_ms must be greater than 0 but given {latency_budget_ms}")
+        if ema_alpha <= 0.0 or ema_alpha > 1.0:
+            raise Exception(f"ema_alpha must in range (0.0, 1.0] but given {ema_alpha}")
+
+        self.motion_threshold = motion_threshold
+        self.max_skip = max_skip
+        self.latency_budget_ms = latency_budget_ms
+        self.motion_size = motion_size
+        self.ema_alpha = ema_alpha
+
+        # gray downscaled frame of last inference
+        self.reference = None
+        # area resize of a full frame is slow, frame is first
+        # resized bilinear to 4 times motion size
+        self.medium_size = (motion_size[0] * 4, motion_size[1] * 4)
+        self.medium = np.empty((self.medium_size[1], self.medium_size[0], 3), dtype=np.uint8)
+        self.small = np.empty((motion_size[1], motion_size[0], 3), dtype=np.uint8)
+        self.gray = np.empty((motion_size[1], motion_size[0]), dtype=np.uint8)
+        self.diff = np.empty_like(self.gray)
+
+        # number of frames skipped since last inference
+        self.skipped = 0
+
+        # smoothed movenet time per inference in milliseconds
+        self.inference_ms = None
+
+        self.frame_count = 0
+        self.inferred_count = 0
+        self.last_motion = 0.
+
+    def reset(self):
+        """
+        Forget last inferred frame, next frame is always inferred
+        """
+        self.reference = None
+        self.skipped = 0
+
+    def get_min_stride(self) -> int:
+        """
+        Minimum number of frames between inferences to stay in latency budget
+
+        Returns:
+            int: 1 to infer every frame
+        """
+        if self.latency_budget_ms is None or self.inference_ms is None:
+            return 1
+        return min(max(math.ceil(self.inference_ms / self.latency_budget_ms), 1), self.max_skip + 1)
+
+    def get_motion(self, cv_frame) -> float:
+        """
+        Motion between frame and last inferred frame
+
+        Args:
+            - cv_frame (NDArray): frame from opencv or numpy array
+
+        Returns:
+            float: mean absolute gray level difference, inf if there is no inferred frame
+        """
+        cv2.resize(cv_frame, self.medium_size, dst=self.medium, interpolation=cv2.INTER_LINEAR)
+        cv2.resize(self.medium, self.motion_size, dst=self.small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        if self.reference is None:
+            return math.inf
+        cv2.absdiff(self.gray, self.reference, dst=self.diff)
+        return cv2.mean(self.diff)[0]
+
+    def should_infer(self, cv_frame) -> bool:
+        """
+        Decide whether movenet runs on frame, call once per frame in order.
+        If True is returned record_inference should be called after inference.
+
+        Args:
+            - cv_frame (NDArray): frame from opencv or numpy array
+
+        Returns:
+            bool: True to run movenet, False to skip frame
+        """
+        self.frame_count += 1
+        self.last_motion = self.get_motion(cv_frame)
+
+        if self.reference is None or self.skipped >= self.max_skip:
+            infer = True
+        elif self.skipped + 1 < self.get_min_stride():
+            # thin out frames to stay in latency budget
+            infer = False
+        else:
+            infer = self.last_motion >= self.motion_threshold
+
+        if infer:
+            if self.reference is None:
+                self.reference = np.empty_like(self.gray)
+            self.reference[:] = self.gray
+            self.skipped = 0
+            self.inferred_count += 1
+        else:
+            self.skipped += 1
+        return infer
+
+    def record_inference(self, seconds):
+        """
+        Update smoothed inference time used by latency budget
+
+        Args:
+            - seconds (float): time of one movenet inference
+        """
+        ms = seconds * 1000.
+        if self.inference_ms is None:
+            self.inference_ms = ms
+        else:
+            self.inference_ms += self.ema_alpha * (ms - self.inference_ms)
+
+    def get_stats(self) -> dict:
+        """
+        Get scheduling statistics
+
+        Returns:
+            dict: frame count, inferred count, inferred ratio, last motion and inference time
+        """
+        return {
+            "frame_count": self.frame_count,
+            "inferred_count": self.inferred_count,
+            "inferred_ratio": self.inferred_count / self.frame_count if self.frame_count > 0 else 0.,
+            "motion": self.last_motion if math.isfinite(self.last_motion) else None,
+            "inference_ms": self.inference_ms,
+            "min_stride": self.get_min_stride()
+        }
+
+def interpolate_kps(kps_start, kps_end, count):
+    """
+    Linearly interpolate keypoints and confidence scores
+    of skipped frames between two inferred frames
+
+    Args:
+        - kps_start (NDArray): (17, 3) keypoints of earlier inferred frame
+        - kps_end (NDArray): (17, 3) keypoints of later inferred frame
+        - count (int): number of skipped frames in between
+
+    Returns:
+        NDArray: (count, 17, 3) keypoints, endpoints are excluded
+    """
+    weights = (np.arange(1, count + 1, dtype=np.float32) / (count + 1))[:, None, None]
+    return kps_start[None] + (kps_end - kps_start)[None] * weights
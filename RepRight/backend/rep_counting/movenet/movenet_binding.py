@@ -0,0 +1,99 @@
+import cv2
+import numpy as np
+import onnxruntime as ort
+from .movenet_infer import get_input_size
+from ..stage_metrics import stage_metrics
+
+class MovenetBinding:
+    def __init__(self, model:ort.InferenceSession, input_size=None) -> None:
+        """
+        Preallocated input and output buffers of one movenet user bound to
+        the model with onnxruntime I/O binding. Frames are resized straight
+        into the input buffer and keypoints are converted in place, so no
+        buffer is allocated per frame once created. Model can be shared,
+        every binding has its own buffers.
+
+        Args:
+            - model (Movenet): Movenet model
+            - input_size (tuple, optional): (width, height) of model input.
+            Defaults to None, input size of model.
+        """
+        self.model = model
+        self.input_size = tuple(input_size or get_input_size(model))
+        width, height = self.input_size
+
+        model_input = model.get_inputs()[0]
+        model_output = model.get_outputs()[0]
+        self.input_name = model_input.name
+        self.output_name = model_output.name
+
+        # resized frame and model input
+        self.resized = np.empty((height, width, 3), dtype=np.uint8)
+        self.input = np.zeros((1, height, width, 3), dtype=np.int32)
+        # movenet output [1, 1, 17, 3] in yx coordinate, converted to xy in place
+        self.output = np.zeros((1, 1, 17, 3), dtype=np.float32)
+        # affine matrix for crop
+        self.matrix = np.zeros((2, 3), dtype=np.float64)
+
+        # views are created once, indexing creates new view objects
+        self.input_image = self.input[0]
+        self.kps = self.output[0, 0]
+        self.kps_x = self.kps[:, 0]
+        self.kps_y = self.kps[:, 1]
+        self.kps_score = self.kps[:, 2]
+        self.swap = np.empty(17, dtype=np.float32)
+
+        # run options are created per run when not given
+        self.run_options = ort.RunOptions()
+        self.io_binding = model.io_binding()
+        self.io_binding.bind_input(self.input_name, 'cpu', 0, np.int32, list(self.input.shape), self.input.ctypes.data)
+        self.io_binding.bind_output(self.output_name, 'cpu', 0, np.float32, list(self.output.shape), self.output.ctypes.data)
+
+    def preprocess(self, cv_frame, crop_region=None):
+        """
+        Resize frame or crop region of frame into input buffer,
+        same as preprocess_input_image_cv without padding
+
+        Args:
+            - cv_frame (NDArray): frame from opencv or numpy array
+            - crop_region (tuple, optional): (x_min, y_min, length) in pixels,
+            see movenet_crop. Defaults to None, whole frame.
+        """
+        if crop_region is None:
+            cv2.resize(cv_frame, self.input_size, dst=self.resized)
+        else:
+            x_min, y_min, length = crop_region
+            self.matrix[0, 0] = self.input_size[0] / length
+            self.matrix[0, 2] = -x_min * self.matrix[0, 0]
+            self.matrix[1, 1] = self.input_size[1] / length
+            self.matrix[1, 2] = -y_min * self.matrix[1, 1]
+            cv2.warpAffine(cv_frame, self.matrix, self.input_size, dst=self.resized, flags=cv2.INTER_LINEAR,
+                           borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+        np.copyto(self.input_image, self.resized, casting='unsafe')
+
+    def run(self, cv_frame, crop_region=None):
+        """
+        Use movenet model to generate keypoints from frame, same as
+        preprocess_input_image_cv, predict and preprocess_kps
+
+        Args:
+            - cv_frame (NDArray): frame from opencv or numpy array
+            - crop_region (tuple, optional): (x_min, y_min, length) in pixels,
+            keypoints are normalized to crop. Defaults to None, whole frame.
+
+        Returns:
+            - NDArray: (17, 3) keypoints in xy coordinate, this is the output
+            buffer and it is overwritten by next run, copy it to keep it.
+            - Average confidence rate: float from 0.0 ~ 1.0
+        """
+        start = stage_metrics.clock()
+        self.preprocess(cv_frame, crop_region)
+        start = stage_metrics.observe("resize", start)
+        self.model.run_with_iobinding(self.io_binding, self.run_options)
+        stage_metrics.observe("inference", start)
+
+        # yx to xy
+        np.copyto(self.swap, self.kps_y)
+        np.copyto(self.kps_y, self.kps_x)
+        np.copyto(self.kps_x, self.swap)
+        return self.kps, float(self.kps_score.mean())
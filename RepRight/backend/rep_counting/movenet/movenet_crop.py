@@ -0,0 +1,137 @@
+import cv2
+import numpy as np
+from ..pkg.kps_constant import KPS_INDEX_DICT
+
+# keypoints with lower confidence score are not used for crop region
+MIN_CROP_KEYPOINT_SCORE = 0.2
+
+# crop half length is the largest of torso range and body range scaled by these
+TORSO_EXPAND_RATIO = 1.9
+BODY_EXPAND_RATIO = 1.2
+
+TORSO_KPS = [KPS_INDEX_DICT.left_shoulder.value, KPS_INDEX_DICT.right_shoulder.value,
+             KPS_INDEX_DICT.left_hip.value, KPS_INDEX_DICT.right_hip.value]
+HIP_KPS = [KPS_INDEX_DICT.left_hip.value, KPS_INDEX_DICT.right_hip.value]
+SHOULDER_KPS = [KPS_INDEX_DICT.left_shoulder.value, KPS_INDEX_DICT.right_shoulder.value]
+
+def torso_visible(kps, min_score=MIN_CROP_KEYPOINT_SCORE) -> bool:
+    """
+    Check if at least one hip and one shoulder are confidently detected
+
+    Args:
+        - kps (NDArray): (17, 3) keypoints in xy coordinate and confidence score
+
+    Returns:
+        bool: True if torso is visible
+    """
+    return bool((kps[HIP_KPS, 2] > min_score).any() and (kps[SHOULDER_KPS, 2] > min_score).any())
+
+def determine_crop_region(kps, image_width, image_height, min_score=MIN_CROP_KEYPOINT_SCORE):
+    """
+    Square crop region around the person from keypoints of previous frame,
+    centered on hips and large enough for torso and all visible keypoints
+
+    Args:
+        - kps (NDArray): (17, 3) keypoints in xy coordinate normalized to full frame
+        - image_width (int): frame width
+        - image_height (int): frame height
+        - min_score (float, optional): minimum confidence score of keypoints used
+
+    Returns:
+        tuple: (x_min, y_min, length) crop region in pixels, None if tracking
+        is lost or crop would cover whole frame
+    """
+    if not torso_visible(kps, min_score):
+        return None
+
+    xs = kps[:, 0] * image_width
+    ys = kps[:, 1] * image_height
+    center_x = float(np.mean(xs[HIP_KPS]))
+    center_y = float(np.mean(ys[HIP_KPS]))
+
+    torso_range = max(np.abs(xs[TORSO_KPS] - center_x).max(), np.abs(ys[TORSO_KPS] - center_y).max())
+    visible = kps[:, 2] > min_score
+    body_range = max(np.abs(xs[visible] - center_x).max(), np.abs(ys[visible] - center_y).max())
+
+    half_length = max(torso_range * TORSO_EXPAND_RATIO, body_range * BODY_EXPAND_RATIO)
+    half_length = min(half_length, max(center_x, image_width - center_x, center_y, image_height - center_y))
+    if half_length <= 0 or half_length * 2 >= max(image_width, image_height):
+        return None
+    return (float(center_x - half_length), float(center_y - half_length), float(half_length * 2))
+
+def crop_and_resize(cv_image, crop_region, size):
+    """
+    Cut crop region out of frame and resize it to model input size,
+    area outside of frame is padded black
+
+    Args:
+        - cv_image (NDArray): frame from opencv (height, width, color)
+        - crop_region (tuple): (x_min, y_min, length) in pixels
+        - size (tuple): model input size (width, height)
+
+    Returns:
+        NDArray: an image with shape (1, height, width, color)
+    """
+    x_min, y_min, length = crop_region
+    scale_x = size[0] / length
+    scale_y = size[1] / length
+    matrix = np.array([[scale_x, 0., -x_min * scale_x],
+                       [0., scale_y, -y_min * scale_y]], dtype=np.float64)
+    img = cv2.warpAffine(cv_image, matrix, size, flags=cv2.INTER_LINEAR,
+                         borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+    return np.expand_dims(img, axis=0)
+
+def map_kps_to_frame(kps, crop_region, image_width, image_height):
+    """
+    Map keypoints from crop to full frame, in place
+
+    Args:
+        - kps (NDArray): (17, 3) keypoints in xy coordinate normalized to crop
+        - crop_region (tuple): (x_min, y_min, length) in pixels
+        - image_width (int): frame width
+        - image_height (int): frame height
+
+    Returns:
+        NDArray: keypoints in xy coordinate normalized to full frame
+    """
+    x_min, y_min, length = crop_region
+    xs, ys = kps[:, 0], kps[:, 1]
+    xs *= length
+    xs += x_min
+    xs /= image_width
+    ys *= length
+    ys += y_min
+    ys /= image_height
+    return kps
+
+class CropTracker:
+    def __init__(self, min_score=MIN_CROP_KEYPOINT_SCORE) -> None:
+        """
+        Keep crop region of next frame from keypoints of last frame,
+        so a person far from camera fills model input. Full frame is
+        used until torso is found and whenever tracking is lost.
+
+        Args:
+            - min_score (float, optional): minimum confidence score of keypoints
+            used for crop region. Defaults to MIN_CROP_KEYPOINT_SCORE.
+        """
+        self.min_score = min_score
+        # (x_min, y_min, length) in pixels, None for full frame
+        self.crop_region = None
+
+    def reset(self):
+        """
+        Use full frame on next frame
+        """
+        self.crop_region = None
+
+    def update(self, kps, image_width, image_height):
+        """
+        Update crop region from keypoints of last frame
+
+        Args:
+            - kps (NDArray): (17, 3) keypoints in xy coordinate normalized to full frame
+            - image_width (int): frame width
+            - image_height (int): frame height
+        """
+        self.crop_region = determine_crop_region(kps, image_width, image_height, self.min_score)
@@ -3,16 +3,126 @@
 # matplotlib.use("QtAgg")
 import numpy as np
 import os
+import tempfile
+import json
 import cv2
 import onnxruntime as ort
 
 
 
-MODEL_PATH = os.path.join(os.path.dirname(__file__), 
-                          "movenet_singlepose_thunder_v4.onnx")
-INPUT_SIZE = (256, 256)
+# supported movenet models, input size is (width, height)
+# thunder_int8 is created from thunder by quantize_model.py
+MODEL_VARIANTS = {
+    "thunder": {
+        "model_path": os.path.join(os.path.dirname(__file__), "movenet_singlepose_thunder_v4.onnx"),
+        "input_size": (256, 256)
+    },
+    "thunder_int8": {
+        "model_path": os.path.join(os.path.dirname(__file__), "movenet_singlepose_thunder_v4.int8.onnx"),
+        "input_size": (256, 256)
+    },
+    "lightning": {
+        "model_path": os.path.join(os.path.dirname(__file__), "movenet_singlepose_lightning_v4.onnx"),
+        "input_size": (192, 192)
+    }
+}
+
+# model used when no model path is given, can be changed
+# per host with MOVENET_MODEL_VARIANT environment variable
+DEFAULT_MODEL_VARIANT = os.getenv("MOVENET_MODEL_VARIANT", "thunder")
+if DEFAULT_MODEL_VARIANT not in MODEL_VARIANTS:
+    raise Exception(f"MOVENET_MODEL_VARIANT must be one of {list(MODEL_VARIANTS.keys())} but given {DEFAULT_MODEL_VARIANT}")
+
+MODEL_PATH = MODEL_VARIANTS[DEFAULT_MODEL_VARIANT]["model_path"]
+INPUT_SIZE = MODEL_VARIANTS[DEFAULT_MODEL_VARIANT]["input_size"]
+
+# graph optimization levels whose result doesn't depend on the cpu, "all"
+# adds layout optimizations for the cpu it runs on so it is not cached
+PORTABLE_OPTIMIZATION_LEVELS = ["basic", "extended"]
+
+# fastest session options found on this host by tune_session.py
+DEFAULT_SESSION_PROFILE_PATH = os.path.join(os.path.dirname(__file__), "session_profile.json")
+
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL
+}
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+}
+
+# used when there is no session profile, thread count 0
+# lets onnxruntime decide, one thread per physical core
+DEFAULT_SESSION_OPTIONS = {
+    "intra_op_num_threads": 0,
+    "inter_op_num_threads": 0,
+    "execution_mode": "parallel",
+    "graph_optimization_level": "all"
+}
+
+def load_session_profile(profile_path=DEFAULT_SESSION_PROFILE_PATH) -> dict:
+    """
+    Load session options saved by tune_session.py
+
+    Args:
+        - profile_path (str, optional): path to session profile json file
+
+    Returns:
+        dict: session options, empty if there is no profile
+    """
+    if not profile_path or not os.path.isfile(profile_path):
+        return {}
+    with open(profile_path, 'r') as f:
+        return json.load(f).get("session_options", {})
+
+def get_session_options(session_options=None, profile_path=DEFAULT_SESSION_PROFILE_PATH) -> dict:
+    """
+    Merge default session options, saved profile and given options
+
+    Args:
+        - session_options (dict, optional): options overriding defaults and profile
+        - profile_path (str, optional): path to session profile json file, None to ignore profile
+
+    Raises:
+        Exception: when an option name or value is not supported
+
+    Returns:
+        dict: complete session options
+    """
+    options = dict(DEFAULT_SESSION_OPTIONS)
+    options.update(load_session_profile(profile_path))
+    options.update(session_options or {})
     
-def load_model(model_path=MODEL_PATH):
+    unknown = set(options.keys()) - set(DEFAULT_SESSION_OPTIONS.keys())
+    if unknown:
+        raise Exception(f"unknown session options {sorted(unknown)}, expected {list(DEFAULT_SESSION_OPTIONS.keys())}")
+    if options["execution_mode"] not in EXECUTION_MODES:
+        raise Exception(f"execution_mode must be one of {list(EXECUTION_MODES.keys())}")
+    if options["graph_optimization_level"] not in GRAPH_OPTIMIZATION_LEVELS:
+        raise Exception(f"graph_optimization_level must be one of {list(GRAPH_OPTIMIZATION_LEVELS.keys())}")
+    return options
+
+def get_optimized_model_path(model_path, graph_optimization_level) -> str:
+    """
+    Path of optimized graph saved next to model, it depends on
+    optimization level and onnxruntime version
+
+    Args:
+        - model_path (str): path to onnx model
+        - graph_optimization_level (str): one of GRAPH_OPTIMIZATION_LEVELS
+
+    Returns:
+        str: path to optimized onnx model
+    """
+    stem, _ = os.path.splitext(model_path)
+    return f"{stem}.{graph_optimization_level}.ort{ort.__version__}.optimized.onnx"
+
+def load_model(model_path=MODEL_PATH, session_options=None, profile_path=DEFAULT_SESSION_PROFILE_PATH, 
+               cache_optimized_model=True):
     """
     Load movenet model
 
@@ -21,21 +131,94 @@ def load_model(model_path=MODEL_PATH):
         https://www.kaggle.com/models/google/movenet/tensorFlow2/singlepose-thunder. 
         The model was converted from Tensorflow model to ONNX by
         https://onnxruntime.ai/
+        - session_options (dict, optional): intra_op_num_threads, inter_op_num_threads,
+        execution_mode and graph_optimization_level. Options not given are taken from
+        session profile or DEFAULT_SESSION_OPTIONS.
+        - profile_path (str, optional): path to session profile json file, None to ignore profile
+        - cache_optimized_model (bool, optional): save optimized graph next to model on
+        first load and reuse it on later loads instead of optimizing again. Only 
+        optimizations up to "extended" are saved, with "all" the cpu specific 
+        optimizations are applied on every load. Defaults to True.
 
     Returns:
         ONNX model
     """
+    options = get_session_options(session_options, profile_path)
+    
     sess_options = ort.SessionOptions()
-    # use 1 thread for model inference
-    sess_options.intra_op_num_threads = 1
-    sess_options.execution_mode = ort.ExecutionMode.ORT_PARALLEL 
+    sess_options.intra_op_num_threads = int(options["intra_op_num_threads"])
+    sess_options.inter_op_num_threads = int(options["inter_op_num_threads"])
+    sess_options.execution_mode = EXECUTION_MODES[options["execution_mode"]]
+    sess_options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[options["graph_optimization_level"]]
     
     ep_list = ['CPUExecutionProvider']
     
+    level = options["graph_optimization_level"]
+    if cache_optimized_model and level != "disable":
+        cache_level = level if level in PORTABLE_OPTIMIZATION_LEVELS else "extended"
+        optimized_model_path = get_optimized_model_path(model_path, cache_level)
+        cached = os.path.isfile(optimized_model_path) and os.path.getmtime(optimized_model_path) >= os.path.getmtime(model_path)
+        if not cached and os.access(os.path.dirname(optimized_model_path) or ".", os.W_OK):
+            # graph is saved to a temporary file renamed over cache file,
+            # so concurrent loads never read a partly written graph
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(optimized_model_path) or ".",
+                                             prefix=os.path.basename(optimized_model_path), suffix=".tmp")
+            os.close(fd)
+            try:
+                # save portable optimizations with a session of its own
+                cache_options = ort.SessionOptions()
+                cache_options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[cache_level]
+                cache_options.optimized_model_filepath = temp_path
+                ort.InferenceSession(model_path, sess_options=cache_options, providers=ep_list)
+                os.replace(temp_path, optimized_model_path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+            cached = True
+        if cached:
+            # graph is already optimized up to cache level,
+            # rest of "all" is applied on load
+            if cache_level == level:
+                sess_options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS["disable"]
+            model_path = optimized_model_path
+    
     model = ort.InferenceSession(model_path, sess_options=sess_options, providers=ep_list)
     
     return model
 
+def get_model_path(variant=DEFAULT_MODEL_VARIANT) -> str:
+    """
+    Get onnx model path of a model variant
+
+    Args:
+        - variant (str, optional): one of MODEL_VARIANTS
+
+    Raises:
+        Exception: if variant dose not exists
+
+    Returns:
+        str: path to onnx model
+    """
+    if variant not in MODEL_VARIANTS:
+        raise Exception(f"{variant} is not one of {list(MODEL_VARIANTS.keys())}")
+    return MODEL_VARIANTS[variant]["model_path"]
+
+def get_input_size(model:ort.InferenceSession) -> tuple:
+    """
+    Get image size expected by model, images must be resized
+    to this size by preprocess_input_image_cv
+
+    Args:
+        - model (Movenet): Movenet model
+
+    Returns:
+        tuple: (width, height), INPUT_SIZE if model input size is dynamic
+    """
+    _, height, width, _ = model.get_inputs()[0].shape
+    if not isinstance(width, int) or not isinstance(height, int) or width < 1 or height < 1:
+        return INPUT_SIZE
+    return (width, height)
+
 def predict(image:np.ndarray, model:ort.InferenceSession):
     """
     Use movenet model to gnereate keypoints in yx coordinate from image
@@ -49,13 +232,48 @@ def predict(image:np.ndarray, model:ort.InferenceSession):
         and they are in range of 0.0-1.0, last value is confident score from last dimension, 
         first dimension is 17 keypoints 
     """
-    input_image = image.astype(np.int32)
+    input_image = image.astype(np.int32, copy=False)
     input_name = model.get_inputs()[0].name
     output_name = model.get_outputs()[0].name
     # return a list of predictions
     outputs = model.run([output_name], {input_name:input_image})
     return outputs[0][0][0]
 
+def supports_batch(model:ort.InferenceSession):
+    """
+    Check if model accepts more than one image per run
+
+    Args:
+        - model (Movenet): Movenet model
+
+    Returns:
+        bool: True if batch dimension of model input is dynamic
+    """
+    batch_dim = model.get_inputs()[0].shape[0]
+    return not isinstance(batch_dim, int) or batch_dim < 1
+
+def predict_batch(images:np.ndarray, model:ort.InferenceSession):
+    """
+    Use movenet model to generate keypoints in yx coordinate from a batch of images.
+    Images are fed in one run if model supports batch otherwise one by one, the
+    onnx models of MODEL_VARIANTS have a fixed batch of 1 so they run one by one.
+
+    Args:
+        - images (NDArray): Images with shape (batch, height, width, color)
+        - model (Movenet): Movenet model
+
+    Returns:
+        NDArray: in dimension [batch, 17, 3], same as predict for each image
+    """
+    if len(images) == 1 or not supports_batch(model):
+        return np.stack([predict(images[i:i+1], model) for i in range(len(images))])
+    
+    input_images = images.astype(np.int32, copy=False)
+    input_name = model.get_inputs()[0].name
+    output_name = model.get_outputs()[0].name
+    outputs = model.run([output_name], {input_name:input_images})
+    return outputs[0][:, 0]
+
 def preprocess_kps(kps, scale_xy=(1., 1.)):
     """
     Change keypoints yx coordinate from movenet to xy coordinate
@@ -74,10 +292,10 @@ def preprocess_kps(kps, scale_xy=(1., 1.)):
     """
     average_confidence_rate = np.mean(kps[:, 2], axis=0)
     
-    for i in range(len(kps)):
-        temp_y = kps[i][0]
-        kps[i][0] = kps[i][1] * scale_xy[0]
-        kps[i][1] = temp_y * scale_xy[1]
+    # swap y and x columns in place
+    temp_y = kps[:, 0].copy()
+    np.multiply(kps[:, 1], scale_xy[0], out=kps[:, 0])
+    np.multiply(temp_y, scale_xy[1], out=kps[:, 1])
         
     return kps, average_confidence_rate
 
@@ -0,0 +1,91 @@
+import os
+import glob
+import argparse
+import numpy as np
+import onnxruntime as ort
+from onnxruntime.quantization import quantize_static, quantize_dynamic, CalibrationDataReader, QuantFormat, QuantType
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from .movenet_infer import MODEL_VARIANTS, preprocess_input_image_cv
+from ..video_reader import VideoReader
+
+DEFAULT_EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+class VideoCalibrationReader(CalibrationDataReader):
+    def __init__(self, video_paths, input_name, input_size, frame_step=10, max_frames=200):
+        """
+        Feed frames of exercise videos to onnxruntime calibration,
+        activation ranges are taken from these frames
+
+        Args:
+            - video_paths (list): paths to video files readable by OpenCV
+            - input_name (str): model input name
+            - input_size (tuple): model input size (width, height)
+            - frame_step (int, optional): use every frame_step-th frame. Defaults to 10.
+            - max_frames (int, optional): maximum number of calibration frames. Defaults to 200.
+        """
+        self.video_paths = video_paths
+        self.input_name = input_name
+        self.input_size = input_size
+        self.frame_step = max(frame_step, 1)
+        self.max_frames = max_frames
+        self.frames = None
+
+    def _load_frames(self):
+        frames = []
+        for video_path in self.video_paths:
+            with VideoReader(video_path) as reader:
+                for i, frame in enumerate(reader):
+                    if i % self.frame_step == 0:
+                        frames.append(preprocess_input_image_cv(frame, self.input_size).astype(np.int32))
+        return iter(frames[:self.max_frames])
+
+    def get_next(self):
+        if self.frames is None:
+            self.frames = self._load_frames()
+        frame = next(self.frames, None)
+        return None if frame is None else {self.input_name: frame}
+
+def main(model_path, output_path, examples_dir=DEFAULT_EXAMPLES_DIR, method="static"):
+    if method == "dynamic":
+        # weights only, no calibration frames needed
+        quantize_dynamic(model_path, output_path, weight_type=QuantType.QUInt8)
+    else:
+        video_paths = sorted(glob.glob(os.path.join(examples_dir, "*", "*.mp4")))
+        if len(video_paths) == 0:
+            raise Exception(f"no mp4 examples found in {examples_dir} for calibration")
+
+        model = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+        model_input = model.get_inputs()[0]
+        input_size = (model_input.shape[2], model_input.shape[1])
+
+        # shape inference and graph cleanup before quantization
+        preprocessed_path = f"{output_path}.pre.onnx"
+        quant_pre_process(model_path, preprocessed_path, skip_symbolic_shape=True)
+        try:
+            reader = VideoCalibrationReader(video_paths, model_input.name, input_size)
+            quantize_static(preprocessed_path, output_path, reader,
+                            quant_format=QuantFormat.QDQ,
+                            activation_type=QuantType.QUInt8,
+                            weight_type=QuantType.QInt8,
+                            per_channel=True)
+        finally:
+            os.remove(preprocessed_path)
+
+    print(f"{method} int8 model saved to {output_path}, "
+          f"{os.path.getsize(model_path) / 1e6:.1f} MB -> {os.path.getsize(output_path) / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="Quantize movenet model to int8",
+                                     description="""This program quantizes movenet thunder with
+                                     onnxruntime tooling. Static quantization calibrates activations
+                                     on example videos. Run from backend directory with
+                                     python -m rep_counting.movenet.quantize_model
+                                     """)
+    parser.add_argument("--model", help="Path to fp32 onnx model", default=MODEL_VARIANTS["thunder"]["model_path"])
+    parser.add_argument("--output", help="Path to int8 onnx model", default=MODEL_VARIANTS["thunder_int8"]["model_path"])
+    parser.add_argument("--examples", help="Directory with one subdirectory of mp4 examples per exercise", default=DEFAULT_EXAMPLES_DIR)
+    parser.add_argument("--method", help="static calibrates activations, dynamic quantizes weights only",
+                        choices=["static", "dynamic"], default="static")
+    args = parser.parse_args()
+
+    main(args.model, args.output, args.examples, args.method)
@@ -0,0 +1,149 @@
+import os
+import threading
+from concurrent.futures import Future
+from .movenet_infer import load_model, get_session_options, MODEL_PATH, DEFAULT_SESSION_PROFILE_PATH
+
+class SessionRegistry:
+    def __init__(self):
+        """
+        Process wide registry of movenet sessions. Sessions are keyed
+        by model path and session options so every user of the same
+        model shares one onnxruntime session, which is thread safe for
+        concurrent runs.
+        """
+        # key -> [session, reference count]
+        self.sessions = {}
+        self.keys = {}
+        # key -> future of session being loaded, other keys are
+        # acquired and released while a session loads
+        self.loading = {}
+        # id of session unloaded while in use -> remaining reference count,
+        # releasing them does nothing
+        self.unloaded = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_key(model_path=MODEL_PATH, session_options=None, profile_path=DEFAULT_SESSION_PROFILE_PATH) -> tuple:
+        """
+        Registry key of a session
+
+        Returns:
+            tuple: absolute model path and sorted session options
+        """
+        options = get_session_options(session_options, profile_path)
+        return (os.path.abspath(model_path), tuple(sorted(options.items())))
+
+    def acquire(self, model_path=MODEL_PATH, session_options=None, profile_path=DEFAULT_SESSION_PROFILE_PATH):
+        """
+        Get shared session, it is loaded on first acquire without
+        holding the registry lock, concurrent acquires of the same session
+        wait for that load. Each acquire must be paired with a release.
+
+        Args:
+            - model_path (str, optional): path to onnx model
+            - session_options (dict, optional): session options, see load_model
+            - profile_path (str, optional): path to session profile json file
+
+        Raises:
+            Exception: if session failed to load
+
+        Returns:
+            ONNX model
+        """
+        key = self.get_key(model_path, session_options, profile_path)
+        while True:
+            with self.lock:
+                entry = self.sessions.get(key, None)
+                if entry is not None:
+                    entry[1] += 1
+                    return entry[0]
+                loading = self.loading.get(key, None)
+                if loading is None:
+                    loading = Future()
+                    self.loading[key] = loading
+                    break
+            # loaded by another thread, raises its load error
+            loading.result()
+
+        try:
+            session = load_model(model_path, session_options=dict(key[1]), profile_path=None)
+        except BaseException as e:
+            with self.lock:
+                self.loading.pop(key)
+            loading.set_exception(e)
+            raise
+        with self.lock:
+            self.loading.pop(key)
+            self.sessions[key] = [session, 1]
+            self.keys[id(session)] = key
+        loading.set_result(session)
+        return session
+
+    def release(self, session) -> int:
+        """
+        Release a session from acquire, session stays loaded
+        until unload is called. Releasing a session unloaded
+        with force does nothing.
+
+        Args:
+            - session: ONNX model from acquire
+
+        Raises:
+            Exception: if session is not from this registry
+
+        Returns:
+            int: remaining reference count
+        """
+        with self.lock:
+            key = self.keys.get(id(session), None)
+            if key is None:
+                if id(session) in self.unloaded:
+                    count = self.unloaded[id(session)] - 1
+                    if count > 0:
+                        self.unloaded[id(session)] = count
+                    else:
+                        self.unloaded.pop(id(session))
+                    return 0
+                raise Exception("session was not acquired from this registry")
+            entry = self.sessions[key]
+            entry[1] = max(entry[1] - 1, 0)
+            return entry[1]
+
+    def get_reference_count(self, session) -> int:
+        """
+        Get number of users of a session
+
+        Returns:
+            int: reference count, 0 if session is not in registry
+        """
+        with self.lock:
+            key = self.keys.get(id(session), None)
+            return self.sessions[key][1] if key is not None else 0
+
+    def unload(self, force=False) -> int:
+        """
+        Unload sessions without users
+
+        Args:
+            - force (bool, optional): also unload sessions still in use,
+            their users keep working on their own reference. Defaults to False.
+
+        Returns:
+            int: number of unloaded sessions
+        """
+        with self.lock:
+            keys = [key for key, (_, count) in self.sessions.items() if force or count == 0]
+            for key in keys:
+                session, count = self.sessions.pop(key)
+                self.keys.pop(id(session), None)
+                if count > 0:
+                    # users still hold session so its id is not reused until they release
+                    self.unloaded[id(session)] = count
+            return len(keys)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.sessions)
+
+# shared by all repetition counters in this process
+session_registry = SessionRegistry()
@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import platform
+import argparse
+import itertools
+import numpy as np
+from .movenet_infer import load_model, predict, MODEL_PATH, get_input_size, DEFAULT_SESSION_PROFILE_PATH
+
+def get_candidates(cpu_count) -> list[dict]:
+    """
+    Session option combinations to benchmark
+
+    Args:
+        - cpu_count (int): number of cpu on host
+
+    Returns:
+        list: session options
+    """
+    threads = sorted({1, 2, 4, max(cpu_count // 2, 1), cpu_count})
+    threads = [t for t in threads if t <= cpu_count]
+    candidates = []
+    for intra, level in itertools.product(threads, ["basic", "extended", "all"]):
+        candidates.append({"intra_op_num_threads": intra, "inter_op_num_threads": 1,
+                           "execution_mode": "sequential", "graph_optimization_level": level})
+        candidates.append({"intra_op_num_threads": intra, "inter_op_num_threads": 2,
+                           "execution_mode": "parallel", "graph_optimization_level": level})
+    return candidates
+
+def benchmark(model_path, session_options, runs=50, warmup=5) -> float:
+    """
+    Measure median latency of one movenet run
+
+    Args:
+        - model_path (str): path to onnx model
+        - session_options (dict): session options
+        - runs (int, optional): number of timed runs. Defaults to 50.
+        - warmup (int, optional): number of runs before timing. Defaults to 5.
+
+    Returns:
+        float: median latency in milliseconds
+    """
+    model = load_model(model_path, session_options=session_options, profile_path=None)
+    width, height = get_input_size(model)
+    image = np.random.randint(0, 256, (1, height, width, 3), dtype=np.int32)
+    for _ in range(warmup):
+        predict(image, model)
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict(image, model)
+        latencies.append((time.perf_counter() - start) * 1000.)
+    return float(np.median(latencies))
+
+def main(model_path=MODEL_PATH, profile_path=DEFAULT_SESSION_PROFILE_PATH, runs=50):
+    cpu_count = os.cpu_count() or 1
+    results = []
+    for session_options in get_candidates(cpu_count):
+        latency = benchmark(model_path, session_options, runs=runs)
+        results.append({"session_options": session_options, "latency_ms": latency})
+        print(json.dumps(results[-1]))
+
+    best = min(results, key=lambda r: r["latency_ms"])
+    profile = {"session_options": best["session_options"],
+               "latency_ms": best["latency_ms"],
+               "model_path": os.path.basename(model_path),
+               "host": platform.node(),
+               "cpu_count": cpu_count,
+               "results": results}
+
+    # write to temp file first so a running server never reads half a profile
+    temp_path = f"{profile_path}.tmp"
+    with open(temp_path, 'w') as f:
+        f.write(json.dumps(profile, indent=2))
+    os.replace(temp_path, profile_path)
+    print(f"fastest {best['session_options']} {best['latency_ms']:.2f} ms saved to {profile_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="Tune movenet onnxruntime session",
+                                     description="""This program benchmarks session option combinations
+                                     on this host and saves the fastest as session profile, which is
+                                     used by load_model. Run from backend directory with
+                                     python -m rep_counting.movenet.tune_session
+                                     """)
+    parser.add_argument("--model", help="Path to onnx model", default=MODEL_PATH)
+    parser.add_argument("--profile", help="Path to output session profile json", default=DEFAULT_SESSION_PROFILE_PATH)
+    parser.add_argument("--runs", help="Number of timed runs per combination", type=int, default=50)
+    args = parser.parse_args()
+
+    main(args.model, args.profile, args.runs)
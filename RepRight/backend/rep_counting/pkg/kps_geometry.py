@@ -0,0 +1,121 @@
+import numpy as np
+
+# number of keypoints from movenet
+NUM_KPS = 17
+
+# axis weights (x, y) for distance metrics, distance is
+# sqrt(|wx * dx^2 - wy * dy^2|), on 'xy' axis it is 
+# sqrt(|dx^2 - dy^2|) as exercise configs were made with
+DISTANCE_AXIS_WEIGHTS = {
+    'xy': (1., 1.),
+    'x': (1., 0.),
+    'y': (0., 1.)
+}
+
+class MetricTable:
+    def __init__(self, distance_metrics, angle_metrics):
+        """
+        Index tables of keypoint metrics for an exercise, used by
+        compute_metrics to calculate all metrics in one pass
+
+        Args:
+            - distance_metrics (list): list of (name, kpi1, kpi2, axis) where
+            axis is one of 'xy', 'x', 'y'
+            - angle_metrics (list): list of (name, kpi1, kpi2, kpi3), angle is
+            between vector kpi21 and vector kpi23
+        """
+        for name, _, _, axis in distance_metrics:
+            if axis.lower() not in DISTANCE_AXIS_WEIGHTS:
+                raise Exception(f"axis of {name} must be either 'xy', 'x' or 'y'")
+
+        # metric names, distances first then angles
+        self.names = [m[0] for m in distance_metrics] + [m[0] for m in angle_metrics]
+        self.num_distances = len(distance_metrics)
+        self.num_angles = len(angle_metrics)
+
+        # every metric only needs differences of keypoints, so all vectors
+        # are made by one linear operator (D + 2A, 17) applied to keypoints
+        #   - rows [0, D): vector kpi1 -> kpi2 of distances
+        #   - rows [D, D+A): vector kpi2 -> kpi1 of angles
+        #   - rows [D+A, D+2A): vector kpi2 -> kpi3 of angles
+        num_vectors = self.num_distances + 2 * self.num_angles
+        self.operator = np.zeros((num_vectors, NUM_KPS), dtype=np.float64)
+        for i, (_, kpi1, kpi2, _) in enumerate(distance_metrics):
+            self.operator[i, kpi2] += 1.
+            self.operator[i, kpi1] -= 1.
+        for i, (_, kpi1, kpi2, kpi3) in enumerate(angle_metrics):
+            row = self.num_distances + i
+            self.operator[row, kpi1] += 1.
+            self.operator[row, kpi2] -= 1.
+            self.operator[row + self.num_angles, kpi3] += 1.
+            self.operator[row + self.num_angles, kpi2] -= 1.
+
+        # weights (D + 2A, 2) of squared vectors, the sum of weighted
+        # squared vector is wx * dx^2 - wy * dy^2 for distances and
+        # squared magnitude for angle vectors
+        self.weights = np.ones((num_vectors, 2), dtype=np.float64)
+        for i, (_, _, _, axis) in enumerate(distance_metrics):
+            wx, wy = DISTANCE_AXIS_WEIGHTS[axis.lower()]
+            self.weights[i] = (wx, -wy)
+
+    def __len__(self):
+        return len(self.names)
+
+def compute_metrics(kps, table:MetricTable, ratio=None):
+    """
+    Calculate all distance and angle metrics of a metric table
+
+    Args:
+        - kps (NDArray): keypoints with shape (17, 2+) for one frame or
+        (T, 17, 2+) for T frames, only first two values (xy) of the last
+        dimension are used
+        - table (MetricTable): metrics to calculate
+        - ratio (tuple, optional): (x_ratio, y_ratio) only applied on distances.
+        Defaults to None. If None ratio is (1, 1)
+
+    Returns:
+        NDArray: metrics with shape (M,) or (T, M) in order of table.names
+    """
+    xy = np.asarray(kps)[..., :2]
+    
+    # all vectors of metrics (..., D+2A, 2)
+    vectors = table.operator @ xy
+    
+    num_d = table.num_distances
+    num_a = table.num_angles
+    metrics = np.empty(vectors.shape[:-2] + (num_d + num_a,))
+    
+    # sum of weighted squared vectors (..., D+2A)
+    weights = table.weights
+    if ratio and (ratio[0] != 1 or ratio[1] != 1):
+        weights = weights.copy()
+        weights[:num_d] *= (ratio[0]**2, ratio[1]**2)
+    sq = np.multiply(vectors, vectors)
+    np.multiply(sq, weights, out=sq)
+    sq = np.add(sq[..., 0], sq[..., 1])
+    
+    ###
+    # distances
+    dist = metrics[..., :num_d]
+    np.abs(sq[..., :num_d], out=dist)
+    np.sqrt(dist, out=dist)
+    
+    ###
+    # angles
+    angle = metrics[..., num_d:]
+    prod = np.multiply(vectors[..., num_d:num_d + num_a, :], vectors[..., num_d + num_a:, :])
+    dot = np.add(prod[..., 0], prod[..., 1])
+    mag = np.multiply(sq[..., num_d:num_d + num_a], sq[..., num_d + num_a:])
+    np.sqrt(mag, out=mag)
+    
+    # zero length vector is treated as theta 1 (0 degree),
+    # prevent theta out of 1 and -1 range 
+    # otherwise arccos return nan
+    angle.fill(1.)
+    np.divide(dot, mag, out=angle, where=mag > 0.)
+    np.minimum(angle, 1., out=angle)
+    np.maximum(angle, -1., out=angle)
+    np.arccos(angle, out=angle)
+    np.degrees(angle, out=angle)
+    
+    return metrics
@@ -1,14 +1,19 @@
 from abc import ABC, abstractmethod
 from enum import Enum
-import math
 import numpy as np
 import os
 import warnings
 import json
+from collections import deque
 from .low_pass_filter import LPFilter
+from .pattern_matcher import PatternMatcher
+from .kps_geometry import MetricTable, compute_metrics
+
+# number of latest tracked metrics and patterns kept in history
+DEFAULT_HISTORY_SIZE = 256
 
 class KpsMetrics(ABC):
-    def __init__(self, low_pass_filter=True, low_pass_filter_alpha=0.4, config_path=None):
+    def __init__(self, low_pass_filter=True, low_pass_filter_alpha=0.4, config_path=None, history_size=DEFAULT_HISTORY_SIZE):
         """
         Create a keypoints metric object
         
@@ -19,14 +24,26 @@ class KpsMetrics(ABC):
             out high frequency singal. Defaults to 0.4.
             - config_path (str, optional): path to json config file contain data for exercise and used to
             count exercise reptition.
+            - history_size (int, optional): maximum number of latest tracked metrics and
+            tracked patterns to keep, older values are dropped. Repetition counting
+            doesn't depend on it. Defaults to DEFAULT_HISTORY_SIZE.
         """
         super().__init__()
-        # state of metrics and their name
-        self.states = {e.name:0. for e in self.get_metric_names()}
+        # index tables of metrics
+        self.metric_table = self._get_metric_table()
+        metric_names = [e.name for e in self.get_metric_names()]
+        if sorted(self.metric_table.names) != sorted(metric_names):
+            raise Exception(f"metric table {self.metric_table.names} doesn't match metric names {metric_names}")
+        
+        # position of every metric in states
+        self.metric_index = {name: i for i, name in enumerate(self.metric_table.names)}
         
-        # create low pass filter for
-        # each metric
-        self.lpfs = {e.name:LPFilter() for e in self.get_metric_names()} if low_pass_filter else None
+        # state of metrics in order of metric table names
+        self.states = np.zeros(len(self.metric_table))
+        
+        # one low pass filter for all metrics, 
+        # it filters states array element wise
+        self.lpf = LPFilter() if low_pass_filter else None
         
         # low pass filter
         self.low_pass_filter = low_pass_filter
@@ -41,12 +58,18 @@ class KpsMetrics(ABC):
         # config data from json for the exercise
         self.config = None
         
-        # a list of sum of metrics
-        self.tracked_metrics = []
+        # position in states of none stationary metrics from config
+        self.motion_indices = None
+        
+        if history_size < 1:
+            raise Exception(f"history_size must be greater than 0 but given {history_size}")
         
-        # a list of tracked pattern
+        # ring buffer of latest sum of metrics
+        self.tracked_metrics = deque(maxlen=history_size)
+        
+        # ring buffer of latest tracked pattern
         # converted from sum of metrics 
-        self.tracked_pattern = []
+        self.tracked_pattern = deque(maxlen=history_size)
         
         # pattern to be matched
         self.query_pattern = None
@@ -57,6 +80,10 @@ class KpsMetrics(ABC):
         if none_binary_found:
             raise Exception(f"values of query pattern list can only be 1 or 0. but given {self.query_pattern}")
         
+        # streaming matcher counting query pattern
+        # found in tracked pattern
+        self.pattern_matcher = PatternMatcher(self.query_pattern.tolist())
+        
         # total repetition count performed
         self.reptition_count = 0
         
@@ -71,6 +98,10 @@ class KpsMetrics(ABC):
             with open(config_path, 'r') as f:
                     config_data = json.load(f)
                     self.config = self._load_config_data(config_data)
+            unknown_names = [name for name in self.config['motion_names'] if name not in self.metric_index]
+            if unknown_names:
+                raise Exception(f"motion names {unknown_names} of {config_path} are not metrics of {self.get_exercise_name()}")
+            self.motion_indices = np.array([self.metric_index[name] for name in self.config['motion_names']], dtype=np.intp)
         else:
             warnings.warn("No config file given, metric will not do repetition counting")
 
@@ -95,15 +126,43 @@ class KpsMetrics(ABC):
         pass
     
     @abstractmethod
-    def _process_metrics(self, kps, states, ratio) -> None:
+    def _get_metric_table(self) -> MetricTable:
+        """
+        Get index tables of all metrics
+
+        Returns:
+            MetricTable: distance and angle metrics of this exercise
+        """
+        pass
+    
+    def _process_metrics(self, kps, ratio):
         """
         Processing keypoints into metrics
 
         Args:
             - kps (NDArray): all keypoints
-            - states (dict): where all metrics to be stored
+            - ratio (tuple): scale for x and y only for distances
+
+        Returns:
+            NDArray: metrics in order of metric table names
         """
-        pass
+        return compute_metrics(kps, self.metric_table, ratio)
+    
+    def compute_metrics(self, kps, ratio=(1., 1.)) -> dict:
+        """
+        Processing keypoints of many frames into metrics at once, 
+        no filter is applied and state is not updated
+
+        Args:
+            - kps (NDArray): keypoints with shape (T, 17, 2+)
+            - ratio (tuple, optional): scale for x and y 
+            only for calculate distance on keypoints
+
+        Returns:
+            dict: metric name and array of T metrics pair dictionary
+        """
+        metrics = compute_metrics(kps, self.metric_table, ratio)
+        return {name: metrics[..., i] for i, name in enumerate(self.metric_table.names)}
     
     @abstractmethod
     def _get_query_pattern(self) -> list[int]:
@@ -140,15 +199,14 @@ class KpsMetrics(ABC):
         confidence_rate_threshold = max(min(confidence_rate_threshold, 1.0), 0.0)
         
         ###
-        # process keypoints into metrics
-        self._process_metrics(kps, self.states, ratio)
-        
-        ###
+        # process keypoints into metrics and
         # apply low pass filter on metrics
-        if self.low_pass_filter and self.lpfs:
-            if len(self.states) != len(self.lpfs):
-                raise Exception(f"length of states and filter(lpfs) are not equal {len(self.states)} {len(self.lpfs)}")
-            self._low_pass_filter_metrics()
+        metrics = self._process_metrics(kps, ratio)
+        if self.low_pass_filter and self.lpf is not None:
+            metrics = self.lpf.update(metrics, self.low_pass_filter_alpha)
+        # a new array every frame, so arrays from 
+        # get_metric_values are never changed
+        self.states = metrics
         
         ### 
         # repetition counting
@@ -157,25 +215,12 @@ class KpsMetrics(ABC):
         # step 3. find number of repetition
         if self.config is not None:
             ###
-            # filter out stationary metrics
-            
-            # get all none stationary exercise names from config
-            motion_names = self.config['motion_names']
-            none_stationary_metrics = [[] for _ in motion_names]
-            for i, name in enumerate(motion_names):
-                metric = self.states[name]
-                none_stationary_metrics[i].append(metric)
-            none_stationary_metrics = np.array(none_stationary_metrics)
-            
-            ###
-            # sum none stationary metrics
-            if len(self.tracked_metrics) > 0:
-                if confidence_rate >= confidence_rate_threshold:
-                    sum_metric = np.sum(none_stationary_metrics, axis=0)[0]
-                else:
-                    sum_metric = self.tracked_metrics[-1]
+            # sum none stationary metrics from config,
+            # stationary metrics are filtered out
+            if len(self.tracked_metrics) > 0 and confidence_rate < confidence_rate_threshold:
+                sum_metric = self.tracked_metrics[-1]
             else:
-                sum_metric = np.sum(none_stationary_metrics, axis=0)[0]
+                sum_metric = float(self.states[self.motion_indices].sum())
             self.tracked_metrics.append(sum_metric)
             
             ### 
@@ -193,51 +238,24 @@ class KpsMetrics(ABC):
             # if mean=5.0 signals=[1.0, 2.0, 10.0, 6.0, 3.0]
             # output pattern=[0, 1, 0] 
             if sum_metric < mean:
-                if len(self.tracked_pattern) > 0:
-                    # only add 0 if last value in pattern
-                    # is different than 0
-                    if self.tracked_pattern[-1] != 0:
-                        self.tracked_pattern.append(0)
-                else:
-                    self.tracked_pattern.append(0)
-                    
+                pattern = 0
             else:
-                if len(self.tracked_pattern) > 0:
-                    # only add 1 if last value in pattern
-                    # is different than 1
-                    if self.tracked_pattern[-1] != 1:
-                        self.tracked_pattern.append(1)
-                else:
-                    self.tracked_pattern.append(1)
-            
-            # length of query pattern
-            len_q_pattern = len(self.query_pattern)
+                pattern = 1
             
-            # length of tracked pattern
-            len_t_pattern = len(self.tracked_pattern)
-                    
-            if len_t_pattern >= len_q_pattern:
-                rep = 0
+            # only add pattern if last value in pattern
+            # is different than pattern
+            if len(self.tracked_pattern) == 0 or self.tracked_pattern[-1] != pattern:
+                self.tracked_pattern.append(pattern)
                 
-                # find number of query pattern match
-                for i in range(len_t_pattern - len_q_pattern + 1):
-                    # get subset of tracked pattern
-                    t_pattern = np.array(self.tracked_pattern[i:i+len_q_pattern])
-                    
-                    # pattern match only if sum of difference between
-                    # tracked pattern and query pattern is 0
-                    # 
-                    # example:
-                    # substraction pattern 1 and pattern 2 = [1,0,1] - [1,0,1] = [0,0,0]
-                    # sum [0,0,0] = 0
-                    # substraction pattern 1 and pattern 2 = [1,1,0] - [1,0,1] = [0,1,-1]
-                    # absolute [0,1,-1] = [0,1,1]
-                    # sum [0,1,1] = 1  
-                    if np.absolute(t_pattern - self.query_pattern).sum() == 0:
-                       rep += 1
-                       
-                # update repetition count
-                self.reptition_count = rep 
+                # feed new pattern value to matcher, a repetition
+                # is counted every time the query pattern is matched
+                # against the latest values of tracked pattern
+                #
+                # example:
+                # query pattern=[0,1,0] tracked pattern=[0,1,0,1,0]
+                # match found at index 0 and 2, repetition count is 2
+                if self.pattern_matcher.update(pattern):
+                    self.reptition_count = self.pattern_matcher.count
     
     def _load_config_data(self, config_data) -> dict:
         """
@@ -254,118 +272,41 @@ class KpsMetrics(ABC):
         if data is None:
             raise Exception(f"{exercise_name} was not found in config file")
         return data
-                        
-    def _low_pass_filter_metrics(self) -> None:
-        """
-        Low pass filter to smooth signals(metrics)
-        """
-        for metric_name in list(self.states.keys()):
-            # get low pass filter
-            lpf = self.lpfs[metric_name]
-            
-            # get current metric 
-            metric = self.states[metric_name]
-            
-            # update metric
-            self.states[metric_name] = lpf.update(metric, 
-                                                 self.low_pass_filter_alpha)
     
     def get_metrics(self) -> dict[str, float]:
         """
-        Get current metrics
+        Get current metrics, built on every call, 
+        use get_metric_values in per frame loops
 
         Returns:
             dict[str, float]: metric name and value pair dictionary
         """
-        return self.states
+        return dict(zip(self.metric_table.names, self.states.tolist()))
     
-    def get_reptition_count(self) -> int:
+    def get_metric_values(self):
         """
-        Get current total exercise reptition count
+        Get current metrics without building a dictionary
 
         Returns:
-            int: repetition count
+            NDArray: metrics in order of metric table names, see
+            get_metric_table_names, it is not changed by later updates
         """
-        return self.reptition_count
+        return self.states
     
-    @staticmethod
-    def distance(kpi1:int, kpi2:int, kps, on_axis='xy', ratio=None):
+    def get_metric_table_names(self) -> list[str]:
         """
-        Calculate distance between two keypoints
-        
-        Args:
-            - kpi1 (int): index of keypoint 1
-            - kpi2 (int): index of keypoint 2
-            - kps (dict): all keypoints
-            - on_axis (str, optional): which axis to calculate on. Defaults to 'xy'.
-            - ratio (tuple, optional): (x_ratio, y_ratio). Defaults to None. If None
-            ratio is (1, 1)
-
-        Raises:
-            Exception: when on_axis is not one of x, y, xy
+        Get metric names in order of get_metric_values
 
         Returns:
-            float: distance
+            list: metric names
         """
-        if not ratio:
-            ratio = (1, 1)
-        
-        on_axis = on_axis.lower()    
-        dx = (kps[kpi2][0] - kps[kpi1][0]) * ratio[0]
-        dy = (kps[kpi2][1] - kps[kpi1][1]) * ratio[1]
-        dist = 0
-        
-        if on_axis == 'xy':
-            dxdy = dx**2 - dy**2
-            dist = math.sqrt(abs(dxdy))
-        elif on_axis == 'x':
-            dist = abs(dx)
-        elif on_axis == 'y':
-            dist = abs(dy)
-        else:
-            raise Exception("on_axis must be either 'xy', 'x' or 'y'")
-        
-        return dist
+        return self.metric_table.names
     
-    @staticmethod
-    def angle(kpi1:int, kpi2:int, kpi3:int, kps):
+    def get_reptition_count(self) -> int:
         """
-        Calculate angle(degree) between 3 keypoints
-        hence angle between vector -> kpi21 and vector
-        -> kpi23
-
-        Args:
-            - kpi1 (int): index of keypoints 1
-            - kpi2 (int): index of keypoints 2
-            - kpi3 (int): index of keypoints 3
-            - kps (dict): all keypoints
+        Get current total exercise reptition count
 
         Returns:
-            angle(degree): angle between kpi21 and kpi23
+            int: repetition count
         """
-        # keypoints for kp1 ~ kp3
-        kp1 = (kps[kpi1][0], kps[kpi1][1])
-        kp2 = (kps[kpi2][0], kps[kpi2][1])
-        kp3 = (kps[kpi3][0], kps[kpi3][1])
-        
-        # vectors for kp21, kp23
-        kp21 = [kp1[0]-kp2[0], kp1[1]-kp2[1]]
-        kp23 = [kp3[0]-kp2[0], kp3[1]-kp2[1]]
-        
-        # magnitude for kp21, kp23
-        mag_kp21 = math.sqrt(kp21[0]**2 + kp21[1]**2)
-        mag_kp23 = math.sqrt(kp23[0]**2 + kp23[1]**2)
-        
-        # calculate angle in degree
-        theta = np.dot(kp21, kp23) / (abs(mag_kp21) * abs(mag_kp23))
-        
-        # preven theta out of 1 and -1 range
-        # otherwise acos will throw error
-        theta = min(1, max(theta, -1))
-        angle_degree = math.degrees(math.acos(theta))
-        
-        return angle_degree
-    
-    
-         
-    
\ No newline at end of file
+        return self.reptition_count
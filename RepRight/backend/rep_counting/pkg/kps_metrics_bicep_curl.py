@@ -1,5 +1,6 @@
-from .kps_metrics import KpsMetrics
+from .kps_metrics import KpsMetrics, DEFAULT_HISTORY_SIZE
 from .kps_constant import KPS_INDEX_DICT
+from .kps_geometry import MetricTable
 from enum import Enum
 
 class KpsMetricsBicepCurl(KpsMetrics):
@@ -10,10 +11,27 @@ class KpsMetricsBicepCurl(KpsMetrics):
     
     exercise_name = 'bicepcurl'
     
-    def __init__(self, low_pass_filter=True, low_pass_filter_alpha=0.4, config_path=None):
+    metric_table = MetricTable(
+        distance_metrics=[
+            # Distance between left and right shoulder
+            ("shl_dist", KPS_INDEX_DICT.left_shoulder.value, KPS_INDEX_DICT.right_shoulder.value, 'xy'),
+            # Distance between left shoulder and wrist
+            ("lshl_lwrist_dist", KPS_INDEX_DICT.left_shoulder.value, KPS_INDEX_DICT.left_wrist.value, 'y'),
+            # Distance between right shoulder and wrist
+            ("rshl_rwrist_dist", KPS_INDEX_DICT.right_shoulder.value, KPS_INDEX_DICT.right_wrist.value, 'y'),
+        ],
+        angle_metrics=[
+            # Angle at the left shoulder between elbow and wrist
+            ("lelbow_angle", KPS_INDEX_DICT.left_elbow.value, KPS_INDEX_DICT.left_shoulder.value, KPS_INDEX_DICT.left_wrist.value),
+            # Angle at the right shoulder between elbow and wrist
+            ("relbow_angle", KPS_INDEX_DICT.right_elbow.value, KPS_INDEX_DICT.right_shoulder.value, KPS_INDEX_DICT.right_wrist.value),
+        ])
+    
+    def __init__(self, low_pass_filter=True, low_pass_filter_alpha=0.4, config_path=None, history_size=DEFAULT_HISTORY_SIZE):
         super().__init__(low_pass_filter=low_pass_filter,
                          low_pass_filter_alpha=low_pass_filter_alpha,
-                         config_path=config_path)
+                         config_path=config_path,
+                         history_size=history_size)
     
     def get_exercise_name(self) -> str:
         return self.exercise_name.lower()
@@ -21,51 +39,9 @@ class KpsMetricsBicepCurl(KpsMetrics):
     def _get_query_pattern(self) -> list[int]:
         return [0, 1, 0]
     
-    def _process_metrics(self, kps, states, ratio):
-        # Distance between shoulder and elbow
-        states[self.metric_names.shl_dist.name] = self.distance(
-            KPS_INDEX_DICT.left_shoulder.value,
-            KPS_INDEX_DICT.right_shoulder.value,
-            kps,
-            'xy',
-            ratio
-        )
-        
-        # Distance between left shoulder and wrist
-        states[self.metric_names.lshl_lwrist_dist.name] = self.distance(
-            KPS_INDEX_DICT.left_shoulder.value,
-            KPS_INDEX_DICT.left_wrist.value,
-            kps,
-            'y',
-            ratio
-        )
-        
-        # Distance between right shoulder and wrist
-        states[self.metric_names.rshl_rwrist_dist.name] = self.distance(
-            KPS_INDEX_DICT.right_shoulder.value,
-            KPS_INDEX_DICT.right_wrist.value,
-            kps,
-            'y',
-            ratio
-        )
+    def _get_metric_table(self) -> MetricTable:
+        return self.metric_table
         
-        # Angle at the left elbow
-        states[self.metric_names.lelbow_angle.name] = self.angle(
-            KPS_INDEX_DICT.left_elbow.value,
-            KPS_INDEX_DICT.left_shoulder.value,
-            KPS_INDEX_DICT.left_wrist.value,
-            kps
-        )
-        
-        # Angle at the right elbow
-        states[self.metric_names.relbow_angle.name] = self.angle(
-            KPS_INDEX_DICT.right_elbow.value,
-            KPS_INDEX_DICT.right_shoulder.value,
-            KPS_INDEX_DICT.right_wrist.value,
-            kps
-        )
-
-    
     def get_metric_names(self):
         return self.metric_names
 
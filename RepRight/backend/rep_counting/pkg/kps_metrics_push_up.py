@@ -1,5 +1,6 @@
-from .kps_metrics import KpsMetrics
+from .kps_metrics import KpsMetrics, DEFAULT_HISTORY_SIZE
 from .kps_constant import KPS_INDEX_DICT
+from .kps_geometry import MetricTable
 from enum import Enum
 
 class KpsMetricsPushup(KpsMetrics):
@@ -22,10 +23,31 @@ class KpsMetricsPushup(KpsMetrics):
     
     exercise_name = 'Pushup'
     
-    def __init__(self, low_pass_filter=True, low_pass_filter_alpha=0.4, config_path=None):
+    metric_table = MetricTable(
+        distance_metrics=[
+            ("lshl_lpalm_dist", KPS_INDEX_DICT.left_shoulder.value, KPS_INDEX_DICT.left_wrist.value, 'xy'),
+            ("rshl_rPalm_dist", KPS_INDEX_DICT.right_shoulder.value, KPS_INDEX_DICT.right_wrist.value, 'xy'),
+            ("lshl_lhip_dist", KPS_INDEX_DICT.left_shoulder.value, KPS_INDEX_DICT.left_hip.value, 'xy'),
+            ("rshl_rhip_dist", KPS_INDEX_DICT.right_shoulder.value, KPS_INDEX_DICT.right_hip.value, 'xy'),
+            ("lknee_lhip_dist", KPS_INDEX_DICT.left_knee.value, KPS_INDEX_DICT.left_hip.value, 'xy'),
+            ("rknee_rhip_dist", KPS_INDEX_DICT.right_knee.value, KPS_INDEX_DICT.right_hip.value, 'xy'),
+            ("lknee_lfeet_dist", KPS_INDEX_DICT.left_knee.value, KPS_INDEX_DICT.left_ankle.value, 'xy'),
+            ("rknee_rfeet_dist", KPS_INDEX_DICT.right_knee.value, KPS_INDEX_DICT.right_ankle.value, 'xy'),
+            ("lhip_lfeet_dist", KPS_INDEX_DICT.left_hip.value, KPS_INDEX_DICT.left_ankle.value, 'xy'),
+            ("rhip_rfeet_dist", KPS_INDEX_DICT.right_hip.value, KPS_INDEX_DICT.right_ankle.value, 'xy'),
+        ],
+        angle_metrics=[
+            ("lelb_angle", KPS_INDEX_DICT.left_shoulder.value, KPS_INDEX_DICT.left_elbow.value, KPS_INDEX_DICT.left_wrist.value),
+            ("relb_angle", KPS_INDEX_DICT.right_shoulder.value, KPS_INDEX_DICT.right_elbow.value, KPS_INDEX_DICT.right_wrist.value),
+            ("lshl_angle", KPS_INDEX_DICT.left_elbow.value, KPS_INDEX_DICT.left_shoulder.value, KPS_INDEX_DICT.left_hip.value),
+            ("rshl_angle", KPS_INDEX_DICT.right_elbow.value, KPS_INDEX_DICT.right_shoulder.value, KPS_INDEX_DICT.right_hip.value),
+        ])
+    
+    def __init__(self, low_pass_filter=True, low_pass_filter_alpha=0.4, config_path=None, history_size=DEFAULT_HISTORY_SIZE):
         super().__init__(low_pass_filter=low_pass_filter,
                          low_pass_filter_alpha=low_pass_filter_alpha,
-                         config_path=config_path)
+                         config_path=config_path,
+                         history_size=history_size)
     
     def get_exercise_name(self) -> str:
         return self.exercise_name.lower()
@@ -33,73 +55,8 @@ class KpsMetricsPushup(KpsMetrics):
     def _get_query_pattern(self) -> list[int]:
         return [1, 0, 1]
     
-    def _process_metrics(self, kps, states, ratio):
-        states[self.metric_names.lshl_lpalm_dist.name] = self.distance(KPS_INDEX_DICT.left_shoulder.value,
-                                                                        KPS_INDEX_DICT.left_wrist.value,
-                                                                        kps,
-                                                                        'xy',
-                                                                        ratio)
-        states[self.metric_names.rshl_rPalm_dist.name] = self.distance(KPS_INDEX_DICT.right_shoulder.value,
-                                                                       KPS_INDEX_DICT.right_wrist.value,
-                                                                       kps,
-                                                                       "xy",
-                                                                       ratio)
-        states[self.metric_names.lshl_lhip_dist.name] = self.distance(KPS_INDEX_DICT.left_shoulder.value,
-                                                                      KPS_INDEX_DICT.left_hip.value,
-                                                                      kps,
-                                                                      "xy",
-                                                                      ratio)
-        states[self.metric_names.rshl_rhip_dist.name] = self.distance(KPS_INDEX_DICT.right_shoulder.value,
-                                                                      KPS_INDEX_DICT.right_hip.value,
-                                                                      kps,
-                                                                      "xy",
-                                                                      ratio)
-        states[self.metric_names.lknee_lhip_dist.name] = self.distance(KPS_INDEX_DICT.left_knee.value,
-                                                                       KPS_INDEX_DICT.left_hip.value,
-                                                                       kps,
-                                                                       "xy",
-                                                                       ratio)
-        states[self.metric_names.rknee_rhip_dist.name] = self.distance(KPS_INDEX_DICT.right_knee.value,
-                                                                       KPS_INDEX_DICT.right_hip.value,
-                                                                       kps,
-                                                                       "xy",
-                                                                       ratio)
-        states[self.metric_names.lknee_lfeet_dist.name] = self.distance(KPS_INDEX_DICT.left_knee.value,
-                                                                        KPS_INDEX_DICT.left_ankle.value,
-                                                                        kps,
-                                                                        "xy",
-                                                                        ratio)
-        states[self.metric_names.rknee_rfeet_dist.name] = self.distance(KPS_INDEX_DICT.right_knee.value,
-                                                                        KPS_INDEX_DICT.right_ankle.value,
-                                                                        kps,
-                                                                        "xy",
-                                                                        ratio)
-        states[self.metric_names.lhip_lfeet_dist.name] = self.distance(KPS_INDEX_DICT.left_hip.value,
-                                                                       KPS_INDEX_DICT.left_ankle.value,
-                                                                       kps,
-                                                                       "xy",
-                                                                       ratio)
-        states[self.metric_names.rhip_rfeet_dist.name] = self.distance(KPS_INDEX_DICT.right_hip.value,
-                                                                       KPS_INDEX_DICT.right_ankle.value,
-                                                                       kps,
-                                                                       "xy",
-                                                                       ratio)
-        states[self.metric_names.lelb_angle.name] = self.angle(KPS_INDEX_DICT.left_shoulder.value,
-                                                               KPS_INDEX_DICT.left_elbow.value,
-                                                               KPS_INDEX_DICT.left_wrist.value,
-                                                               kps)
-        states[self.metric_names.relb_angle.name] = self.angle(KPS_INDEX_DICT.right_shoulder.value,
-                                                               KPS_INDEX_DICT.right_elbow.value,
-                                                               KPS_INDEX_DICT.right_wrist.value,
-                                                               kps)
-        states[self.metric_names.lshl_angle.name] = self.angle(KPS_INDEX_DICT.left_elbow.value,
-                                                               KPS_INDEX_DICT.left_shoulder.value,
-                                                               KPS_INDEX_DICT.left_hip.value,
-                                                               kps)
-        states[self.metric_names.rshl_angle.name] = self.angle(KPS_INDEX_DICT.right_elbow.value,
-                                                               KPS_INDEX_DICT.right_shoulder.value,
-                                                               KPS_INDEX_DICT.right_hip.value,
-                                                               kps)
+    def _get_metric_table(self) -> MetricTable:
+        return self.metric_table
         
     def get_metric_names(self):
         return self.metric_names
@@ -1,5 +1,6 @@
-from .kps_metrics import KpsMetrics
+from .kps_metrics import KpsMetrics, DEFAULT_HISTORY_SIZE
 from .kps_constant import KPS_INDEX_DICT
+from .kps_geometry import MetricTable
 from enum import Enum
 
 class KpsMetricsSquat(KpsMetrics):
@@ -10,10 +11,27 @@ class KpsMetricsSquat(KpsMetrics):
     
     exercise_name = 'squat'
     
-    def __init__(self, low_pass_filter=True, low_pass_filter_alpha=0.4, config_path=None):
+    metric_table = MetricTable(
+        distance_metrics=[
+            # Distance between left and right hip
+            ("hip_dist", KPS_INDEX_DICT.left_hip.value, KPS_INDEX_DICT.right_hip.value, 'xy'),
+            # Distance between left hip and ankle
+            ("lhip_lankle_dist", KPS_INDEX_DICT.left_hip.value, KPS_INDEX_DICT.left_ankle.value, 'xy'),
+            # Distance between right hip and ankle
+            ("rhip_rankle_dist", KPS_INDEX_DICT.right_hip.value, KPS_INDEX_DICT.right_ankle.value, 'xy'),
+        ],
+        angle_metrics=[
+            # Angle at the left hip between knee and ankle
+            ("lknee_angle", KPS_INDEX_DICT.left_knee.value, KPS_INDEX_DICT.left_hip.value, KPS_INDEX_DICT.left_ankle.value),
+            # Angle at the right hip between knee and ankle
+            ("rknee_angle", KPS_INDEX_DICT.right_knee.value, KPS_INDEX_DICT.right_hip.value, KPS_INDEX_DICT.right_ankle.value),
+        ])
+    
+    def __init__(self, low_pass_filter=True, low_pass_filter_alpha=0.4, config_path=None, history_size=DEFAULT_HISTORY_SIZE):
         super().__init__(low_pass_filter=low_pass_filter,
                          low_pass_filter_alpha=low_pass_filter_alpha,
-                         config_path=config_path)
+                         config_path=config_path,
+                         history_size=history_size)
     
     def get_exercise_name(self) -> str:
         return self.exercise_name.lower()
@@ -21,51 +39,9 @@ class KpsMetricsSquat(KpsMetrics):
     def _get_query_pattern(self) -> list[int]:
         return [0, 1, 0]
     
-    def _process_metrics(self, kps, states, ratio):
-        # Distance between shoulder and elbow
-        states[self.metric_names.hip_dist.name] = self.distance(
-            KPS_INDEX_DICT.left_hip.value,
-            KPS_INDEX_DICT.right_hip.value,
-            kps,
-            'xy',
-            ratio
-        )
-        
-        # Distance between left shoulder and wrist
-        states[self.metric_names.lhip_lankle_dist.name] = self.distance(
-            KPS_INDEX_DICT.left_hip.value,
-            KPS_INDEX_DICT.left_ankle.value,
-            kps,
-            'xy',
-            ratio
-        )
-        
-        # Distance between right shoulder and wrist
-        states[self.metric_names.rhip_rankle_dist.name] = self.distance(
-            KPS_INDEX_DICT.right_hip.value,
-            KPS_INDEX_DICT.right_ankle.value,
-            kps,
-            'xy',
-            ratio
-        )
+    def _get_metric_table(self) -> MetricTable:
+        return self.metric_table
         
-        # Angle at the left elbow
-        states[self.metric_names.lknee_angle.name] = self.angle(
-            KPS_INDEX_DICT.left_knee.value,
-            KPS_INDEX_DICT.left_hip.value,
-            KPS_INDEX_DICT.left_ankle.value,
-            kps
-        )
-        
-        # Angle at the right elbow
-        states[self.metric_names.rknee_angle.name] = self.angle(
-            KPS_INDEX_DICT.right_knee.value,
-            KPS_INDEX_DICT.right_hip.value,
-            KPS_INDEX_DICT.right_ankle.value,
-            kps
-        )
-
-    
     def get_metric_names(self):
         return self.metric_names
 
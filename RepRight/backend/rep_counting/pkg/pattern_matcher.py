@@ -0,0 +1,77 @@
+class PatternMatcher:
+    def __init__(self, query_pattern):
+        """
+        Streaming matcher that counts occurrences of a query pattern
+        in a stream of symbols, one symbol at a time.
+
+        The matcher is a KMP automaton, each symbol costs O(1) amortized
+        and no history of the stream is kept. Overlapping occurrences are
+        counted, e.g query [0, 1, 0] is found twice in [0, 1, 0, 1, 0].
+
+        Args:
+            - query_pattern (list): a sequence of symbols to be matched
+        """
+        self.query_pattern = list(query_pattern)
+        if len(self.query_pattern) == 0:
+            raise Exception("query pattern must have at least 1 value")
+
+        # failure table, length of the longest proper prefix
+        # of query_pattern[:i+1] that is also its suffix
+        self.failure = self._build_failure(self.query_pattern)
+
+        # number of symbols of the query pattern matched so far
+        self.state = 0
+
+        # total number of matches found
+        self.count = 0
+
+    @staticmethod
+    def _build_failure(pattern) -> list[int]:
+        """
+        Build KMP failure table for pattern
+
+        Args:
+            - pattern (list): query pattern
+
+        Returns:
+            list: failure table
+        """
+        failure = [0] * len(pattern)
+        k = 0
+        for i in range(1, len(pattern)):
+            while k > 0 and pattern[i] != pattern[k]:
+                k = failure[k - 1]
+            if pattern[i] == pattern[k]:
+                k += 1
+            failure[i] = k
+        return failure
+
+    def update(self, symbol) -> bool:
+        """
+        Feed next symbol of the stream
+
+        Args:
+            - symbol: next symbol
+
+        Returns:
+            bool: True if the symbol completed a match of the query pattern
+        """
+        while self.state > 0 and symbol != self.query_pattern[self.state]:
+            self.state = self.failure[self.state - 1]
+
+        if symbol == self.query_pattern[self.state]:
+            self.state += 1
+
+        if self.state == len(self.query_pattern):
+            self.count += 1
+            # fall back so overlapping matches are found
+            self.state = self.failure[self.state - 1]
+            return True
+        return False
+
+    def reset(self) -> None:
+        """
+        Reset matcher to its initial state
+        """
+        self.state = 0
+        self.count = 0
@@ -1,18 +1,22 @@
 import os
 import sys
 sys.path.insert(0, os.getcwd())
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+from startup_profile import startup_profile
+from kps_cache import KpsCache, DEFAULT_CACHE_DIR
 import traceback 
-import tensorflow as tf
 import argparse
 import json
 import numpy as np
 import cv2
 import time
-import matplotlib
-import matplotlib.pyplot as plt
-matplotlib.use('TkAgg')
-from movenet.movenet_infer import load_model, predict, preprocess_input_image_cv, preprocess_kps, INPUT_SIZE
+import tempfile
+try:
+    import fcntl
+except ImportError:
+    # windows
+    fcntl = None
+    import msvcrt
+from movenet.movenet_infer import load_model, predict, preprocess_input_image_cv, preprocess_kps, get_input_size, get_model_path, MODEL_PATH, MODEL_VARIANTS, DEFAULT_MODEL_VARIANT
 from pkg.kps_metrics_bicep_curl import KpsMetricsBicepCurl
 from pkg.kps_metrics_push_up import KpsMetricsPushup
 from pkg.kps_metrics_squat import KpsMetricsSquat
@@ -21,52 +25,218 @@ from pkg.kps_metrics import KpsMetrics
 WINDOW_FRAME = "Frame"
 # FRAME_DELAY = 1./30.
 DEFAULT_OUTPUT_DIR = "./smart_trainer_config/"
+CONFIG_FILENAME = "config.json"
 
-exercise_metrics:dict[str,KpsMetrics] = {
-    "bicepcurl": KpsMetricsBicepCurl(),
-    "pushup": KpsMetricsPushup(),
-    "squat": KpsMetricsSquat()
+# seconds to wait for another run to finish writing config file,
+# lock is released by the OS when a run exits, so a crashed run never holds it
+CONFIG_LOCK_TIMEOUT = 60.
+
+# new metric is created for every video
+exercise_metrics:dict[str,type[KpsMetrics]] = {
+    "bicepcurl": KpsMetricsBicepCurl,
+    "pushup": KpsMetricsPushup,
+    "squat": KpsMetricsSquat
 }
 
-def main(vid_path, exercise_name, output_directory=DEFAULT_OUTPUT_DIR):
+def plot_tracks(tracks_sum, statistics, exercise_name, plot_path=None):
+    """
+    Plot sum of signals per frame, matplotlib is imported only here
+    so it is not loaded before video is processed
+
+    Args:
+        tracks_sum (NDArray): sum of signals per frame
+        statistics (dict): reference statistics of exercise
+        exercise_name (str): exercise name
+        plot_path (str, optional): save plot to this image file without
+        display. Defaults to None, plot is shown in a window.
+    """
+    import matplotlib
+    matplotlib.use('Agg' if plot_path else 'TkAgg')
+    import matplotlib.pyplot as plt
+
+    plt.figure()
+    plt.plot(list(range(tracks_sum.shape[0])), tracks_sum, label="signals")
+    plt.hlines([tracks_sum.mean(), tracks_sum.mean()], 
+               [0.], 
+               [tracks_sum.shape[0]-1], 
+               colors="black", 
+               linestyles="dashed",
+               label=f"mean {statistics['mean']:.2f}")
+    plt.ylabel(f"sum of signals per frames")
+    plt.xlabel("frames")
+    plt.title(f"{exercise_name} sum of signals")
+    plt.legend()
+    if plot_path:
+        plt.savefig(plot_path)
+        plt.close()
+    else:
+        plt.show()
+
+def merge_config(output_directory, config_updates):
+    """
+    Merge exercise config data into config file. Config is read, updated
+    and written while holding an OS lock on a lock file so concurrent runs
+    don't drop each other's exercises, and written to a temporary file renamed over 
+    config file so readers never see a partly written file.
+
+    Args:
+        output_directory (str): directory of config file
+        config_updates (dict): exercise name and config data pairs
+
+    Raises:
+        Exception: if lock is held by another run for more than CONFIG_LOCK_TIMEOUT
+    """
+    # create directory if not exists
+    if not os.path.isdir(output_directory):
+        os.makedirs(output_directory, exist_ok=True)
+
+    output_filename = os.path.join(output_directory, CONFIG_FILENAME)
+    lock_path = output_filename + ".lock"
+    # lock file is kept, removing it would let a waiter lock the removed file
+    with open(lock_path, "a+") as lock_file:
+        _lock_file(lock_file, CONFIG_LOCK_TIMEOUT)
+        try:
+            _update_config(output_directory, output_filename, config_updates)
+        finally:
+            _unlock_file(lock_file)
+
+def _lock_file(lock_file, timeout):
+    lock_file.seek(0)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise Exception(f"{lock_file.name} is held by another run for more than {timeout} seconds")
+            time.sleep(0.05)
+
+def _unlock_file(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _update_config(output_directory, output_filename, config_updates):
+    config_data = {}
+    if os.path.isfile(output_filename):
+        with open(output_filename, 'r') as f:
+            config_data = json.load(f)
+    config_data.update(config_updates)
+
+    fd, temp_path = tempfile.mkstemp(dir=output_directory, prefix=CONFIG_FILENAME, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(json.dumps(config_data))
+        os.replace(temp_path, output_filename)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+def calibrate(vid_path, exercise_name, model_path=MODEL_PATH, show=True, profile_startup=False, kps_cache:KpsCache=None,
+              session_options=None):
+    """
+    Track exercise metrics of a video and compute reference statistics
+
+    Args:
+        vid_path (str): path to exercise example video
+        exercise_name (str): one of exercise_metrics
+        model_path (str, optional): path to movenet model onnx file
+        show (bool, optional): display video while it is processed. Defaults to True.
+        profile_startup (bool, optional): print startup report. Defaults to False.
+        kps_cache (KpsCache, optional): read keypoints of video from cache instead
+        of running movenet, keypoints are saved to cache on a miss. Video is only
+        decoded to be shown. Defaults to None, no cache.
+        session_options (dict, optional): movenet session options, see load_model.
+        Defaults to None, session profile or default options.
+
+    Raises:
+        Exception: if video doesn't exist or exercise name is unknown
+
+    Returns:
+        - dict: config data of exercise
+        - NDArray: sum of signals per frame
+    """
     if not os.path.exists(vid_path):
         raise Exception(f"{vid_path} doesn't exists")
     if not os.path.isfile(vid_path):
         raise Exception(f"{vid_path} is not a file")
+
+    # get get metrics object for exercise
+    metrics_class = exercise_metrics.get(exercise_name, None)
+    if metrics_class is None:
+        raise Exception(f"Unable to find exercise name {exercise_name}")
+    metrics = metrics_class()
+
+    startup_profile.mark("imports")
+    # load model
+    with startup_profile.step("load model"):
+        model = load_model(model_path, session_options=session_options)
+    input_size = get_input_size(model)
     
-    try:
-        # load model
-        model = load_model()
-        
-        # get get metrics object for exercise
-        metrics = exercise_metrics.get(exercise_name, None)
-        if metrics is None:
-            raise Exception(f"Unable to find exercise name {exercise_name}")
-        
-        # track all metrics
-        tracks = {e.name: [] for e in metrics.get_metric_names()}
-        
-        cv2.namedWindow(WINDOW_FRAME)
-        cv2.moveWindow(WINDOW_FRAME, 30, 40)
+    # track all metrics
+    tracks = {e.name: [] for e in metrics.get_metric_names()}
+    def update_tracks(kps):
+        metrics.update_metrics(kps)
+        exercise_state = metrics.get_metrics()
+        for track_name, track_metrics in tracks.items():
+            track_metrics.append(exercise_state[track_name])
+    
+    # frames are converted to RGB before movenet
+    cached_kps = kps_cache.load(vid_path, model_path, input_size, color="rgb") if kps_cache is not None else None
+    # keypoints of every frame to be cached
+    kps_track = [] if kps_cache is not None and cached_kps is None else None
+    
+    if show:
+        with startup_profile.step("open window"):
+            cv2.namedWindow(WINDOW_FRAME)
+            cv2.moveWindow(WINDOW_FRAME, 30, 40)
 
-        cap = cv2.VideoCapture(str(vid_path))
-            
-        while(cap.isOpened()):
+    # nothing to decode without display
+    if cached_kps is not None and not show:
+        for kps in cached_kps:
+            update_tracks(np.array(kps))
+    
+    with startup_profile.step("open video"):
+        cap = cv2.VideoCapture(str(vid_path)) if cached_kps is None or show else None
+    if profile_startup:
+        startup_profile.print_report()
+        
+    frame_index = 0
+    try:
+        while(cap is not None and cap.isOpened()):
             ret, frame = cap.read()
-            if ret:
+            if ret and cached_kps is not None:
+                if frame_index >= len(cached_kps):
+                    break
+                update_tracks(np.array(cached_kps[frame_index]))
+                frame_index += 1
+                cv2.imshow(WINDOW_FRAME, frame)
+            elif ret:
                 input_img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                input_img = preprocess_input_image_cv(input_img, INPUT_SIZE)
+                input_img = preprocess_input_image_cv(input_img, input_size)
                 kps = predict(input_img, model)
                 kps, _ = preprocess_kps(kps)
-                metrics.update_metrics(kps)
-                exercise_state = metrics.get_metrics()
-                for track_name, track_metrics in tracks.items():
-                    track_metrics.append(exercise_state[track_name])
+                update_tracks(kps)
+                if kps_track is not None:
+                    kps_track.append(kps.copy())
                 
-                cv2.imshow(WINDOW_FRAME, frame)
+                if show:
+                    cv2.imshow(WINDOW_FRAME, frame)
             else:
+                # whole video is processed
+                if kps_track is not None:
+                    kps_cache.save(vid_path, model_path, input_size, kps_track, color="rgb")
                 break
             
+            if not show:
+                continue
+            
             cv2.setWindowTitle(WINDOW_FRAME, f"{exercise_name}")
                 
             # the 'q' button is set as the 
@@ -78,79 +248,78 @@ def main(vid_path, exercise_name, output_directory=DEFAULT_OUTPUT_DIR):
             # detect the window is closed by user
             if cv2.getWindowProperty(WINDOW_FRAME, cv2.WND_PROP_VISIBLE) < 1:
                 break
-            
+    finally:
         # After the loop release the cap object 
-        cap.release() 
+        if cap is not None:
+            cap.release() 
         # Destroy all the windows 
-        cv2.destroyAllWindows()
-        
-        # filter stationary movement wave
-        # and names
-        filter_tracks = []
-        filter_metric_names = []
-        for name, mc in tracks.items():
-            filter_tracks.append(mc)
-            filter_metric_names.append(name)
-            
-            ## This block of code is preserved for further measurement
-            ## The block of code is to filter metrics below certain threshold
-            ## Could be removed in future
-            #
-            # if name.endswith("dist") and np.std(mc)>=0.04:
-            #     filter_tracks.append(mc)
-            #     filter_metric_names.append(name)
-            # if name.endswith("angle") and np.std(mc)>=10.:
-            #     filter_tracks.append(mc)
-            #     filter_metric_names.append(name)
+        if show:
+            cv2.destroyAllWindows()
+    
+    # filter stationary movement wave
+    # and names
+    filter_tracks = []
+    filter_metric_names = []
+    for name, mc in tracks.items():
+        filter_tracks.append(mc)
+        filter_metric_names.append(name)
         
-        # sum up all remaining tracks that are not
-        # stationary
-        tracks_sum = np.sum(filter_tracks, axis=0)
-            
-        # data
-        statistics = {}
-        statistics['mean'] = np.mean(tracks_sum)
-        statistics['std'] = np.std(tracks_sum)
-        statistics['width'] = INPUT_SIZE[1]
-        statistics['height'] = INPUT_SIZE[0]
-        statistic_data = {"motion_names": filter_metric_names,
-                          "reference": statistics}
+        ## This block of code is preserved for further measurement
+        ## The block of code is to filter metrics below certain threshold
+        ## Could be removed in future
+        #
+        # if name.endswith("dist") and np.std(mc)>=0.04:
+        #     filter_tracks.append(mc)
+        #     filter_metric_names.append(name)
+        # if name.endswith("angle") and np.std(mc)>=10.:
+        #     filter_tracks.append(mc)
+        #     filter_metric_names.append(name)
+    
+    # sum up all remaining tracks that are not
+    # stationary
+    tracks_sum = np.sum(filter_tracks, axis=0)
         
-        # create directory if not exists
-        if not os.path.isdir(output_directory):
-            os.makedirs(output_directory)
+    # data
+    statistics = {}
+    statistics['mean'] = float(np.mean(tracks_sum))
+    statistics['std'] = float(np.std(tracks_sum))
+    statistics['width'] = input_size[0]
+    statistics['height'] = input_size[1]
+    statistic_data = {"motion_names": filter_metric_names,
+                      "reference": statistics}
+    return statistic_data, tracks_sum
+
+def calibrate_headless(vid_path, exercise_name, model_path=MODEL_PATH, plot_path=None, kps_cache_dir=None,
+                       session_options=None):
+    """
+    Calibrate without display, used by worker processes of process_exercise
+
+    Returns:
+        tuple: exercise name and config data
+    """
+    kps_cache = KpsCache(kps_cache_dir) if kps_cache_dir else None
+    statistic_data, tracks_sum = calibrate(vid_path, exercise_name, model_path, show=False, kps_cache=kps_cache,
+                                           session_options=session_options)
+    if plot_path:
+        plot_tracks(tracks_sum, statistic_data["reference"], exercise_name, plot_path)
+    return exercise_name, statistic_data
+
+def main(vid_path, exercise_name, output_directory=DEFAULT_OUTPUT_DIR, model_path=MODEL_PATH, profile_startup=False,
+         headless=False, plot_path=None, kps_cache_dir=None):
+    try:
+        kps_cache = KpsCache(kps_cache_dir) if kps_cache_dir else None
+        statistic_data, tracks_sum = calibrate(vid_path, exercise_name, model_path, show=not headless,
+                                               profile_startup=profile_startup, kps_cache=kps_cache)
         
         # save config file
-        output_filename = os.path.join(output_directory, 'config.json')
-        if os.path.isfile(output_filename):
-            with open(output_filename, 'r') as f:
-                config_data = json.load(f)
-                config_data[exercise_name] = statistic_data
-            with open(output_filename, 'w') as f:
-                f.write(json.dumps(config_data))
-        else:    
-            with open(output_filename, "w") as f:
-                config_data = {exercise_name: statistic_data}
-                f.write(json.dumps(config_data))
+        merge_config(output_directory, {exercise_name: statistic_data})
         
-        # plot result
-        plt.plot(list(range(tracks_sum.shape[0])), tracks_sum, label="signals")
-        plt.hlines([tracks_sum.mean(), tracks_sum.mean()], 
-                   [0.], 
-                   [tracks_sum.shape[0]-1], 
-                   colors="black", 
-                   linestyles="dashed",
-                   label=f"mean {statistics['mean']:.2f}")
-        plt.ylabel(f"sum of signals per frames")
-        plt.xlabel("frames")
-        plt.title(f"{exercise_name} sum of signals")
-        plt.legend()
-        plt.show()
+        # plot result, headless runs only save plot to file
+        if plot_path or not headless:
+            plot_tracks(tracks_sum, statistic_data["reference"], exercise_name, plot_path)
         
     except Exception as e:
         print(traceback.format_exc())
-        cap.release()
-        cv2.destroyAllWindows()
         
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(prog="Processing exercise video and output config file",
@@ -160,7 +329,15 @@ if __name__ == "__main__":
     parser.add_argument("--video", help="Path to video file", required=True)
     parser.add_argument("--exercise_name", help="Exercise name to be processed", required=True)
     parser.add_argument("--output_directory", help="Output directory", required=False, default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--model_variant", help="Movenet model variant", choices=list(MODEL_VARIANTS.keys()), default=DEFAULT_MODEL_VARIANT)
+    parser.add_argument("--startup-profile", dest="startup_profile", action="store_true",
+                        help="Print time of imports, model loading and video opening before processing")
+    parser.add_argument("--headless", help="Process without video window and plot window", action="store_true")
+    parser.add_argument("--plot", help="Save plot to this image file instead of showing it", default=None)
+    parser.add_argument("--kps_cache", help=f"Read keypoints from cache directory instead of running movenet, defaults to {DEFAULT_CACHE_DIR} "
+                        "when given without directory", nargs="?", const=DEFAULT_CACHE_DIR, default=None)
     args = parser.parse_args()
     
-    main(args.video, args.exercise_name.lower(), args.output_directory)
+    main(args.video, args.exercise_name.lower(), args.output_directory, get_model_path(args.model_variant),
+         args.startup_profile, args.headless, args.plot, args.kps_cache)
     # main("./gifs/squat.gif","JumpingJack".lower())
\ No newline at end of file
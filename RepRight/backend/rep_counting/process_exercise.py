@@ -1,20 +1,66 @@
+import os
 import argparse
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import process
-from process import DEFAULT_OUTPUT_DIR
+from process import DEFAULT_OUTPUT_DIR, MODEL_PATH, MODEL_VARIANTS, DEFAULT_MODEL_VARIANT, DEFAULT_CACHE_DIR, get_model_path
 
-def main(root_path, file_ext, output_dir):
+def get_examples(root_path, file_ext) -> list[tuple[Path, str]]:
+    """
+    Get first example video of every exercise subdirectory
+
+    Returns:
+        list: example path and exercise name pairs
+    """
     root_dir = Path(root_path)
     if not root_dir.exists():
         raise Exception(f"{root_path} directory doesn't exists")
-    for sub_dir in root_dir.iterdir():
-        path = root_dir / sub_dir.name
-        exercise_name = sub_dir.name
-        examples = list(path.glob(f"*.{file_ext}"))
-        if len(examples) == 0:
-            raise Exception(f"{path} is empty, there must have 1 example")
-        example_path = examples[0]
-        process.main(example_path, exercise_name, output_dir)
+    examples = []
+    for sub_dir in sorted(root_dir.iterdir()):
+        if not sub_dir.is_dir():
+            continue
+        exercise_examples = sorted(sub_dir.glob(f"*.{file_ext}"))
+        if len(exercise_examples) == 0:
+            raise Exception(f"{sub_dir} is empty, there must have 1 example")
+        examples.append((exercise_examples[0], sub_dir.name))
+    return examples
+
+def main(root_path, file_ext, output_dir, model_path=MODEL_PATH, workers=1, headless=False, plot_dir=None,
+         kps_cache_dir=None):
+    examples = get_examples(root_path, file_ext)
+    if plot_dir:
+        os.makedirs(plot_dir, exist_ok=True)
+    if workers <= 1:
+        for example_path, exercise_name in examples:
+            plot_path = os.path.join(plot_dir, f"{exercise_name}.png") if plot_dir else None
+            process.main(example_path, exercise_name, output_dir, model_path, headless=headless, plot_path=plot_path,
+                         kps_cache_dir=kps_cache_dir)
+        return
+
+    # worker processes can't share a window, they always run headless
+    workers = min(workers, len(examples))
+    # workers share cores instead of each using all of them
+    session_options = {"intra_op_num_threads": max(1, (os.cpu_count() or 1) // workers)}
+    # spawn so workers don't inherit threads of this process
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(process.calibrate_headless, str(example_path), exercise_name, model_path,
+                                   os.path.join(plot_dir, f"{exercise_name}.png") if plot_dir else None,
+                                   kps_cache_dir, session_options)
+                   for example_path, exercise_name in examples]
+        config_updates = {}
+        for future, (example_path, exercise_name) in zip(futures, examples):
+            # like sequential path, a failed exercise is reported and the rest are kept
+            try:
+                name, config = future.result()
+                config_updates[name] = config
+            except Exception:
+                print(f"{exercise_name} ({example_path}) failed")
+                print(traceback.format_exc())
+    # one write for all exercises
+    if config_updates:
+        process.merge_config(output_dir, config_updates)
 
 if __name__ == "__main__":
     desc = """
@@ -28,5 +74,13 @@ if __name__ == "__main__":
     parser.add_argument("--dir", help="Path to root directory where it contain exercise examples", required=True)
     parser.add_argument("--file_ext", help="Extension of file to look for e.g mp4, gif", required=True)
     parser.add_argument("--out", help="Output json config file directory", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--model_variant", help="Movenet model variant", choices=list(MODEL_VARIANTS.keys()), default=DEFAULT_MODEL_VARIANT)
+    parser.add_argument("--workers", help="Number of worker processes, more than 1 processes exercises in parallel without display",
+                        type=int, default=1)
+    parser.add_argument("--headless", help="Process without video window and plot window", action="store_true")
+    parser.add_argument("--plot_dir", help="Save plot of every exercise to <exercise_name>.png in this directory", default=None)
+    parser.add_argument("--kps_cache", help=f"Read keypoints from cache directory instead of running movenet, defaults to {DEFAULT_CACHE_DIR} "
+                        "when given without directory", nargs="?", const=DEFAULT_CACHE_DIR, default=None)
     args = parser.parse_args()
-    main(args.dir, args.file_ext, args.out)
\ No newline at end of file
+    main(args.dir, args.file_ext, args.out, get_model_path(args.model_variant), args.workers, args.headless, args.plot_dir,
+         args.kps_cache)
\ No newline at end of file
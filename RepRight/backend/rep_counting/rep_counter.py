@@ -1,5 +1,15 @@
 import cv2
-from .movenet.movenet_infer import load_model, predict, preprocess_input_image_cv, preprocess_kps, INPUT_SIZE, MODEL_PATH
+import time
+import warnings
+import numpy as np
+from .movenet.movenet_infer import predict_batch, supports_batch, preprocess_input_image_cv, preprocess_kps, get_input_size, MODEL_PATH
+from .movenet.session_registry import session_registry
+from .movenet.movenet_crop import CropTracker, crop_and_resize, map_kps_to_frame
+from .movenet.movenet_binding import MovenetBinding
+from .video_reader import VideoReader
+from .motion_scheduler import MotionScheduler, interpolate_kps
+from .stage_metrics import stage_metrics, LOW_CONFIDENCE_RATE
+from .kps_cache import KpsCache
 from .pkg.kps_metrics_bicep_curl import KpsMetricsBicepCurl
 from .pkg.kps_metrics_push_up import KpsMetricsPushup
 from .pkg.kps_metrics_squat import KpsMetricsSquat
@@ -7,7 +17,8 @@ from .pkg.kps_metrics import KpsMetrics
 from .pkg.kps_constant import KPS_SKELETON_DRAW_DATA
 
 class RepetitionCounter:
-    def __init__(self, config_path, model_path=MODEL_PATH) -> None:
+    def __init__(self, config_path, model_path=MODEL_PATH, model=None, session_options=None,
+                 scheduler:MotionScheduler=None, crop_tracker:CropTracker=None) -> None:
         """
         RepetitionCounter is a class that can handle multiple supported
         exercises. Each exercise has its own metric which is inherite from
@@ -15,26 +26,62 @@ class RepetitionCounter:
 
         Args:
             config_path (str): path to exerise config json file 
-            model_path (str): path movenet model tflite file
+            model_path (str): path movenet model onnx file, any model variant
+            from MODEL_VARIANTS, images are resized to input size of the model
+            model (InferenceSession, optional): already loaded movenet model
+            to be shared with other counters, model_path is not loaded if given
+            and keypoint cache of process_video is not used
+            session_options (dict, optional): movenet session options, see load_model
+            scheduler (MotionScheduler, optional): skip movenet on frames with little 
+            motion, keypoints of skipped frames are interpolated. Defaults to None,
+            movenet runs on every frame.
+            crop_tracker (CropTracker, optional): run movenet on a crop around the
+            person found in last frame instead of whole frame. Defaults to None.
         """
         self.model_path = model_path
         self.config_path = config_path
         self.current_metric_name = None
         
-        self.model = self._load_model(model_path=self.model_path)
+        # model from session registry is released on close
+        self.shared_model = model is None
+        # path keypoint cache is keyed by, only known when model is loaded here
+        self.kps_cache_model_path = model_path if model is None else None
+        self.model = model if model is not None else self._load_model(self.model_path, session_options)
+        self.input_size = get_input_size(self.model)
+        # preallocated movenet input and output of this counter
+        self.binding = MovenetBinding(self.model, self.input_size)
         self.exercise_metrics = self._load_exercise_metrics(self.config_path)
+        self._check_reference_size()
+        
+        # last inferred keypoints and number of frames 
+        # skipped by scheduler since then
+        self.scheduler = scheduler
+        self.crop_tracker = crop_tracker
+        self.last_kps = None
+        self.skipped_frames = 0
     
-    def _load_model(self, model_path):
+    def _load_model(self, model_path, session_options=None):
         """
-        Load movenet model
+        Get movenet model shared by all counters 
+        with the same model and session options
 
         Args:
-            model_path (str): path to model tflite file
+            model_path (str): path to model onnx file
+            session_options (dict, optional): movenet session options
 
         Returns:
-            tuple: (model, input_detail, output_detail) 
+            ONNX model
+        """
+        return session_registry.acquire(model_path, session_options=session_options)
+    
+    def close(self):
+        """
+        Release shared movenet model, counter can't be used after close
         """
-        return load_model(model_path=model_path)
+        if self.shared_model and self.model is not None:
+            session_registry.release(self.model)
+        self.model = None
+        self.binding = None
     
     def _load_exercise_metrics(self, config_path) -> {str, KpsMetrics}:
         """
@@ -50,6 +97,18 @@ class RepetitionCounter:
             "squats": KpsMetricsSquat(config_path=config_path)
         }
     
+    def _check_reference_size(self):
+        """
+        Warn if exercise config was made with a model of 
+        different input size than the current model
+        """
+        for exercise_name, metric in self.exercise_metrics.items():
+            reference = (metric.config or {}).get('reference', {})
+            reference_size = (reference.get('width', self.input_size[0]), reference.get('height', self.input_size[1]))
+            if tuple(reference_size) != tuple(self.input_size):
+                warnings.warn(f"{exercise_name} config was made with input size {reference_size} "
+                              f"but model input size is {self.input_size}, run process.py with this model")
+    
     def set_metric(self, exercise_name):
         """
         Set current exercise metric
@@ -63,6 +122,9 @@ class RepetitionCounter:
         list_metric_names = list(self.exercise_metrics.keys())
         if not exercise_name in list_metric_names:
             raise Exception(f"{exercise_name} is not one of {list_metric_names}")
+        # skipped frames belong to previous exercise
+        if self.current_metric_name is not None and self.current_metric_name != exercise_name:
+            self._update_skipped_frames(self.exercise_metrics[self.current_metric_name])
         self.current_metric_name = exercise_name
     
     def get_metric(self, exercise_name) -> KpsMetrics:
@@ -88,10 +150,70 @@ class RepetitionCounter:
         Reset all exercise metrics
         """
         self.exercise_metrics = self._load_exercise_metrics(self.config_path)
+        self.last_kps = None
+        self.skipped_frames = 0
+        if self.scheduler is not None:
+            self.scheduler.reset()
+        if self.crop_tracker is not None:
+            self.crop_tracker.reset()
+    
+    def _preprocess_frame(self, cv_frame, crop_tracker:CropTracker=None):
+        """
+        Resize frame or crop around person to model input
+
+        Args:
+            cv_frame (NDArray): frame from opencv or numpy array
+            crop_tracker (CropTracker, optional): crop tracker. Defaults to None, whole frame.
+
+        Returns:
+            - NDArray: model input with shape (1, height, width, color)
+            - tuple: crop region, None for whole frame
+        """
+        crop_region = crop_tracker.crop_region if crop_tracker is not None else None
+        if crop_region is None:
+            return preprocess_input_image_cv(cv_frame, self.input_size), None
+        return crop_and_resize(cv_frame, crop_region, self.input_size), crop_region
+    
+    def _postprocess_kps(self, kps_norm, frame_size, crop_region=None, crop_tracker:CropTracker=None):
+        """
+        Map xy keypoints to whole frame in place
+        and update crop region of next frame
+
+        Args:
+            kps_norm (NDArray): (17, 3) keypoints in xy coordinate normalized to model input
+            frame_size (tuple): (width, height) of frame
+            crop_region (tuple, optional): crop region of model input. Defaults to None.
+            crop_tracker (CropTracker, optional): crop tracker. Defaults to None.
+
+        Returns:
+            NDArray: keypoints in xy coordinate normalized to whole frame
+        """
+        if crop_region is not None:
+            map_kps_to_frame(kps_norm, crop_region, frame_size[0], frame_size[1])
+        if crop_tracker is not None:
+            crop_tracker.update(kps_norm, frame_size[0], frame_size[1])
+        return kps_norm
+    
+    def _update_skipped_frames(self, metric:KpsMetrics, kps_end=None):
+        """
+        Update metric with keypoints of frames skipped by scheduler
+
+        Args:
+            metric (KpsMetrics): metric to update
+            kps_end (NDArray, optional): keypoints of newly inferred frame, skipped 
+            frames are interpolated up to it. Defaults to None, last keypoints are kept.
+        """
+        if self.skipped_frames > 0 and self.last_kps is not None:
+            if kps_end is None:
+                kps_end = self.last_kps
+            for kps in interpolate_kps(self.last_kps, kps_end, self.skipped_frames):
+                metric.update_metrics(kps, confidence_rate=float(np.mean(kps[:, 2])))
+        self.skipped_frames = 0
         
     def update_metric(self, cv_frame):
         """
-        Update repetion counter metric
+        Update repetion counter metric. With scheduler movenet may be
+        skipped, then metric is updated once next frame is inferred.
 
         Args:
             cv_frame (NDArray): frame from opencv or numpy array
@@ -100,17 +222,218 @@ class RepetitionCounter:
             Exception: if there is no current metric selected
 
         Returns:
-            NDArray: keypoints from movnet in xy coordinate and is normlized 
+            NDArray: keypoints from movnet in xy coordinate and is normlized,
+            it is overwritten by next update_metric call, copy it to keep it
         """
         if self.current_metric_name is None:
             raise Exception("call set_metric method at least once to set current metric name")
         
-        input_img = preprocess_input_image_cv(cv_frame, INPUT_SIZE)
-        kps_norm = predict(input_img, self.model)
-        kps_norm, conf_rate = preprocess_kps(kps_norm)
+        frame_start = stage_metrics.clock()
+        stage_metrics.inc("frames")
+        if self.scheduler is not None and not self.scheduler.should_infer(cv_frame) and self.last_kps is not None:
+            self.skipped_frames += 1
+            stage_metrics.inc("skipped_frames")
+            stage_metrics.observe("frame", frame_start)
+            return self.last_kps.copy()
+        
+        kps_norm, conf_rate = self.estimate_kps(cv_frame)
+        if conf_rate < LOW_CONFIDENCE_RATE:
+            stage_metrics.inc("low_confidence_frames")
+        start = stage_metrics.clock()
         metric:KpsMetrics = self.exercise_metrics[self.current_metric_name]
+        self._update_skipped_frames(metric, kps_norm)
         metric.update_metrics(kps_norm, confidence_rate=conf_rate)
+        stage_metrics.observe("metric", start)
+        stage_metrics.observe("frame", frame_start)
         return kps_norm 
+    
+    def estimate_kps(self, cv_frame):
+        """
+        Run movenet on frame without updating any metric, so keypoints 
+        can be used before exercise is known, e.g. by exercise classifier.
+        Crop tracker and last keypoints are updated as in update_metric.
+
+        Args:
+            cv_frame (NDArray): frame from opencv or numpy array
+
+        Returns:
+            - NDArray: keypoints from movnet in xy coordinate and is normlized,
+            it is overwritten by next movenet run, copy it to keep it
+            - Average confidence rate: float from 0.0 ~ 1.0
+        """
+        start = time.perf_counter()
+        crop_region = self.crop_tracker.crop_region if self.crop_tracker is not None else None
+        kps_norm, conf_rate = self.binding.run(cv_frame, crop_region)
+        if self.scheduler is not None:
+            self.scheduler.record_inference(time.perf_counter() - start)
+        postprocess_start = stage_metrics.clock()
+        frame_size = (cv_frame.shape[1], cv_frame.shape[0])
+        self._postprocess_kps(kps_norm, frame_size, crop_region, self.crop_tracker)
+        stage_metrics.observe("postprocess", postprocess_start)
+        
+        # keypoints are in binding output buffer
+        if self.last_kps is None:
+            self.last_kps = np.empty_like(kps_norm)
+        np.copyto(self.last_kps, kps_norm)
+        return kps_norm, conf_rate
+    
+    def process_video(self, video_path, exercise_name=None, batch_size=8, queue_size=64,
+                      scheduler:MotionScheduler=None, crop_tracker:CropTracker=None, kps_cache:KpsCache=None) -> dict:
+        """
+        Count repetition on a whole video without display. Frames are 
+        decoded on a background thread and fed to movenet in batches.
+        A new metric is used so current metrics are not changed.
+        
+        Batches only run in one movenet call when the model input has a dynamic
+        batch dimension, see supports_batch. The movenet onnx models in 
+        MODEL_VARIANTS have a fixed batch of 1, with them frames of a batch are
+        inferred one by one and only decoding overlaps with inference.
+
+        Args:
+            video_path (str): path to video file readable by OpenCV
+            exercise_name (str, optional): exercise name, Defaults to None. 
+            If None current metric name is used.
+            batch_size (int, optional): number of frames per movenet run,
+            only used if model supports batch, a warning is given otherwise. 
+            Defaults to 8.
+            queue_size (int, optional): maximum number of decoded frames 
+            waiting for inference. Defaults to 64.
+            scheduler (MotionScheduler, optional): skip movenet on frames with little 
+            motion, keypoints of skipped frames are interpolated between inferred 
+            frames. Defaults to None, movenet runs on every frame.
+            crop_tracker (CropTracker, optional): run movenet on a crop around the
+            person found in last frame. Crop depends on last result so frames are 
+            inferred one by one. Defaults to None, whole frame is used.
+            kps_cache (KpsCache, optional): read keypoints of video from cache instead
+            of decoding and running movenet, keypoints are saved to cache on a miss. 
+            Only used without scheduler and crop tracker, they change keypoints,
+            and when model is loaded from model_path, an injected model may not
+            match it. Defaults to None, no cache.
+
+        Raises:
+            Exception: if exercise name dose not exists or there is no 
+            current metric selected
+
+        Returns:
+            dict: 
+            - exercise_name (str): exercise name
+            - reptition_count (int): final repetition count
+            - keypoints (NDArray): (T, 17, 3) normalized keypoints in xy 
+            coordinate and confidence score per frame
+            - confidence_rates (NDArray): (T,) average confidence rate per frame
+            - metrics (dict): metric name and (T,) array of metric per frame
+            - reptition_counts (NDArray): (T,) repetition count per frame
+            - inferred_count (int): number of frames movenet ran on, 0 if
+            keypoints are read from cache
+        """
+        if exercise_name is None:
+            exercise_name = self.current_metric_name
+        if exercise_name is None:
+            raise Exception("call set_metric method at least once or give exercise_name")
+        
+        metric = type(self.get_metric(exercise_name))(config_path=self.config_path)
+        
+        keypoints = []
+        confidence_rates = []
+        reptition_counts = []
+        # metrics per frame in order of metric table names
+        tracks = []
+        
+        def update(kps_norm, conf_rate):
+            metric.update_metrics(kps_norm, confidence_rate=conf_rate)
+            tracks.append(metric.get_metric_values())
+            keypoints.append(kps_norm)
+            confidence_rates.append(conf_rate)
+            reptition_counts.append(metric.get_reptition_count())
+        
+        def update_skipped(count, kps_end):
+            # interpolate frames skipped by scheduler
+            if count > 0 and len(keypoints) > 0:
+                for kps in interpolate_kps(keypoints[-1], kps_end, count):
+                    update(kps, float(np.mean(kps[:, 2])))
+        
+        def run_batch(batch, skipped, crop_regions, frame_size):
+            start = time.perf_counter()
+            kps_batch = predict_batch(np.concatenate(batch, axis=0), self.model)
+            if scheduler is not None:
+                scheduler.record_inference((time.perf_counter() - start) / len(batch))
+            for kps, count, crop_region in zip(kps_batch, skipped, crop_regions):
+                kps_norm, conf_rate = preprocess_kps(kps)
+                self._postprocess_kps(kps_norm, frame_size, crop_region, crop_tracker)
+                update_skipped(count, kps_norm)
+                update(kps_norm, conf_rate)
+        
+        if scheduler is not None or crop_tracker is not None:
+            kps_cache = None
+        if kps_cache is not None and self.kps_cache_model_path is None:
+            warnings.warn("keypoint cache is not used, model was given instead of loaded from model_path")
+            kps_cache = None
+        if kps_cache is not None:
+            cached_kps = kps_cache.load(video_path, self.kps_cache_model_path, self.input_size)
+            if cached_kps is not None:
+                for kps in cached_kps:
+                    kps_norm = np.array(kps)
+                    update(kps_norm, float(np.mean(kps_norm[:, 2])))
+                return self._get_video_result(exercise_name, metric, keypoints, confidence_rates,
+                                              tracks, reptition_counts, 0)
+        
+        # crop of a frame depends on result of frame before
+        if crop_tracker is not None:
+            batch_size = 1
+        if batch_size > 1 and not supports_batch(self.model):
+            warnings.warn(f"{self.model_path} has a fixed batch size of 1, frames are inferred one by one "
+                          f"instead of in batches of {batch_size}, export the model with a dynamic batch dimension to batch")
+            batch_size = 1
+        
+        batch = []
+        # number of frames skipped before each frame in batch
+        skipped = []
+        crop_regions = []
+        skipped_count = 0
+        inferred_count = 0
+        frame_size = None
+        for frame in VideoReader(video_path, queue_size=queue_size):
+            frame_size = (frame.shape[1], frame.shape[0])
+            if scheduler is not None and not scheduler.should_infer(frame):
+                skipped_count += 1
+                continue
+            input_img, crop_region = self._preprocess_frame(frame, crop_tracker)
+            batch.append(input_img)
+            crop_regions.append(crop_region)
+            skipped.append(skipped_count)
+            skipped_count = 0
+            inferred_count += 1
+            if len(batch) >= max(batch_size, 1):
+                run_batch(batch, skipped, crop_regions, frame_size)
+                batch, skipped, crop_regions = [], [], []
+        if len(batch) > 0:
+            run_batch(batch, skipped, crop_regions, frame_size)
+        # frames skipped at end keep last keypoints
+        if len(keypoints) > 0:
+            update_skipped(skipped_count, keypoints[-1])
+        
+        result = self._get_video_result(exercise_name, metric, keypoints, confidence_rates,
+                                        tracks, reptition_counts, inferred_count)
+        if kps_cache is not None:
+            kps_cache.save(video_path, self.kps_cache_model_path, self.input_size, result["keypoints"])
+        return result
+    
+    def _get_video_result(self, exercise_name, metric:KpsMetrics, keypoints, confidence_rates,
+                          tracks, reptition_counts, inferred_count) -> dict:
+        """
+        Pack per frame results of process_video into arrays
+        """
+        metric_names = metric.get_metric_table_names()
+        tracks = np.array(tracks).reshape(-1, len(metric_names))
+        return {
+            "exercise_name": exercise_name,
+            "reptition_count": metric.get_reptition_count(),
+            "keypoints": np.array(keypoints, dtype=np.float32).reshape(-1, 17, 3),
+            "confidence_rates": np.array(confidence_rates, dtype=np.float32),
+            "metrics": {name: tracks[:, i] for i, name in enumerate(metric_names)},
+            "reptition_counts": np.array(reptition_counts, dtype=np.int32),
+            "inferred_count": inferred_count
+        }
         
     def draw_kps_skeleton(self, cv_frame, kps_norm, thickness:int=1):
         """
@@ -124,6 +447,7 @@ class RepetitionCounter:
         Returns:
             _type_: _description_
         """
+        start = stage_metrics.clock()
         height, width, _ = cv_frame.shape
         
         # will be used to scale kps to frame size
@@ -140,4 +464,5 @@ class RepetitionCounter:
             # draw on frame
             cv_frame = cv2.line(cv_frame, line_points[0], line_points[1], color, thickness)
 
+        stage_metrics.observe("draw", start)
         return cv_frame
\ No newline at end of file
@@ -0,0 +1,148 @@
+import os
+import time
+import bisect
+import threading
+
+# upper bounds in seconds of latency histogram buckets
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.)
+
+# stages of one frame, see RepetitionCounter.update_metric
+STAGES = ["decode", "resize", "inference", "postprocess", "metric", "draw", "frame"]
+
+# frames with lower average confidence rate are counted as low confidence,
+# same as default confidence_rate_threshold of KpsMetrics.update_metrics
+LOW_CONFIDENCE_RATE = 0.5
+
+METRIC_PREFIX = "repright"
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS) -> None:
+        """
+        Cumulative histogram in Prometheus format, not thread safe,
+        StageMetrics holds a lock around it
+
+        Args:
+            buckets (tuple, optional): sorted upper bounds of buckets
+        """
+        self.buckets = tuple(buckets)
+        # last count is for values above largest bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class StageMetrics:
+    def __init__(self, enabled=True, buckets=DEFAULT_LATENCY_BUCKETS) -> None:
+        """
+        Latency histogram per frame stage and event counters of this
+        process, rendered in Prometheus text format. When disabled clock
+        and observe return at once so timers in hot paths cost a function
+        call and nothing is recorded.
+
+        Args:
+            enabled (bool, optional): record timings and counters. Defaults to True.
+            buckets (tuple, optional): latency histogram buckets in seconds.
+        """
+        self.enabled = enabled
+        self.histograms = {stage: Histogram(buckets) for stage in STAGES}
+        # counter name with labels and value
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def clock(self) -> float:
+        """
+        Start time of a stage
+
+        Returns:
+            float: current time, 0 when disabled
+        """
+        return time.perf_counter() if self.enabled else 0.
+
+    def observe(self, stage, start) -> float:
+        """
+        Record time of a stage since start, from clock or end of last stage
+
+        Args:
+            stage (str): one of STAGES
+            start (float): start time from clock
+
+        Returns:
+            float: current time, start of next stage, 0 when disabled
+        """
+        if not self.enabled:
+            return 0.
+        now = time.perf_counter()
+        with self.lock:
+            self.histograms[stage].observe(now - start)
+        return now
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increase counter
+
+        Args:
+            name (str): counter name without prefix and _total suffix e.g frames
+            value (int, optional): increment. Defaults to 1.
+            labels: label name and value pairs of counter
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def reset(self):
+        """
+        Drop all recorded timings and counters
+        """
+        with self.lock:
+            self.histograms = {stage: Histogram(histogram.buckets) for stage, histogram in self.histograms.items()}
+            self.counters = {}
+
+    def render(self, gauges=None) -> str:
+        """
+        Render metrics in Prometheus text exposition format
+
+        Args:
+            gauges (dict, optional): gauge name without prefix and current
+            value pairs of values kept elsewhere e.g open sessions
+
+        Returns:
+            str: metrics text
+        """
+        with self.lock:
+            histograms = {stage: (list(h.counts), h.sum, h.count, h.buckets) for stage, h in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines = [f"# HELP {METRIC_PREFIX}_stage_latency_seconds Time of each stage of a frame",
+                 f"# TYPE {METRIC_PREFIX}_stage_latency_seconds histogram"]
+        for stage, (counts, total, count, buckets) in histograms.items():
+            cumulative = 0
+            for bucket, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{METRIC_PREFIX}_stage_latency_seconds_bucket{{stage="{stage}",le="{bucket}"}} {cumulative}')
+            lines.append(f'{METRIC_PREFIX}_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{METRIC_PREFIX}_stage_latency_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{METRIC_PREFIX}_stage_latency_seconds_count{{stage="{stage}"}} {count}')
+
+        names = sorted({name for name, _ in counters.keys()})
+        for name in names:
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name != name:
+                    continue
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{METRIC_PREFIX}_{name}_total{{{label_text}}} {value}" if label_text
+                             else f"{METRIC_PREFIX}_{name}_total {value}")
+
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            lines.append(f"{METRIC_PREFIX}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+# metrics of this process, STAGE_METRICS=0 switches them off
+stage_metrics = StageMetrics(enabled=os.getenv("STAGE_METRICS", "1") != "0")
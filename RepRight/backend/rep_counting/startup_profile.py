@@ -0,0 +1,65 @@
+import sys
+import json
+import time
+from contextlib import contextmanager
+
+# dependencies worth knowing about when they are loaded at startup
+HEAVY_MODULES = ["numpy", "cv2", "onnxruntime", "mediapipe", "tensorflow", "sklearn", "pandas", "matplotlib", "h5py"]
+
+class StartupProfile:
+    def __init__(self) -> None:
+        """
+        Time startup of an entry point step by step. Created when the entry
+        point starts importing, so first mark is the time of its imports.
+        """
+        self.start = time.perf_counter()
+        self.last = self.start
+        # step name and seconds in order
+        self.steps = {}
+
+    def mark(self, name):
+        """
+        Record time since last mark as a step
+
+        Args:
+            name (str): step name
+        """
+        now = time.perf_counter()
+        self.steps[name] = self.steps.get(name, 0.) + now - self.last
+        self.last = now
+
+    @contextmanager
+    def step(self, name):
+        """
+        Record time of a block as a step, time since last mark
+        that is not part of any step is recorded as other
+        """
+        if time.perf_counter() - self.last > 1e-3:
+            self.mark("other")
+        self.last = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.mark(name)
+
+    def get_report(self) -> dict:
+        """
+        Get startup report
+
+        Returns:
+            dict: step name and ms pairs in steps, total_ms and heavy
+            modules loaded so far in loaded_modules
+        """
+        return {
+            "steps": {name: seconds * 1000. for name, seconds in self.steps.items()},
+            "total_ms": (self.last - self.start) * 1000.,
+            "loaded_modules": [name for name in HEAVY_MODULES if name in sys.modules]
+        }
+
+    def print_report(self):
+        """
+        Print startup report as json
+        """
+        print(json.dumps(self.get_report(), indent=2))
+
+startup_profile = StartupProfile()
@@ -0,0 +1,97 @@
+import os
+import queue
+import threading
+import cv2
+
+# sentinel put on frame queue when decoding is done
+_END_OF_VIDEO = None
+
+class VideoReader:
+    def __init__(self, video_path, queue_size=64) -> None:
+        """
+        Decode video frames on a background thread. Frames are
+        read in order by iterating over the reader.
+
+        Args:
+            video_path (str): path to video file readable by OpenCV
+            queue_size (int, optional): maximum number of decoded frames
+            waiting to be consumed. Defaults to 64.
+        """
+        video_path = str(video_path)
+        if not os.path.exists(video_path):
+            raise Exception(f"{video_path} doesn't exists")
+        if not os.path.isfile(video_path):
+            raise Exception(f"{video_path} is not a file")
+
+        self.video_path = video_path
+        self.frames = queue.Queue(maxsize=max(queue_size, 1))
+        self.stop_event = threading.Event()
+        self.error = None
+        self.thread = None
+
+        cap = cv2.VideoCapture(self.video_path)
+        if not cap.isOpened():
+            raise Exception(f"Unable to open video {self.video_path}")
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.cap = cap
+
+    def _decode(self):
+        """
+        Decode all frames into frame queue, run on background thread
+        """
+        try:
+            while not self.stop_event.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                self._put(frame)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.cap.release()
+            self._put(_END_OF_VIDEO)
+
+    def _put(self, item):
+        """
+        Put item on frame queue, give up when reader is closed
+        """
+        while not self.stop_event.is_set():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self):
+        if self.thread is not None:
+            raise Exception("VideoReader can only be iterated once")
+        self.thread = threading.Thread(target=self._decode, daemon=True)
+        self.thread.start()
+        try:
+            while True:
+                frame = self.frames.get()
+                if frame is _END_OF_VIDEO:
+                    break
+                yield frame
+        finally:
+            self.close()
+
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """
+        Stop decoding and wait for background thread
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        else:
+            self.cap.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,339 @@
+import os
+import time
+import uuid
+import threading
+import cv2
+import numpy as np
+from rep_counting.stage_metrics import stage_metrics
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rep_counting", "smart_trainer_config", "config.json")
+
+# seconds without frames before a session is evicted
+DEFAULT_IDLE_TIMEOUT = 120.
+
+# maximum number of sessions open at the same time
+DEFAULT_MAX_SESSIONS = 32
+
+# maximum size of one encoded frame in bytes
+DEFAULT_MAX_FRAME_BYTES = 2 * 1024 * 1024
+
+# size of big endian frame length before every frame of a frame stream
+FRAME_LENGTH_BYTES = 4
+
+# placeholder holding a slot of a session whose counter is being created
+_OPENING = None
+
+class SessionNotFound(Exception):
+    pass
+
+class CounterSession:
+    def __init__(self, session_id, exercise_name, rep_counter):
+        """
+        State of one streaming session
+
+        Args:
+            session_id (str): session id
+            exercise_name (str): exercise name of repetition counter
+            rep_counter (RepetitionCounter): repetition counter of this session
+        """
+        self.session_id = session_id
+        self.exercise_name = exercise_name
+        self.rep_counter = rep_counter
+        self.frame_count = 0
+        self.last_active = time.monotonic()
+        # frames of one session are processed in order
+        self.lock = threading.Lock()
+
+    def get_reptition_count(self) -> int:
+        return self.rep_counter.get_metric(self.exercise_name).get_reptition_count()
+
+class SessionManager:
+    def __init__(self, config_path=DEFAULT_CONFIG_PATH, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 max_sessions=DEFAULT_MAX_SESSIONS, max_frame_bytes=DEFAULT_MAX_FRAME_BYTES,
+                 scheduler_options=None, crop=False):
+        """
+        Keep one repetition counter state per streaming session. All
+        sessions share one movenet model from the session registry. 
+        Idle sessions are evicted when a session is opened, on pushed
+        frames at most every eviction_interval seconds, and by the reaper
+        thread so abandoned sessions are released without any traffic.
+
+        Args:
+            config_path (str, optional): path to exercise config json file
+            idle_timeout (float, optional): seconds without frames before a session is evicted
+            max_sessions (int, optional): maximum number of open sessions
+            max_frame_bytes (int, optional): maximum size of one encoded frame
+            scheduler_options (dict, optional): MotionScheduler options, each session 
+            gets its own scheduler skipping movenet on frames with little motion.
+            Defaults to None, movenet runs on every frame.
+            crop (bool, optional): run movenet on crop around person found in 
+            last frame of session. Defaults to False.
+        """
+        self.config_path = config_path
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.max_frame_bytes = max_frame_bytes
+        self.scheduler_options = scheduler_options
+        self.crop = crop
+        # session id and session, _OPENING while counter is created
+        self.sessions = {}
+        self.lock = threading.Lock()
+        # idle sessions are looked for at most this often on pushed frames
+        self.eviction_interval = max(idle_timeout / 4., 1.)
+        self.last_eviction = time.monotonic()
+        self.reaper = None
+        self.reaper_stop = threading.Event()
+
+    def evict_idle(self) -> int:
+        """
+        Remove sessions without frames for more than idle_timeout seconds
+
+        Returns:
+            int: number of evicted sessions
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.last_eviction = now
+            idle_ids = [session_id for session_id, session in self.sessions.items()
+                        if session is not _OPENING and now - session.last_active > self.idle_timeout]
+            idle_sessions = [self.sessions.pop(session_id) for session_id in idle_ids]
+        for session in idle_sessions:
+            with session.lock:
+                session.rep_counter.close()
+        if idle_sessions:
+            stage_metrics.inc("sessions", len(idle_sessions), event="evicted")
+        return len(idle_sessions)
+
+    def _evict_idle_if_due(self):
+        """
+        Evict idle sessions if last eviction was more than eviction_interval ago
+        """
+        with self.lock:
+            due = time.monotonic() - self.last_eviction > self.eviction_interval
+        if due:
+            self.evict_idle()
+
+    def start_reaper(self, interval=None):
+        """
+        Evict idle sessions on a background thread, calling it again does nothing
+
+        Args:
+            interval (float, optional): seconds between evictions. Defaults to eviction_interval.
+        """
+        with self.lock:
+            if self.reaper is not None:
+                return
+            interval = interval or self.eviction_interval
+            self.reaper_stop.clear()
+            self.reaper = threading.Thread(target=self._reap, args=(interval,), name="session-reaper", daemon=True)
+            self.reaper.start()
+
+    def _reap(self, interval):
+        """
+        Evict idle sessions every interval seconds, run on reaper thread
+        """
+        while not self.reaper_stop.wait(interval):
+            self.evict_idle()
+
+    def stop_reaper(self):
+        """
+        Stop reaper thread
+        """
+        with self.lock:
+            reaper, self.reaper = self.reaper, None
+        if reaper is not None:
+            self.reaper_stop.set()
+            reaper.join()
+
+    def open_session(self, exercise_name, latency_budget_ms=None) -> str:
+        """
+        Open a new session
+
+        Args:
+            exercise_name (str): exercise name e.g bicep_curls, push_ups, squats
+            latency_budget_ms (float, optional): average movenet time per frame allowed 
+            for this session, movenet is skipped on frames with little motion and 
+            frames are thinned out to stay in budget. Defaults to None.
+
+        Raises:
+            Exception: if there are too many open sessions or exercise name dose not exists
+
+        Returns:
+            str: session id
+        """
+        from rep_counting.rep_counter import RepetitionCounter
+        from rep_counting.motion_scheduler import MotionScheduler
+        from rep_counting.movenet.movenet_crop import CropTracker
+
+        self.evict_idle()
+        # slot is reserved before counter is created, so 
+        # concurrent opens can't exceed max_sessions
+        session_id = uuid.uuid4().hex
+        with self.lock:
+            if len(self.sessions) >= self.max_sessions:
+                raise Exception(f"too many open sessions, maximum is {self.max_sessions}")
+            self.sessions[session_id] = _OPENING
+
+        try:
+            scheduler = None
+            if self.scheduler_options is not None or latency_budget_ms is not None:
+                scheduler_options = dict(self.scheduler_options or {})
+                if latency_budget_ms is not None:
+                    scheduler_options["latency_budget_ms"] = latency_budget_ms
+                scheduler = MotionScheduler(**scheduler_options)
+            
+            rep_counter = RepetitionCounter(config_path=self.config_path, scheduler=scheduler,
+                                            crop_tracker=CropTracker() if self.crop else None)
+            try:
+                rep_counter.set_metric(exercise_name)
+            except Exception:
+                rep_counter.close()
+                raise
+        except BaseException:
+            with self.lock:
+                self.sessions.pop(session_id, None)
+            raise
+
+        with self.lock:
+            self.sessions[session_id] = CounterSession(session_id, exercise_name, rep_counter)
+        stage_metrics.inc("sessions", event="opened")
+        return session_id
+
+    def get_session(self, session_id) -> CounterSession:
+        """
+        Get open session
+
+        Raises:
+            SessionNotFound: if session is not open or was evicted
+        """
+        with self.lock:
+            session = self.sessions.get(session_id, _OPENING)
+        if session is _OPENING:
+            raise SessionNotFound(f"session {session_id} was not found")
+        return session
+
+    def push_frame(self, session_id, encoded_frame:bytes) -> dict:
+        """
+        Update repetition counter of session with one encoded frame
+
+        Args:
+            session_id (str): session id
+            encoded_frame (bytes): frame encoded as JPEG or any format readable by OpenCV
+
+        Raises:
+            SessionNotFound: if session is not open or was evicted
+            Exception: if frame is too large or can't be decoded
+
+        Returns:
+            dict: frame index, repetition count, keypoints and confidence rate
+        """
+        self._evict_idle_if_due()
+        session = self.get_session(session_id)
+
+        if len(encoded_frame) > self.max_frame_bytes:
+            raise Exception(f"frame is larger than {self.max_frame_bytes} bytes")
+        start = stage_metrics.clock()
+        frame = cv2.imdecode(np.frombuffer(encoded_frame, dtype=np.uint8), cv2.IMREAD_COLOR)
+        stage_metrics.observe("decode", start)
+        if frame is None:
+            raise Exception("unable to decode frame")
+
+        with session.lock:
+            # session was closed or evicted while decoding
+            if session.rep_counter.model is None:
+                raise SessionNotFound(f"session {session_id} was not found")
+            kps_norm = session.rep_counter.update_metric(frame)
+            session.frame_count += 1
+            session.last_active = time.monotonic()
+            return {
+                "session_id": session_id,
+                "exercise_name": session.exercise_name,
+                "frame_index": session.frame_count - 1,
+                "rep_count": session.get_reptition_count(),
+                "keypoints": kps_norm.tolist(),
+                "confidence_rate": float(np.mean(kps_norm[:, 2]))
+            }
+
+    def push_stream(self, session_id, stream):
+        """
+        Update repetition counter of session with every frame of a frame
+        stream, so a client sends all frames of a session in one upload
+        instead of one request per frame. Each frame is its length as
+        FRAME_LENGTH_BYTES big endian bytes followed by the encoded frame.
+        Frames are read and processed one at a time as they arrive.
+
+        Args:
+            session_id (str): session id
+            stream: file like object with read(size), e.g. chunked request body
+
+        Raises:
+            SessionNotFound: if session is not open or was evicted
+            Exception: if a frame is too large, can't be decoded or stream
+            ends in the middle of a frame
+
+        Yields:
+            dict: result of push_frame for every frame
+        """
+        # raise before first frame arrives
+        self.get_session(session_id)
+        while True:
+            header = _read_exact(stream, FRAME_LENGTH_BYTES)
+            if len(header) == 0:
+                return
+            if len(header) < FRAME_LENGTH_BYTES:
+                raise Exception("frame stream ended in the middle of a frame length")
+            frame_bytes = int.from_bytes(header, "big")
+            if frame_bytes > self.max_frame_bytes:
+                raise Exception(f"frame is larger than {self.max_frame_bytes} bytes")
+            encoded_frame = _read_exact(stream, frame_bytes)
+            if len(encoded_frame) < frame_bytes:
+                raise Exception("frame stream ended in the middle of a frame")
+            yield self.push_frame(session_id, encoded_frame)
+
+    def get_session_count(self) -> int:
+        """
+        Get number of open sessions, sessions being opened are not counted
+        """
+        with self.lock:
+            return sum(session is not _OPENING for session in self.sessions.values())
+
+    def close_session(self, session_id) -> dict:
+        """
+        Close session
+
+        Raises:
+            SessionNotFound: if session is not open or was evicted
+
+        Returns:
+            dict: exercise name, frame count and final repetition count
+        """
+        with self.lock:
+            session = self.sessions.get(session_id, _OPENING)
+            if session is not _OPENING:
+                del self.sessions[session_id]
+        if session is _OPENING:
+            raise SessionNotFound(f"session {session_id} was not found")
+        with session.lock:
+            result = {
+                "session_id": session_id,
+                "exercise_name": session.exercise_name,
+                "frame_count": session.frame_count,
+                "rep_count": session.get_reptition_count()
+            }
+            session.rep_counter.close()
+        stage_metrics.inc("sessions", event="closed")
+        return result
+
+def _read_exact(stream, size) -> bytes:
+    """
+    Read size bytes from stream, fewer only if stream ends
+    """
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
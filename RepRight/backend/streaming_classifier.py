@@ -0,0 +1,102 @@
+from collections import Counter, deque
+import numpy as np
+
+# frames voting on the exercise, first exercise is picked once window is full
+DEFAULT_WINDOW_SIZE = 30
+# frames classified together in one model call
+DEFAULT_STRIDE = 5
+# share of window votes another exercise needs before it can replace current exercise
+DEFAULT_SWITCH_SHARE = 0.6
+# consecutive evaluations another exercise must win before switching
+DEFAULT_SWITCH_PATIENCE = 2
+
+class StreamingClassifier:
+    def __init__(self, classifier, window_size=DEFAULT_WINDOW_SIZE, stride=DEFAULT_STRIDE,
+                 switch_share=DEFAULT_SWITCH_SHARE, switch_patience=DEFAULT_SWITCH_PATIENCE) -> None:
+        """
+        Classify exercise continuously over a sliding window of frames.
+        Frames are classified in batches every stride frames and the last
+        window_size predictions vote on the exercise. The first exercise is
+        the majority of the first full window. Afterwards another exercise
+        replaces it only when it wins at least switch_share of the window
+        in switch_patience evaluations in a row, so a few misclassified
+        frames between repetitions never switch the exercise back and forth.
+
+        Args:
+            classifier (ExerciseClassifier): exercise classifier
+            window_size (int, optional): number of predictions voting. Defaults to DEFAULT_WINDOW_SIZE.
+            stride (int, optional): number of frames per classification. Defaults to DEFAULT_STRIDE.
+            switch_share (float, optional): share of votes from 0.0 ~ 1.0 needed
+            to switch exercise. Defaults to DEFAULT_SWITCH_SHARE.
+            switch_patience (int, optional): number of evaluations in a row needed
+            to switch exercise. Defaults to DEFAULT_SWITCH_PATIENCE.
+        """
+        self.classifier = classifier
+        self.window_size = max(window_size, 1)
+        self.stride = max(stride, 1)
+        self.switch_share = switch_share
+        self.switch_patience = max(switch_patience, 1)
+        self.reset()
+
+    def reset(self):
+        """
+        Forget all frames and current exercise
+        """
+        # features waiting for next classification
+        self.pending = []
+        # label of last window_size frames
+        self.window = deque(maxlen=self.window_size)
+        self.current_label = None
+        self.candidate_label = None
+        self.candidate_count = 0
+        self.frame_count = 0
+        # (frame index, label) of every exercise change
+        self.changes = []
+
+    def update(self, features):
+        """
+        Add features of a frame, classify pending frames every stride frames
+
+        Args:
+            features (NDArray): (1, features) features of frame, see ExerciseClassifier.features
+
+        Returns:
+            str: current exercise label, None until first window is full
+        """
+        self.pending.append(features)
+        self.frame_count += 1
+        if len(self.pending) >= self.stride:
+            self._evaluate()
+        return self.current_label
+
+    def _evaluate(self):
+        """
+        Classify pending frames in one batch and vote over window
+        """
+        self.window.extend(self.classifier.predict_batch(np.concatenate(self.pending, axis=0)))
+        self.pending = []
+        if len(self.window) < self.window_size:
+            return
+
+        label, votes = Counter(self.window).most_common(1)[0]
+        if self.current_label is None:
+            self._change(label)
+            return
+
+        if label == self.current_label or votes / len(self.window) < self.switch_share:
+            self.candidate_label = None
+            self.candidate_count = 0
+            return
+        if label == self.candidate_label:
+            self.candidate_count += 1
+        else:
+            self.candidate_label = label
+            self.candidate_count = 1
+        if self.candidate_count >= self.switch_patience:
+            self._change(label)
+
+    def _change(self, label):
+        self.current_label = label
+        self.candidate_label = None
+        self.candidate_count = 0
+        self.changes.append((self.frame_count, label))
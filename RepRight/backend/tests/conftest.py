@@ -0,0 +1,51 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+# modules of backend are imported the way app.py imports them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# input size of generated model, smaller than any movenet variant
+TINY_INPUT_SIZE = 64
+
+def make_tiny_movenet(model_path, size=TINY_INPUT_SIZE):
+    """
+    Save a tiny onnx graph with movenet input and output, int32 [1, size, size, 3]
+    image to float32 [1, 1, 17, 3] yx keypoints and score. Output depends on the
+    image and differs per keypoint and coordinate, so swapped or stale keypoints show.
+
+    Args:
+        model_path (str): path to save onnx model
+        size (int, optional): input width and height. Defaults to TINY_INPUT_SIZE.
+    """
+    onnx = pytest.importorskip("onnx")
+    from onnx import helper, numpy_helper, TensorProto
+
+    rng = np.random.RandomState(0)
+    image = helper.make_tensor_value_info("input", TensorProto.INT32, [1, size, size, 3])
+    kps = helper.make_tensor_value_info("output_0", TensorProto.FLOAT, [1, 1, 17, 3])
+    initializers = [
+        numpy_helper.from_array((rng.randn(3, 3, 3, 3) * 0.01).astype(np.float32), "weight"),
+        numpy_helper.from_array(np.array([1, 1, 1, 3], dtype=np.int64), "shape"),
+        numpy_helper.from_array(rng.uniform(-2, 2, (1, 1, 17, 3)).astype(np.float32), "offset"),
+    ]
+    nodes = [
+        helper.make_node("Cast", ["input"], ["image"], to=TensorProto.FLOAT),
+        helper.make_node("Transpose", ["image"], ["nchw"], perm=[0, 3, 1, 2]),
+        helper.make_node("Conv", ["nchw", "weight"], ["conv"], strides=[8, 8], kernel_shape=[3, 3]),
+        helper.make_node("ReduceMean", ["conv"], ["mean"], axes=[2, 3], keepdims=1),
+        helper.make_node("Reshape", ["mean", "shape"], ["channels"]),
+        helper.make_node("Add", ["channels", "offset"], ["logits"]),
+        helper.make_node("Sigmoid", ["logits"], ["output_0"]),
+    ]
+    graph = helper.make_graph(nodes, "tiny_movenet", [image], [kps], initializers)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, model_path)
+
+@pytest.fixture(scope="session")
+def tiny_movenet_path(tmp_path_factory):
+    model_path = str(tmp_path_factory.mktemp("movenet") / "tiny_movenet.onnx")
+    make_tiny_movenet(model_path)
+    return model_path
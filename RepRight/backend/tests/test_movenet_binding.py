@@ -0,0 +1,76 @@
+import tracemalloc
+import numpy as np
+import pytest
+from rep_counting.movenet.movenet_infer import load_model, predict, preprocess_input_image_cv, preprocess_kps
+from rep_counting.movenet.movenet_crop import crop_and_resize
+from rep_counting.movenet.movenet_binding import MovenetBinding
+
+# whole frame and crop around person
+CROP_REGIONS = [None, (100., 50., 300.)]
+
+@pytest.fixture(scope="module")
+def model(tiny_movenet_path):
+    return load_model(tiny_movenet_path, profile_path=None)
+
+def random_frame(seed):
+    return np.random.RandomState(seed).randint(0, 256, (480, 640, 3), dtype=np.uint8)
+
+@pytest.mark.parametrize("crop_region", CROP_REGIONS)
+def test_run_matches_predict(model, crop_region):
+    binding = MovenetBinding(model)
+    for seed in range(3):
+        frame = random_frame(seed)
+        if crop_region is None:
+            image = preprocess_input_image_cv(frame, binding.input_size)
+        else:
+            image = crop_and_resize(frame, crop_region, binding.input_size)
+        raw_kps = predict(image, model).copy()
+        expected_kps, expected_conf_rate = preprocess_kps(raw_kps.copy())
+
+        kps, conf_rate = binding.run(frame, crop_region)
+        # yx from model is swapped to xy in place
+        assert np.allclose(kps[:, 0], raw_kps[:, 1], atol=1e-6)
+        assert np.allclose(kps[:, 1], raw_kps[:, 0], atol=1e-6)
+        assert np.allclose(kps, expected_kps, atol=1e-6)
+        assert conf_rate == pytest.approx(expected_conf_rate, abs=1e-6)
+
+def test_buffers_reused(model):
+    binding = MovenetBinding(model)
+    input_address = binding.input.ctypes.data
+    output_address = binding.output.ctypes.data
+
+    kps, _ = binding.run(random_frame(0))
+    first_kps = kps.copy()
+    next_kps, _ = binding.run(random_frame(1))
+
+    # every run writes the same output buffer bound to the model
+    assert kps is binding.kps and next_kps is kps
+    assert np.shares_memory(kps, binding.output)
+    assert binding.input.ctypes.data == input_address
+    assert binding.output.ctypes.data == output_address
+    assert not np.allclose(first_kps, next_kps)
+
+    # same frame again gives the same keypoints, buffer is not swapped twice
+    kps, _ = binding.run(random_frame(0))
+    assert np.allclose(kps, first_kps)
+
+@pytest.mark.parametrize("crop_region", CROP_REGIONS)
+def test_run_does_not_allocate(model, crop_region):
+    binding = MovenetBinding(model)
+    frame = random_frame(0)
+    for _ in range(10):
+        binding.run(frame, crop_region)
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in range(100):
+            binding.run(frame, crop_region)
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # float and tuple objects are a few hundred bytes, a frame buffer of
+    # this model is 64x64x3 int32, so any per frame buffer would show
+    assert after - before <= 0
+    assert peak - before < 4096
@@ -0,0 +1,127 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from rep_counting.movenet import session_registry as registry_module
+from rep_counting.movenet.session_registry import SessionRegistry
+
+# sessions of different keys
+OPTIONS_A = {"intra_op_num_threads": 1}
+OPTIONS_B = {"intra_op_num_threads": 2}
+
+def test_acquire_shares_session(tiny_movenet_path):
+    registry = SessionRegistry()
+    session = registry.acquire(tiny_movenet_path, OPTIONS_A, profile_path=None)
+    assert registry.acquire(tiny_movenet_path, OPTIONS_A, profile_path=None) is session
+    assert registry.acquire(tiny_movenet_path, OPTIONS_B, profile_path=None) is not session
+    assert len(registry) == 2
+    assert registry.get_reference_count(session) == 2
+
+    assert registry.release(session) == 1
+    assert registry.release(session) == 0
+    # session of OPTIONS_B is still in use
+    assert registry.unload() == 1
+    assert len(registry) == 1
+
+def test_release_after_forced_unload(tiny_movenet_path):
+    registry = SessionRegistry()
+    session = registry.acquire(tiny_movenet_path, OPTIONS_A, profile_path=None)
+    registry.acquire(tiny_movenet_path, OPTIONS_A, profile_path=None)
+    assert registry.unload(force=True) == 1
+    assert registry.get_reference_count(session) == 0
+
+    # users of unloaded session release it without error
+    assert registry.release(session) == 0
+    assert registry.release(session) == 0
+    assert registry.unloaded == {}
+    # next acquire loads a new session
+    assert registry.acquire(tiny_movenet_path, OPTIONS_A, profile_path=None) is not session
+
+def test_release_unknown_session(tiny_movenet_path):
+    registry = SessionRegistry()
+    with pytest.raises(Exception, match="not acquired"):
+        registry.release(object())
+
+def test_load_does_not_block_other_sessions(tiny_movenet_path, monkeypatch):
+    registry = SessionRegistry()
+    load_model = registry_module.load_model
+    loading = threading.Event()
+    finish_loading = threading.Event()
+    loads = []
+
+    def slow_load_model(model_path, session_options=None, profile_path=None):
+        loads.append(session_options["intra_op_num_threads"])
+        if session_options["intra_op_num_threads"] == 1:
+            loading.set()
+            assert finish_loading.wait(10)
+        return load_model(model_path, session_options=session_options, profile_path=profile_path)
+    monkeypatch.setattr(registry_module, "load_model", slow_load_model)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(registry.acquire, tiny_movenet_path, OPTIONS_A, profile_path=None)
+        assert loading.wait(10)
+        # waits for load of first acquire
+        second = executor.submit(registry.acquire, tiny_movenet_path, OPTIONS_A, profile_path=None)
+
+        # other session is acquired and released while session A loads
+        other = registry.acquire(tiny_movenet_path, OPTIONS_B, profile_path=None)
+        assert registry.release(other) == 0
+        assert not first.done() and not second.done()
+
+        finish_loading.set()
+        session = first.result(timeout=10)
+        assert second.result(timeout=10) is session
+    assert sorted(loads) == [1, 2]
+    assert registry.get_reference_count(session) == 2
+    assert registry.loading == {}
+
+def test_load_error_reaches_waiters(tiny_movenet_path, monkeypatch):
+    registry = SessionRegistry()
+    load_model = registry_module.load_model
+    loading = threading.Event()
+    finish_loading = threading.Event()
+
+    def failing_load_model(model_path, session_options=None, profile_path=None):
+        loading.set()
+        assert finish_loading.wait(10)
+        raise RuntimeError("model is broken")
+    monkeypatch.setattr(registry_module, "load_model", failing_load_model)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(registry.acquire, tiny_movenet_path, OPTIONS_A, profile_path=None)
+        assert loading.wait(10)
+        second = executor.submit(registry.acquire, tiny_movenet_path, OPTIONS_A, profile_path=None)
+        finish_loading.set()
+        for future in [first, second]:
+            with pytest.raises(RuntimeError, match="model is broken"):
+                future.result(timeout=10)
+    assert len(registry) == 0 and registry.loading == {}
+
+    # failed load is not remembered
+    monkeypatch.setattr(registry_module, "load_model", load_model)
+    assert registry.acquire(tiny_movenet_path, OPTIONS_A, profile_path=None) is not None
+
+def test_counters_share_session(tiny_movenet_path):
+    # many counters running concurrently on a single session
+    from rep_counting.rep_counter import RepetitionCounter
+    from rep_counting.movenet.session_registry import session_registry
+
+    config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "rep_counting", "smart_trainer_config", "config.json")
+    counters = [RepetitionCounter(config_path=config_path, model_path=tiny_movenet_path) for _ in range(8)]
+    try:
+        for counter in counters:
+            counter.set_metric("squats")
+        assert all(counter.model is counters[0].model for counter in counters)
+        assert session_registry.get_reference_count(counters[0].model) == len(counters)
+
+        frame = np.random.RandomState(0).randint(0, 256, (480, 640, 3), dtype=np.uint8)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda counter: [counter.update_metric(frame) for _ in range(5)], counters))
+        assert all(np.allclose(result[-1], results[0][-1]) for result in results)
+    finally:
+        for counter in counters:
+            counter.close()
+    assert session_registry.get_reference_count(counters[0].model) == 0
+    session_registry.unload()
@@ -0,0 +1,61 @@
+import io
+import pytest
+from session_manager import SessionManager, SessionNotFound, FRAME_LENGTH_BYTES
+
+class ChunkedStream(io.RawIOBase):
+    """
+    Stream returning at most chunk_size bytes per read like a chunked request body
+    """
+    def __init__(self, data, chunk_size):
+        self.data = io.BytesIO(data)
+        self.chunk_size = chunk_size
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self.data.read(min(size, self.chunk_size) if size >= 0 else self.chunk_size)
+
+def frame_stream(frames) -> bytes:
+    return b"".join(len(frame).to_bytes(FRAME_LENGTH_BYTES, "big") + frame for frame in frames)
+
+@pytest.fixture
+def manager(monkeypatch):
+    # framing only, frames are recorded instead of counted
+    manager = SessionManager(max_frame_bytes=100)
+    pushed = []
+    monkeypatch.setattr(manager, "get_session", lambda session_id: None)
+    monkeypatch.setattr(manager, "push_frame", lambda session_id, frame: pushed.append(frame) or {"frame_index": len(pushed) - 1})
+    manager.pushed = pushed
+    return manager
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1024])
+def test_push_stream_splits_frames(manager, chunk_size):
+    frames = [b"a" * 10, b"", b"b" * 99, b"c" * 100]
+    results = list(manager.push_stream("session", ChunkedStream(frame_stream(frames), chunk_size)))
+    assert manager.pushed == frames
+    assert [result["frame_index"] for result in results] == [0, 1, 2, 3]
+
+def test_push_stream_processes_frames_as_they_arrive(manager):
+    results = manager.push_stream("session", ChunkedStream(frame_stream([b"a", b"b"]) + b"\x00", 1024))
+    assert next(results) == {"frame_index": 0}
+    assert manager.pushed == [b"a"]
+    next(results)
+    with pytest.raises(Exception, match="middle of a frame length"):
+        next(results)
+
+def test_push_stream_truncated_frame(manager):
+    data = frame_stream([b"a" * 10])[:-1]
+    with pytest.raises(Exception, match="middle of a frame"):
+        list(manager.push_stream("session", ChunkedStream(data, 4)))
+    assert manager.pushed == []
+
+def test_push_stream_frame_too_large(manager):
+    # length is checked before frame is read
+    data = (101).to_bytes(FRAME_LENGTH_BYTES, "big")
+    with pytest.raises(Exception, match="larger than 100 bytes"):
+        list(manager.push_stream("session", ChunkedStream(data, 1024)))
+
+def test_push_stream_unknown_session():
+    with pytest.raises(SessionNotFound):
+        next(SessionManager().push_stream("missing", io.BytesIO(b"")))
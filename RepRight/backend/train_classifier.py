@@ -0,0 +1,174 @@
+import os
+import glob
+import argparse
+import cv2
+import numpy as np
+from classifier_runtime import DenseClassifier, movenet_features, DEFAULT_MOVENET_NPZ_PATH
+from classify_count import labels, exercise_dict
+from rep_counting.benchmark_models import EXAMPLE_EXERCISES, DEFAULT_EXAMPLES_DIR
+from rep_counting.video_reader import VideoReader
+from rep_counting.movenet.movenet_infer import load_model, MODEL_PATH
+from rep_counting.movenet.movenet_binding import MovenetBinding
+
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".bmp"]
+VIDEO_EXTENSIONS = [".mp4", ".mov", ".avi"]
+
+def get_label(dir_name):
+    """
+    Exercise label of a data subdirectory, named after the label as in
+    the workout dataset, exercise name of repetition counter or example
+    subdirectory name
+
+    Returns:
+        str: one of labels, None if directory is not an exercise
+    """
+    if dir_name in labels:
+        return dir_name
+    exercise_labels = {exercise_name: label for label, exercise_name in exercise_dict.items()}
+    exercise_name = EXAMPLE_EXERCISES.get(dir_name, dir_name)
+    return exercise_labels.get(exercise_name)
+
+def load_dataset(data_dir, model_path=MODEL_PATH, frame_step=1):
+    """
+    Movenet features of every image and video frame in data_dir,
+    each subdirectory holds one exercise, see get_label
+
+    Args:
+        data_dir (str): dataset directory
+        model_path (str, optional): movenet model used by repetition counter
+        frame_step (int, optional): use every frame_step-th frame of videos. Defaults to 1.
+
+    Raises:
+        Exception: if no image or video is found
+
+    Returns:
+        - NDArray: (samples, 17*3) features
+        - NDArray: (samples,) label index in labels
+    """
+    binding = MovenetBinding(load_model(model_path))
+    features = []
+    targets = []
+    for sub_dir in sorted(os.listdir(data_dir)):
+        label = get_label(sub_dir)
+        if label is None or not os.path.isdir(os.path.join(data_dir, sub_dir)):
+            continue
+        count = 0
+        for file_path in sorted(glob.glob(os.path.join(data_dir, sub_dir, "*"))):
+            extension = os.path.splitext(file_path)[1].lower()
+            if extension in IMAGE_EXTENSIONS:
+                image = cv2.imread(file_path)
+                frames = [image] if image is not None else []
+            elif extension in VIDEO_EXTENSIONS:
+                frames = (frame for i, frame in enumerate(VideoReader(file_path)) if i % max(frame_step, 1) == 0)
+            else:
+                continue
+            for frame in frames:
+                kps, _ = binding.run(frame)
+                features.append(movenet_features(kps)[0])
+                targets.append(labels.index(label))
+                count += 1
+        print(f"{sub_dir}: {count} samples of {label}")
+    if len(features) == 0:
+        raise Exception(f"no image or video of {labels} found in {data_dir}")
+    return np.array(features, dtype=np.float32), np.array(targets, dtype=np.int64)
+
+def train(x, y, hidden_units=(128, 64), epochs=50, batch_size=32, learning_rate=1e-3, seed=42) -> DenseClassifier:
+    """
+    Train dense classifier with same layers as RepModel.keras, softmax
+    cross entropy and adam optimizer, in NumPy so tensorflow is not needed
+
+    Args:
+        x (NDArray): (samples, features) features
+        y (NDArray): (samples,) label index
+        hidden_units (tuple, optional): units of relu layers. Defaults to (128, 64).
+        epochs (int, optional): passes over training data. Defaults to 50.
+        batch_size (int, optional): samples per update. Defaults to 32.
+        learning_rate (float, optional): adam learning rate. Defaults to 1e-3.
+        seed (int, optional): random seed of weights and shuffling. Defaults to 42.
+
+    Returns:
+        DenseClassifier: trained classifier
+    """
+    rng = np.random.default_rng(seed)
+    sizes = [x.shape[1], *hidden_units, len(labels)]
+    # glorot uniform as keras Dense
+    kernels = [rng.uniform(-1, 1, (n_in, n_out)).astype(np.float32) * np.sqrt(6. / (n_in + n_out))
+               for n_in, n_out in zip(sizes[:-1], sizes[1:])]
+    biases = [np.zeros(n_out, dtype=np.float32) for n_out in sizes[1:]]
+    params = kernels + biases
+    moments = [np.zeros_like(p) for p in params]
+    velocities = [np.zeros_like(p) for p in params]
+    beta1, beta2, epsilon = 0.9, 0.999, 1e-7
+    step = 0
+
+    for _ in range(epochs):
+        order = rng.permutation(len(x))
+        for start in range(0, len(x), batch_size):
+            batch = order[start:start + batch_size]
+            # forward, keep input of every layer
+            inputs = [x[batch]]
+            for i, (kernel, bias) in enumerate(zip(kernels, biases)):
+                out = inputs[-1] @ kernel + bias
+                if i < len(kernels) - 1:
+                    out = np.maximum(out, 0.)
+                inputs.append(out)
+            probs = np.exp(inputs[-1] - inputs[-1].max(axis=1, keepdims=True))
+            probs /= probs.sum(axis=1, keepdims=True)
+
+            # backward, gradient of mean cross entropy
+            grad = probs
+            grad[np.arange(len(batch)), y[batch]] -= 1.
+            grad /= len(batch)
+            kernel_grads, bias_grads = [], []
+            for i in reversed(range(len(kernels))):
+                kernel_grads.insert(0, inputs[i].T @ grad)
+                bias_grads.insert(0, grad.sum(axis=0))
+                if i > 0:
+                    grad = (grad @ kernels[i].T) * (inputs[i] > 0)
+
+            step += 1
+            for param, param_grad, m, v in zip(params, kernel_grads + bias_grads, moments, velocities):
+                m *= beta1
+                m += (1 - beta1) * param_grad
+                v *= beta2
+                v += (1 - beta2) * param_grad ** 2
+                param -= learning_rate * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + epsilon)
+
+    activations = ["relu"] * len(hidden_units) + ["softmax"]
+    return DenseClassifier(kernels, biases, activations)
+
+def main(data_dir, output_path=DEFAULT_MOVENET_NPZ_PATH, model_path=MODEL_PATH, frame_step=1, epochs=50,
+         test_size=0.2, seed=42):
+    x, y = load_dataset(data_dir, model_path, frame_step)
+
+    # split data into training and test sets
+    order = np.random.default_rng(seed).permutation(len(x))
+    num_test = int(len(x) * test_size)
+    test, train_set = order[:num_test], order[num_test:]
+    classifier = train(x[train_set], y[train_set], epochs=epochs, seed=seed)
+
+    train_accuracy = float(np.mean(classifier.predict(x[train_set]).argmax(axis=1) == y[train_set]))
+    print(f"train accuracy: {train_accuracy:.4f} on {len(train_set)} samples")
+    if num_test > 0:
+        test_accuracy = float(np.mean(classifier.predict(x[test]).argmax(axis=1) == y[test]))
+        print(f"test accuracy: {test_accuracy:.4f} on {num_test} samples")
+
+    classifier.save_npz(output_path)
+    print(f"classifier saved to {output_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="Train exercise classifier",
+                                     description="""This program trains the exercise classifier on movenet
+                                     keypoints, so classification and repetition counting share one pose
+                                     estimation per frame. Each subdirectory of data holds images or videos
+                                     of one exercise and is named after its label or exercise name.
+                                     """)
+    parser.add_argument("--data", help="Path to dataset directory", default=DEFAULT_EXAMPLES_DIR)
+    parser.add_argument("--output", help="Path to npz weights", default=DEFAULT_MOVENET_NPZ_PATH)
+    parser.add_argument("--model", help="Path to movenet model onnx file", default=MODEL_PATH)
+    parser.add_argument("--frame_step", help="Use every n-th frame of videos", type=int, default=1)
+    parser.add_argument("--epochs", help="Number of training epochs", type=int, default=50)
+    parser.add_argument("--test_size", help="Fraction of samples held out for test", type=float, default=0.2)
+    args = parser.parse_args()
+
+    main(args.data, args.output, args.model, args.frame_step, args.epochs, args.test_size)
@@ -0,0 +1,24 @@
+-- Idempotency keys, daily progress and history indexes on a database
+-- created by setup.sql. Every statement checks for what already
+-- exists, so this file is safe to run again
+
+-- Keys of stored /store_exercise_reps requests so retries are not inserted twice
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    idempotency_key VARCHAR(128) PRIMARY KEY,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Per-day totals per exercise type, kept up to date by /store_exercise_reps
+-- and rebuilt from exercise_reps by backend/backfill_progress.py
+CREATE TABLE IF NOT EXISTS daily_exercise_progress (
+    progress_date DATE NOT NULL,
+    exercise_type_id INT NOT NULL REFERENCES exercise_types(exercise_type_id),
+    total_reps INT NOT NULL DEFAULT 0,
+    sets INT NOT NULL DEFAULT 0,
+    sessions INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (progress_date, exercise_type_id)
+);
+
+-- Indexes for workout history and exercise type lookups
+CREATE INDEX IF NOT EXISTS exercise_reps_workout_id_idx ON exercise_reps (workout_id);
+CREATE UNIQUE INDEX IF NOT EXISTS exercise_types_exercise_name_idx ON exercise_types (exercise_name);
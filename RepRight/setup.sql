@@ -1,3 +1,6 @@
+-- Initial schema, run once on an empty database,
+-- then run the files in migrations/ in order
+
 CREATE TABLE workouts (
     workout_id SERIAL PRIMARY KEY,
     workout_time TIMESTAMP NOT NULL